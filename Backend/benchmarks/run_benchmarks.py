@@ -0,0 +1,237 @@
+"""Benchmark per tahap untuk pemrosesan upload dan perform_clustering.
+
+Workbook sintetis dibuat untuk setiap skala (kelipatan 514 wilayah) dan rentang tahun, lalu
+diproses lewat UploadService dan ClusteringService seperti di server. Hasilnya ditulis sebagai
+JSON ke benchmarks/results/ agar bisa dibandingkan antar versi.
+
+Contoh:
+    python benchmarks/run_benchmarks.py --scales 1 10 --spans 25 50 --sectors energi all
+    python benchmarks/run_benchmarks.py --scales 100 --repeat 1
+    python benchmarks/run_benchmarks.py --compare results/lama.json results/baru.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import numpy as np  # noqa: E402
+import sklearn  # noqa: E402
+
+from clustering_service import ClusteringService  # noqa: E402
+from dataset_cache import DatasetCache  # noqa: E402
+from generate_dataset import BASE_REGIONS, generate_workbook  # noqa: E402
+from metrics import StageTimer  # noqa: E402
+from upload_service import UploadService  # noqa: E402
+
+
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+
+def timed(func, *args, **kwargs):
+    """Jalankan func tanpa output print; kembalikan (hasil, detik)"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'scikit-learn': sklearn.__version__,
+        'clustering_n_jobs': os.environ.get('CLUSTERING_N_JOBS', '-1'),
+    }
+
+
+def benchmark_clustering(service, dataset, sector, n_clusters, repeat):
+    """perform_clustering pada seluruh rentang tahun dataset; median per tahap dari `repeat` kali"""
+    year_columns = dataset.sectors[sector].year_columns
+    start_year, end_year = int(year_columns[0]), int(year_columns[-1])
+
+    runs = []
+    for _ in range(repeat):
+        timer = StageTimer()
+        result, total = timed(
+            service.perform_clustering, start_year, end_year, sector, n_clusters,
+            dataset=dataset, progress=timer,
+        )
+        runs.append({'stages': timer.finish(), 'total_seconds': total})
+
+    stage_names = list(runs[0]['stages'])
+    return {
+        'sector': sector,
+        'n_clusters': n_clusters,
+        'start_year': start_year,
+        'end_year': end_year,
+        'stages': {
+            stage: statistics.median(run['stages'].get(stage, 0.0) for run in runs)
+            for stage in stage_names
+        },
+        'total_seconds': statistics.median(run['total_seconds'] for run in runs),
+        'runs': runs,
+        'info': {
+            'regions_clustered': result['regions_clustered'],
+            'outliers_removed': result['outliers_removed'] + result['extreme_removed'],
+            'gmm_iterations': result['gmm_parameters']['n_iterations'],
+            'gmm_converged': result['gmm_parameters']['converged'],
+            'silhouette_mode': result['silhouette_mode'],
+            'silhouette_sample_size': result['silhouette_sample_size'],
+        },
+    }
+
+
+def benchmark_scale(scale, span, sectors, n_clusters, repeat, seed):
+    n_regions = BASE_REGIONS * scale
+    start_year, end_year = 2000, 2000 + span - 1
+    print(f"=== Scale {scale}x ({n_regions} regions), years {start_year}-{end_year} ===")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        excel_dir = os.path.join(work_dir, 'Excel')
+        os.makedirs(excel_dir)
+        workbook_path = os.path.join(work_dir, 'upload.xlsx')
+
+        _, generate_seconds = timed(generate_workbook, workbook_path, n_regions, start_year, end_year, seed)
+        print(f"  generate: {generate_seconds:.2f}s")
+
+        cache = DatasetCache(excel_dir)
+        uploads = UploadService(cache)
+        (ok, message), upload_seconds = timed(uploads.process_uploaded_file, workbook_path)
+        if not ok:
+            raise RuntimeError(message)
+        print(f"  upload processing: {upload_seconds:.2f}s")
+
+        dataset = cache.get()
+        # Muat dari Excel (pandas) seperti saat store belum ada, lalu dari store (mmap)
+        _, excel_load_seconds = timed(cache._parse_workbooks, dataset.path)
+        _, store_load_seconds = timed(DatasetCache(excel_dir).get)
+        print(f"  excel load: {excel_load_seconds:.2f}s, store load: {store_load_seconds:.3f}s")
+
+        service = ClusteringService(cache)
+        clustering = []
+        for sector in sectors:
+            entry = benchmark_clustering(service, dataset, sector, n_clusters, repeat)
+            stages = ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in entry['stages'].items())
+            print(f"  {sector}: total {entry['total_seconds']:.2f}s ({stages}; silhouette {entry['info']['silhouette_mode']})")
+            clustering.append(entry)
+
+    return {
+        'scale': scale,
+        'n_regions': n_regions,
+        'start_year': start_year,
+        'end_year': end_year,
+        'generate_seconds': generate_seconds,
+        'upload_processing_seconds': upload_seconds,
+        'excel_load_seconds': excel_load_seconds,
+        'store_load_seconds': store_load_seconds,
+        'clustering': clustering,
+    }
+
+
+def compare(old_path, new_path):
+    """Cetak perbandingan waktu per tahap dua file hasil (rasio baru/lama).
+
+    Tahap yang hanya ada di salah satu file ditampilkan dengan '-' (mis. hasil lama sebelum
+    silhouette dipisah dari tahap evaluate).
+    """
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def index(report):
+        entries = {}
+        for run in report['runs']:
+            key = (run['scale'], run['start_year'], run['end_year'])
+            for name in ('upload_processing_seconds', 'excel_load_seconds', 'store_load_seconds'):
+                entries[key + ('-', name)] = run[name]
+            for entry in run['clustering']:
+                for stage, seconds in entry['stages'].items():
+                    entries[key + (entry['sector'], stage)] = seconds
+                entries[key + (entry['sector'], 'total')] = entry['total_seconds']
+        return entries
+
+    old_entries, new_entries = index(old), index(new)
+    print(f"{'scale':>5} {'years':>9} {'sector':>9} {'stage':>26} {'old':>9} {'new':>9} {'ratio':>6}")
+    for key in list(old_entries) + [key for key in new_entries if key not in old_entries]:
+        scale, start_year, end_year, sector, stage = key
+        before, after = old_entries.get(key), new_entries.get(key)
+        if before is None or after is None:
+            before_text = '-' if before is None else f"{before:.3f}"
+            after_text = '-' if after is None else f"{after:.3f}"
+            print(f"{scale:>5} {start_year}-{end_year} {sector:>9} {stage:>26} {before_text:>9} {after_text:>9} {'-':>6}")
+            continue
+        ratio = after / before if before else float('nan')
+        print(f"{scale:>5} {start_year}-{end_year} {sector:>9} {stage:>26} {before:>9.3f} {after:>9.3f} {ratio:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--spans', type=int, nargs='+', default=[25], help='jumlah tahun (mulai 2000)')
+    parser.add_argument('--sectors', nargs='+', default=['energi', 'all'])
+    parser.add_argument('--n-clusters', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file JSON hasil (default: benchmarks/results/<waktu>_<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'environment': environment(),
+        'config': {
+            'scales': args.scales,
+            'spans': args.spans,
+            'sectors': args.sectors,
+            'n_clusters': args.n_clusters,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'runs': [
+            benchmark_scale(scale, span, args.sectors, args.n_clusters, args.repeat, args.seed)
+            for scale in args.scales
+            for span in args.spans
+        ],
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written: {output}")
+
+
+if __name__ == '__main__':
+    main()
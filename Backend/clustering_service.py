@@ -1,16 +1,129 @@
 # Import library yang digunakan
-import pandas as pd
 import numpy as np
 from sklearn.mixture import GaussianMixture
 from sklearn.preprocessing import StandardScaler, PowerTransformer
-from sklearn.metrics import silhouette_score, silhouette_samples
+from joblib import Parallel, delayed, effective_n_jobs
+import logging
 import os
+
+from parallel_gmm import fit_predict_parallel, params_from_labels
+from silhouette import silhouette_analysis
 from scipy import stats  # Untuk Z-score
+from scipy.optimize import linear_sum_assignment
+
+from dataset_cache import ALL_SECTORS, DatasetCache, SHEET_MAPPING, SOURCE_PATTERNS
+from features import DEFAULT_FEATURES, WindowStats, build_features
+from model_registry import ClusteringModel, ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class _ProgressInterrupt(Exception):
+    """Membungkus exception dari callback progress agar tidak diubah menjadi RuntimeError"""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+def _no_progress(stage, **info):
+    pass
+
+
+def _sweep_fit(service, X_scaled, n_clusters):
+    """Fit satu nilai k untuk sweep (dijalankan di worker joblib)"""
+    try:
+        # Restart EM di dalam setiap k dijalankan berurutan; paralelisme sudah di level k
+        gmm, clusters = service.fit_gmm(X_scaled, n_clusters, n_jobs=1)
+    except RuntimeError as e:
+        return {'n_clusters': int(n_clusters), 'error': str(e)}, None, None
+
+    summary = {
+        'n_clusters': int(n_clusters),
+        'bic': float(gmm.bic(X_scaled)),
+        'aic': float(gmm.aic(X_scaled)),
+        'silhouette_score': service.evaluate_silhouette(X_scaled, clusters)['score'],
+        'converged': bool(gmm.converged_),
+        'n_iterations': int(gmm.n_iter_),
+        'lower_bound': float(gmm.lower_bound_),
+    }
+    return summary, gmm, clusters
+
+
+def _fit_window_chain(service, window_features, window_rows, n_regions, n_clusters, n_jobs):
+    """Fit semua jendela berurutan dalam satu rantai warm start.
+
+    Jendela pertama di-fit penuh (GMM_N_INIT restart, paralel dengan n_jobs worker); jendela
+    berikutnya di-warm start dari cluster wilayah yang sama di jendela sebelumnya sehingga label
+    tetap berkesinambungan. Rantai tidak dipecah per worker, jadi hasilnya tidak bergantung pada
+    jumlah core atau CLUSTERING_N_JOBS.
+    """
+    fits = []
+    previous = None  # label jendela sebelumnya pada sumbu semua wilayah (-1 = tidak di-cluster)
+    for X_augmented, rows in zip(window_features, window_rows):
+        _, _, X_scaled = service.fit_transform(X_augmented)
+        if previous is None:
+            gmm, clusters = service.fit_gmm(X_scaled, n_clusters, n_jobs=n_jobs)
+            warm_start = False
+        else:
+            gmm, clusters, warm_start = service.fit_gmm_warm(X_scaled, previous[rows], n_clusters, n_jobs=n_jobs)
+        probabilities = gmm.predict_proba(X_scaled)
+
+        fits.append({
+            'clusters': clusters,
+            'confidence': probabilities[np.arange(len(clusters)), clusters],
+            'bic': float(gmm.bic(X_scaled)),
+            'silhouette_score': service.evaluate_silhouette(X_scaled, clusters)['score'],
+            'n_iterations': int(gmm.n_iter_),
+            'converged': bool(gmm.converged_),
+            'warm_start': warm_start,
+        })
+        previous = np.full(n_regions, -1, dtype=np.int64)
+        previous[rows] = clusters
+    return fits
+
+
+def _stability_runs(service, X_scaled, samples, seeds, n_clusters):
+    """Fit ulang GMM pada setiap sampel baris (dijalankan di worker joblib).
+
+    Transformasi tidak di-fit ulang: X_scaled dari pipeline penuh dipakai bersama. Kembalikan
+    label untuk semua baris per run (model run memprediksi juga baris di luar sampelnya);
+    -1 untuk run yang gagal atau menghasilkan kurang dari 2 cluster.
+    """
+    labels = np.full((len(seeds), X_scaled.shape[0]), -1, dtype=np.int64)
+    for i, (sample, seed) in enumerate(zip(samples, seeds)):
+        gmm = service.make_gmm(n_clusters, n_init=service.STABILITY_N_INIT, random_state=int(seed))
+        try:
+            gmm.fit(X_scaled[sample])
+        except ValueError:
+            continue
+        run_labels = gmm.predict(X_scaled)
+        if len(np.unique(run_labels)) >= 2:
+            labels[i] = run_labels
+    return labels
+
+
+def _align_labels(reference, labels, n_clusters):
+    """Pemetaan label -> label reference dengan overlap wilayah terbesar (Hungarian); -1 = tidak ikut"""
+    shared = (reference >= 0) & (labels >= 0)
+    overlap = np.zeros((n_clusters, n_clusters), dtype=np.int64)
+    np.add.at(overlap, (labels[shared], reference[shared]), 1)
+    rows, cols = linear_sum_assignment(overlap, maximize=True)
+    mapping = np.empty(n_clusters, dtype=np.int64)
+    mapping[rows] = cols
+    return mapping
+
+
+def _column_values(df, column, default):
+    """Isi kolom sebagai array object (nilai default jika kolom tidak ada), untuk akses per baris tanpa iloc"""
+    if column in df.columns:
+        return df[column].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
 
 
 # Definisi kelas utama untuk proses clustering
 class ClusteringService:
-    def __init__(self):
+    def __init__(self, dataset_cache=None, model_registry=None, stage_cache=None):
         # Menentukan direktori dasar dari file saat ini
         self.BASE_DIR = os.path.dirname(os.path.abspath(__file__))
         # Menentukan folder tempat file Excel disimpan
@@ -24,82 +137,61 @@ class ClusteringService:
         # Threshold Z-score untuk deteksi outlier (default: 3)
         self.ZSCORE_THRESHOLD = 3
 
+        # Wilayah dengan rata-rata emisi di atas ambang ini (Gg) dibuang sebelum Z-score
+        self.EXTREME_THRESHOLD = 50000
+
+        # Jumlah restart EM GMM (model terbaik dipilih dari semua restart)
+        self.GMM_N_INIT = 30
+
+        # Jumlah worker untuk fit paralel (sweep k); -1 = semua core
+        self.N_JOBS = int(os.environ.get('CLUSTERING_N_JOBS', '-1'))
+
+        # Stabilitas (bootstrap/subsample): restart EM per run, lebih sedikit dari model utama
+        self.STABILITY_N_INIT = 3
+
+        # Silhouette: exact sampai SILHOUETTE_MAX_EXACT region, di atas itu pakai sampel referensi
+        self.SILHOUETTE_MAX_EXACT = int(os.environ.get('SILHOUETTE_MAX_EXACT', '20000'))
+        self.SILHOUETTE_SAMPLE_SIZE = int(os.environ.get('SILHOUETTE_SAMPLE_SIZE', '2000'))
+        self.SILHOUETTE_SEED = int(os.environ.get('SILHOUETTE_SEED', '100'))
+        self.SILHOUETTE_WORKING_MEMORY_MB = 64
+
+        # Fitur turunan yang ditambahkan ke data per tahun (lihat features.DERIVATIVE_FEATURES)
+        self.DERIVATIVE_FEATURES = list(DEFAULT_FEATURES)
+
         # Pemetaan antara nama sektor dengan nama sheet di Excel
-        self.SHEET_MAPPING = {
-            'energi': 'Energi',
-            'kehutanan': 'Kehutanan',
-            'limbah': 'Limbah',
-            'pertanian': 'Pertanian',
-            'ippu': 'Ippu'
-        }
+        self.SHEET_MAPPING = SHEET_MAPPING
 
         # Daftar pola sumber emisi berdasarkan sektor
-        self.SOURCE_PATTERNS = {
-            'energi': [
-                'INDUSTRI BATU BARA', 'INDUSTRI ENERGI',
-                'MANUFAKTUR & KONSTRUKSI', 'MINYAK & GAS BUMI',
-                'PERKANTORAN & PEMUKIMAN', 'TRANSPORTASI'
-            ],
-            'kehutanan': ['BIOMASS', 'PEAT DECOMPOSITION', 'PEAT FIRE'],
-            'limbah': [
-                'LIMBAH CAIR DOMESTIK', 'LIMBAH CAIR INDUSTRI',
-                'LIMBAH PADAT', 'PEMBAKARAN', 'PENGOLAHAN SECARA BIOLOGIS'
-            ],
-            'pertanian': [
-                'Biomass Burning', 'Liming', 'Livestock',
-                'N2O from Managed Soils', 'Rice Cultivation', 'Urea'
-            ],
-            'ippu': [
-                'INDUSTRI KIMIA', 'INDUSTRI LOGAM',
-                'INDUSTRI MINERAL', 'INDUSTRI NON-ENERGI', 'LAINNYA'
-            ]
-        }
+        self.SOURCE_PATTERNS = SOURCE_PATTERNS
+
+        # Cache dataset bersama (dibagi dengan UploadService agar bisa di-invalidate)
+        self.dataset_cache = dataset_cache or DatasetCache(self.EXCEL_DIR)
+
+        # Registry model (opsional): pipeline hasil fit disimpan untuk /api/clustering/predict
+        self.model_registry = model_registry
 
-    def get_emission_sources(self, sector: str, start_year: int, end_year: int):
+        # Cache hasil antara per tahap (opsional, result_cache.StageCache); lihat prepare_data
+        self.stage_cache = stage_cache
+
+    def get_emission_sources(self, sector: str, start_year: int, end_year: int, dataset=None):
         """Mengambil data sumber emisi berdasarkan sektor dan rentang tahun"""
         if sector not in self.SHEET_MAPPING:
             return {}
 
         try:
-            sheet_name = self.SHEET_MAPPING[sector]
-            df = pd.read_excel(self.RAW_EXCEL_FILE, sheet_name=sheet_name)
-
-            year_columns = {}
-            sources = self.SOURCE_PATTERNS[sector]
-
-            # Ambil data berdasarkan sumber dan tahun
-            for source in sources:
-                source_data = {}
-                for year in range(start_year, end_year + 1):
-                    col_name = f"{source}_{year}"
-                    if col_name in df.columns:
-                        source_data[str(year)] = df[col_name].fillna(0).tolist()
-                if source_data:
-                    year_columns[source] = source_data
+            if dataset is None:
+                dataset = self.dataset_cache.get()
+            data = dataset.sectors[sector]
+
+            sources, averages = data.source_averages(start_year, end_year)
+            if not sources:
+                return {}
 
             kabupaten_sources = {}
-            for idx, row in df.iterrows():
-                kabupaten = row.get('KABUPATEN', '')
+            for kabupaten, row in zip(data.source_kabupaten, averages.tolist()):
                 if not kabupaten:
                     continue
-
-                kabupaten_data = {}
-                for source in sources:
-                    if source in year_columns:
-                        values = []
-                        for year in range(start_year, end_year + 1):
-                            year_str = str(year)
-                            if (
-                                year_str in year_columns[source]
-                                and idx < len(year_columns[source][year_str])
-                            ):
-                                values.append(year_columns[source][year_str][idx])
-                        if values:
-                            avg_emission = np.mean(values)
-                            kabupaten_data[source] = float(avg_emission)
-
-                if kabupaten_data:
-                    kabupaten_sources[kabupaten] = kabupaten_data
+                kabupaten_sources[kabupaten] = dict(zip(sources, row))
 
             return kabupaten_sources
 
@@ -107,63 +199,41 @@ class ClusteringService:
             print(f"Error reading emission sources: {str(e)}")
             return {}
 
-    def get_all_sectors_data(self, start_year: int, end_year: int):
-        """Menggabungkan data dari semua sektor (opsi sektor = 'all')"""
-        year_columns = [str(year) for year in range(start_year, end_year + 1)]
-        combined_df = None
-
-        for sector_key, sheet_name in self.SHEET_MAPPING.items():
-            try:
-                df = pd.read_excel(self.EXCEL_FILE, sheet_name=sheet_name)
-                available_years = [col for col in year_columns if col in df.columns]
-                if not available_years:
-                    continue
-
-                base_cols = ['KABUPATEN', 'PROVINSI']
-                sector_data = df[base_cols + available_years].copy()
-
-                if combined_df is None:
-                    combined_df = sector_data.copy()
-                else:
-                    combined_df = pd.merge(
-                        combined_df,
-                        sector_data,
-                        on=['KABUPATEN', 'PROVINSI'],
-                        how='outer',
-                        suffixes=('', f'_{sector_key}')
-                    )
-
-                    for year in available_years:
-                        if f'{year}_{sector_key}' in combined_df.columns:
-                            combined_df[year] = (
-                                combined_df[year].fillna(0)
-                                + combined_df[f'{year}_{sector_key}'].fillna(0)
-                            )
-                            combined_df.drop(f'{year}_{sector_key}', axis=1, inplace=True)
+    def get_all_sectors_data(self, start_year: int, end_year: int, dataset=None):
+        """Menggabungkan data dari semua sektor (opsi sektor = 'all').
 
-            except Exception as e:
-                print(f"Error reading {sheet_name}: {str(e)}")
-                continue
+        Total lintas sektor sudah dihitung sekali per versi dataset (lihat with_all_sectors),
+        jadi di sini cukup memilih kolom tahun.
+        """
+        if dataset is None:
+            dataset = self.dataset_cache.get()
 
-        if combined_df is None:
+        combined_df = dataset.sectors[ALL_SECTORS].to_frame()
+        year_columns = [str(year) for year in range(start_year, end_year + 1)]
+        available_years = [col for col in year_columns if col in combined_df.columns]
+        if not available_years:
             raise ValueError("Could not load data from any sector")
 
-        combined_df = combined_df.fillna(0)
-        return combined_df
+        return combined_df[['KABUPATEN', 'PROVINSI'] + available_years]
 
-    def get_all_sectors_sources(self, start_year: int, end_year: int):
+    def get_all_sectors_sources(self, start_year: int, end_year: int, dataset=None):
         """Menggabungkan sumber emisi dari semua sektor"""
-        all_sectors = ['energi', 'kehutanan', 'limbah', 'pertanian', 'ippu']
+        if dataset is None:
+            dataset = self.dataset_cache.get()
+
         kabupaten_all_sources = {}
 
-        for sector in all_sectors:
-            sector_sources = self.get_emission_sources(sector, start_year, end_year)
-            for kabupaten, sources in sector_sources.items():
-                if kabupaten not in kabupaten_all_sources:
-                    kabupaten_all_sources[kabupaten] = {}
-                for source, value in sources.items():
-                    prefixed_source = f"{sector.upper()}: {source}"
-                    kabupaten_all_sources[kabupaten][prefixed_source] = value
+        for sector in self.SHEET_MAPPING:
+            data = dataset.sectors[sector]
+            sources, averages = data.source_averages(start_year, end_year)
+            if not sources:
+                continue
+
+            prefixed_sources = [f"{sector.upper()}: {source}" for source in sources]
+            for kabupaten, row in zip(data.source_kabupaten, averages.tolist()):
+                if not kabupaten:
+                    continue
+                kabupaten_all_sources.setdefault(kabupaten, {}).update(zip(prefixed_sources, row))
 
         return kabupaten_all_sources
 
@@ -178,67 +248,307 @@ class ClusteringService:
         mask = z_scores <= threshold
         outlier_indices = np.where(~mask)[0]
 
-        outliers_info = []
-        for idx in outlier_indices:
-            kabupaten = df.iloc[idx].get('KABUPATEN', 'Unknown')
-            provinsi = df.iloc[idx].get('PROVINSI', 'Unknown')
-            avg_emission = float(X[idx].mean())
-            z_score = float(z_scores[idx])
+        kabupaten = _column_values(df, 'KABUPATEN', 'Unknown')[outlier_indices]
+        provinsi = _column_values(df, 'PROVINSI', 'Unknown')[outlier_indices]
+        avg_emissions = row_means[outlier_indices].tolist()
+        outlier_z_scores = z_scores[outlier_indices].tolist()
 
-            outliers_info.append({
-                'kabupaten': kabupaten,
-                'provinsi': provinsi,
+        outliers_info = [
+            {
+                'kabupaten': kab,
+                'provinsi': prov,
                 'avg_emission': avg_emission,
                 'z_score': z_score
-            })
+            }
+            for kab, prov, avg_emission, z_score in zip(kabupaten, provinsi, avg_emissions, outlier_z_scores)
+        ]
 
         outliers_info.sort(key=lambda x: x['z_score'], reverse=True)
         return mask, outliers_info
 
-    def create_derivative_features(self, X):
-        """Buat fitur turunan: rata-rata, std, trend, dll"""
-        n_samples = X.shape[0]
-
-        # Fitur statistik
-        means = X.mean(axis=1).reshape(-1, 1)
-        stds = X.std(axis=1).reshape(-1, 1)
-        mins = X.min(axis=1).reshape(-1, 1)
-        maxs = X.max(axis=1).reshape(-1, 1)
-
-        # Trend (slope dari linear regression)
-        trends = np.zeros((n_samples, 1))
-        for i in range(n_samples):
-            x_range = np.arange(X.shape[1])
-            slope, _ = np.polyfit(x_range, X[i], 1)
-            trends[i] = slope
-
-        # Variability (coefficient of variation)
-        cv = stds / (np.abs(means) + 1e-8)
-
-        # Gabungkan semua fitur
-        X_augmented = np.hstack([
-            X,           # Data original
-            means,       # Rata-rata
-            stds,        # Standar deviasi
-            trends,      # Trend
-            cv,          # Coefficient of variation
-            mins,        # Minimum
-            maxs         # Maximum
-        ])
-
-        return X_augmented
-
-    def perform_clustering(self, start_year: int, end_year: int, sector: str, n_clusters: int):
-        """Melakukan clustering GMM terhadap data emisi"""
-
-        # === 1. Load data ===
+    def create_derivative_features(self, X, feature_names=None):
+        """Buat fitur turunan: rata-rata, std, trend, dll (vektor untuk semua baris sekaligus)"""
+        if feature_names is None:
+            feature_names = self.DERIVATIVE_FEATURES
+        return build_features(X, feature_names)
+
+    def evaluate_silhouette(self, X_scaled, clusters):
+        """Silhouette per region + rata-rata dari satu pass jarak (lihat silhouette.py)"""
+        return silhouette_analysis(
+            X_scaled,
+            clusters,
+            max_exact=self.SILHOUETTE_MAX_EXACT,
+            sample_size=self.SILHOUETTE_SAMPLE_SIZE,
+            random_state=self.SILHOUETTE_SEED,
+            working_memory=self.SILHOUETTE_WORKING_MEMORY_MB,
+        )
+
+    def perform_clustering(self, start_year: int, end_year: int, sector: str, n_clusters: int,
+                           zscore_threshold=None, dataset=None, progress=None):
+        """Melakukan clustering GMM terhadap data emisi.
+
+        progress(stage, **info) dipanggil di setiap tahap; boleh melempar exception untuk membatalkan.
+        """
+        report = progress or _no_progress
+        prepared = self.prepare_data(start_year, end_year, sector, zscore_threshold, dataset, report)
+        gmm, clusters = self.fit_gmm(prepared['X_scaled'], n_clusters, report)
+        result = self.build_result(prepared, gmm, clusters, n_clusters, report)
+
+        if self.model_registry is not None:
+            report('save_model')
+            self.model_registry.save(self.build_model(prepared, gmm, n_clusters))
+        return result
+
+    def build_model(self, prepared, gmm, n_clusters: int):
+        """Bungkus transformer dan GMM hasil fit sebagai ClusteringModel untuk registry"""
+        key = ModelRegistry.make_key(
+            prepared['dataset'].version,
+            prepared['sector'],
+            prepared['start_year'],
+            prepared['end_year'],
+            n_clusters,
+            prepared['zscore_threshold'],
+        )
+        return ClusteringModel(
+            key,
+            power_transformer=prepared['power_transformer'],
+            scaler=prepared['scaler'],
+            gmm=gmm,
+            feature_names=prepared['feature_names'],
+            year_columns=prepared['year_columns'],
+            zscore_reference=prepared['zscore_reference'],
+            extreme_threshold=self.EXTREME_THRESHOLD,
+        )
+
+    def perform_sweep(self, start_year: int, end_year: int, sector: str, cluster_range=range(2, 8),
+                      zscore_threshold=None, select_by='bic', include_best_result=False, dataset=None):
+        """Fit GMM untuk beberapa nilai k sekaligus; preprocessing hanya dijalankan sekali"""
+        if select_by not in ('bic', 'aic', 'silhouette'):
+            raise ValueError(f"Unknown selection criterion: {select_by}")
+
+        prepared = self.prepare_data(start_year, end_year, sector, zscore_threshold, dataset)
+        X_scaled = prepared['X_scaled']
+        cluster_values = list(cluster_range)
+
+        logger.debug("GMM sweep k=%s", cluster_values)
+        fits = Parallel(n_jobs=min(len(cluster_values), self.N_JOBS) if self.N_JOBS > 0 else self.N_JOBS)(
+            delayed(_sweep_fit)(self, X_scaled, k) for k in cluster_values
+        )
+
+        results = [summary for summary, _, _ in fits]
+        valid = [i for i, summary in enumerate(results) if 'error' not in summary]
+        if not valid:
+            raise ValueError("GMM gagal untuk semua nilai n_clusters")
+
+        if select_by == 'silhouette':
+            best_idx = max(valid, key=lambda i: results[i]['silhouette_score'])
+        else:
+            best_idx = min(valid, key=lambda i: results[i][select_by])
+        best_summary, best_gmm, best_clusters = fits[best_idx]
+
+        sweep = {
+            'sector': sector,
+            'start_year': start_year,
+            'end_year': end_year,
+            'zscore_threshold': prepared['zscore_threshold'],
+            'regions_clustered': int(len(prepared['df'])),
+            'select_by': select_by,
+            'results': results,
+            'best_n_clusters': best_summary['n_clusters'],
+            'best_result': None,
+        }
+        if include_best_result:
+            sweep['best_result'] = self.build_result(
+                prepared, best_gmm, best_clusters, best_summary['n_clusters']
+            )
+        return sweep
+
+    def perform_stability(self, start_year: int, end_year: int, sector: str, n_clusters: int,
+                          n_runs: int = 100, method: str = 'subsample', sample_fraction: float = 0.8,
+                          zscore_threshold=None, include_matrix=False, random_state=0,
+                          dataset=None, progress=None):
+        """Stabilitas penugasan cluster dari n_runs fit ulang GMM pada sampel bootstrap/subsample.
+
+        Preprocessing (outlier, fitur, PowerTransformer + StandardScaler) dijalankan sekali dan
+        dipakai semua run; run dibagi ke worker joblib (proses). Label setiap run diselaraskan ke
+        model referensi (fit penuh, sama dengan /api/clustering) dengan pencocokan Hungarian.
+        Per wilayah: cluster konsensus (mayoritas label selaras), agreement (proporsi run yang
+        setuju dengan konsensus) dan stability (rata-rata co-assignment dengan anggota lain
+        cluster konsensusnya).
+        """
+        if method not in ('bootstrap', 'subsample'):
+            raise ValueError(f"Unknown resampling method: {method}")
+        if not 0 < sample_fraction <= 1:
+            raise ValueError("sample_fraction harus di antara 0 dan 1")
+        report = progress or _no_progress
+
+        prepared = self.prepare_data(start_year, end_year, sector, zscore_threshold, dataset, report)
+        X_scaled = prepared['X_scaled']
+        df = prepared['df']
+        n_regions = X_scaled.shape[0]
+
+        # === Model referensi: label yang menjadi acuan penyelarasan ===
+        _, reference = self.fit_gmm(X_scaled, n_clusters, report)
+
+        # === Sampel dan seed ditentukan di awal agar hasil sama berapa pun jumlah worker ===
+        rng = np.random.default_rng(random_state)
+        if method == 'bootstrap':
+            samples = [rng.integers(0, n_regions, n_regions) for _ in range(n_runs)]
+        else:
+            size = max(n_clusters, int(round(sample_fraction * n_regions)))
+            samples = [np.sort(rng.choice(n_regions, size, replace=False)) for _ in range(n_runs)]
+        seeds = rng.integers(0, 2**31 - 1, n_runs)
+
+        report('resample', runs=n_runs)
+        logger.debug("Stability: %s, %d runs", method, n_runs)
+        n_chunks = max(1, min(effective_n_jobs(self.N_JOBS), n_runs))
+        chunks = np.array_split(np.arange(n_runs), n_chunks)
+        run_labels = np.vstack(Parallel(n_jobs=n_chunks)(
+            delayed(_stability_runs)(self, X_scaled, [samples[i] for i in chunk], seeds[chunk], n_clusters)
+            for chunk in chunks
+        ))
+
+        # === Selaraskan label, konsensus dan co-assignment ===
+        report('consensus')
+        succeeded = run_labels[:, 0] >= 0
+        aligned = np.array([
+            _align_labels(reference, labels, n_clusters)[labels] for labels in run_labels[succeeded]
+        ]).reshape(-1, n_regions)
+        n_succeeded = aligned.shape[0]
+        if n_succeeded == 0:
+            raise ValueError("Semua run stabilitas gagal; coba nilai n_clusters yang lain")
+
+        votes = np.zeros((n_clusters, n_regions), dtype=np.int64)
+        for labels in aligned:
+            votes[labels, np.arange(n_regions)] += 1
+        consensus = votes.argmax(axis=0)
+        agreement = votes[consensus, np.arange(n_regions)] / n_succeeded
+
+        # Co-assignment: proporsi run di mana dua wilayah berada di cluster yang sama
+        one_hot = np.zeros((n_regions, n_succeeded * n_clusters))
+        one_hot[np.repeat(np.arange(n_regions), n_succeeded),
+                (np.arange(n_succeeded) * n_clusters + aligned.T).ravel()] = 1.0
+        co_assignment = one_hot @ one_hot.T / n_succeeded
+
+        same_cluster = consensus[:, None] == consensus[None, :]
+        np.fill_diagonal(same_cluster, False)
+        peers = same_cluster.sum(axis=1)
+        # Wilayah tanpa anggota lain di cluster konsensusnya memakai agreement
+        stability = agreement.copy()
+        np.divide((co_assignment * same_cluster).sum(axis=1), peers, out=stability, where=peers > 0)
+
+        kabupaten = _column_values(df, 'KABUPATEN', 'Unknown')
+        provinsi = _column_values(df, 'PROVINSI', 'Unknown')
+        regions = {
+            kab: {
+                'provinsi': prov,
+                'cluster': int(consensus_id),
+                'reference_cluster': int(reference_id),
+                'agreement': float(agree),
+                'stability': float(score),
+            }
+            for kab, prov, consensus_id, reference_id, agree, score in zip(
+                kabupaten, provinsi, consensus.tolist(), reference.tolist(), agreement.tolist(), stability.tolist()
+            )
+        }
+
+        cluster_stability = [
+            {
+                'cluster_id': int(i),
+                'count': int(np.sum(consensus == i)),
+                'stability': float(stability[consensus == i].mean()) if np.any(consensus == i) else 0.0,
+                'agreement': float(agreement[consensus == i].mean()) if np.any(consensus == i) else 0.0,
+            }
+            for i in range(n_clusters)
+        ]
+
+        logger.debug("Successful runs: %d/%d, mean stability: %.4f", n_succeeded, n_runs, stability.mean())
+        result = {
+            'sector': sector,
+            'start_year': start_year,
+            'end_year': end_year,
+            'n_clusters': int(n_clusters),
+            'zscore_threshold': prepared['zscore_threshold'],
+            'method': method,
+            'sample_fraction': sample_fraction if method == 'subsample' else 1.0,
+            'n_runs': int(n_runs),
+            'successful_runs': int(n_succeeded),
+            'regions_clustered': int(n_regions),
+            'mean_stability': float(stability.mean()),
+            'mean_agreement': float(agreement.mean()),
+            'changed_from_reference': int(np.sum(consensus != reference)),
+            'cluster_stability': cluster_stability,
+            'regions': regions,
+        }
+        if include_matrix:
+            result['region_order'] = kabupaten.tolist()
+            result['co_assignment'] = co_assignment.round(4).tolist()
+        return result
+
+    def prepare_data(self, start_year: int, end_year: int, sector: str, zscore_threshold=None,
+                     dataset=None, progress=None):
+        """Load, filter outlier, fitur turunan dan transformasi (semua tahap sebelum GMM).
+
+        Jika stage_cache diberikan, hasil setiap tahap disimpan dengan kunci dari input tahap itu
+        saja (versi dataset, sektor, rentang tahun, ambang, fitur). Request yang hanya berbeda
+        n_clusters memakai ulang semua tahap; yang hanya berbeda ambang Z-score memakai ulang
+        load + filter ekstrem. Tahap yang diambil dari cache tidak memanggil progress.
+        """
+        if zscore_threshold is None:
+            zscore_threshold = self.ZSCORE_THRESHOLD
+        report = progress or _no_progress
+
+        if dataset is None:
+            dataset = self.dataset_cache.get()
+        feature_names = list(self.DERIVATIVE_FEATURES)
+
+        # Kunci diawali (versi, sektor, ...) seperti cache hasil, agar bisa dipindah saat upload delta
+        loaded_key = (dataset.version, sector.lower(), start_year, end_year, 'extreme', self.EXTREME_THRESHOLD)
+        filtered_key = loaded_key + ('zscore', float(zscore_threshold))
+        transformed_key = filtered_key + ('features', tuple(feature_names))
+
+        loaded = self._stage(loaded_key, lambda: self._load_stage(start_year, end_year, sector, dataset, report))
+        filtered = self._stage(filtered_key, lambda: self._zscore_stage(loaded, zscore_threshold))
+        transformed = self._stage(
+            transformed_key, lambda: self._transform_stage(filtered['X'], feature_names, report)
+        )
+
+        return {
+            'sector': sector,
+            'start_year': start_year,
+            'end_year': end_year,
+            'zscore_threshold': zscore_threshold,
+            'dataset': dataset,
+            'df': filtered['df'],
+            'X': filtered['X'],
+            'X_scaled': transformed['X_scaled'],
+            'power_transformer': transformed['power_transformer'],
+            'scaler': transformed['scaler'],
+            'feature_names': feature_names,
+            'zscore_reference': filtered['zscore_reference'],
+            'year_columns': loaded['year_columns'],
+            'extreme_outliers': loaded['extreme_outliers'],
+            'outliers_info': filtered['outliers_info'],
+            'total_regions': loaded['total_regions'],
+            'transform_method': transformed['transform_method'],
+        }
+
+    def _stage(self, key, compute):
+        """Hasil satu tahap pipeline dari stage_cache (jika ada), atau dihitung langsung"""
+        if self.stage_cache is None:
+            return compute()
+        return self.stage_cache.get_or_compute(key, compute)
+
+    def _load_stage(self, start_year: int, end_year: int, sector: str, dataset, report):
+        """Tahap 1-2: ambil data tahun yang diminta dan buang wilayah ekstrem"""
+        # === 1. Load data (dari cache, satu snapshot untuk seluruh request) ===
+        report('load')
         if sector.lower() == 'all':
-            df = self.get_all_sectors_data(start_year, end_year)
+            df = self.get_all_sectors_data(start_year, end_year, dataset)
         else:
-            sheet_name = self.SHEET_MAPPING.get(sector.lower())
-            if not sheet_name:
+            if sector.lower() not in self.SHEET_MAPPING:
                 raise ValueError(f"Unknown sector: {sector}")
-            df = pd.read_excel(self.EXCEL_FILE, sheet_name=sheet_name)
+            df = dataset.sectors[sector.lower()].to_frame()
 
         year_columns = [str(year) for year in range(start_year, end_year + 1)]
         missing_cols = [col for col in year_columns if col not in df.columns]
@@ -248,38 +558,50 @@ class ClusteringService:
         df = df.fillna(0)
         X_original_data = df[year_columns].values
 
-        # Hitung skewness per baris (kabupaten)
-        row_skewness = [stats.skew(row) for row in X_original_data]
-        print(f"Average row skewness: {np.mean(row_skewness):.2f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Skewness per baris (kabupaten), hanya untuk diagnostik
+            logger.debug("Average row skewness: %.2f", np.mean(stats.skew(X_original_data, axis=1)))
 
         # === 2. Buang data ekstrem >50.000 Gg ===
-        EXTREME_THRESHOLD = 50000
+        report('outliers')
+        EXTREME_THRESHOLD = self.EXTREME_THRESHOLD
         row_means = X_original_data.mean(axis=1)
         extreme_mask = row_means <= EXTREME_THRESHOLD
         extreme_indices = np.where(~extreme_mask)[0]
 
-        extreme_outliers = []
-        for idx in extreme_indices:
-            kabupaten = df.iloc[idx].get('KABUPATEN', 'Unknown')
-            provinsi = df.iloc[idx].get('PROVINSI', 'Unknown')
-            avg_emission = float(X_original_data[idx].mean())
-
-            extreme_outliers.append({
-                'kabupaten': kabupaten,
-                'provinsi': provinsi,
+        extreme_outliers = [
+            {
+                'kabupaten': kab,
+                'provinsi': prov,
                 'avg_emission': avg_emission,
                 'reason': f'Extreme (>{EXTREME_THRESHOLD:,.0f} Gg)'
-            })
+            }
+            for kab, prov, avg_emission in zip(
+                _column_values(df, 'KABUPATEN', 'Unknown')[extreme_indices],
+                _column_values(df, 'PROVINSI', 'Unknown')[extreme_indices],
+                row_means[extreme_indices].tolist(),
+            )
+        ]
 
         extreme_outliers.sort(key=lambda x: x['avg_emission'], reverse=True)
 
-        df = df[extreme_mask].reset_index(drop=True)
-        X_original_data = X_original_data[extreme_mask]
+        return {
+            'df': df[extreme_mask].reset_index(drop=True),
+            'X': X_original_data[extreme_mask],
+            'year_columns': year_columns,
+            'extreme_outliers': extreme_outliers,
+            'total_regions': int(len(df)),
+        }
+
+    def _zscore_stage(self, loaded, zscore_threshold):
+        """Tahap 3: buang outlier Z-score dari data hasil tahap load"""
+        df = loaded['df']
+        X_original_data = loaded['X']
 
         # === 3. Hapus outlier berdasarkan Z-score ===
-        mask, outliers_info = self.remove_outliers_zscore(X_original_data, df)
-        df_original = df.copy()
-        X_original = X_original_data.copy()
+        reference_means = X_original_data.mean(axis=1)
+        zscore_reference = (float(reference_means.mean()), float(reference_means.std()))
+        mask, outliers_info = self.remove_outliers_zscore(X_original_data, df, zscore_threshold)
 
         for outlier in outliers_info:
             outlier['reason'] = f'Z-score ({outlier["z_score"]:.2f})'
@@ -287,71 +609,291 @@ class ClusteringService:
         df = df[mask].reset_index(drop=True)
         X = X_original_data[mask]
 
-        print(f"\n=== AFTER OUTLIER REMOVAL ===")
-        print(f"Regions remaining: {len(df)}")
-        print(f"Total outliers removed: {len(outliers_info)}")
+        logger.debug("After outlier removal: %d regions remaining, %d outliers removed", len(df), len(outliers_info))
+
+        return {
+            'df': df,
+            'X': X,
+            'outliers_info': outliers_info,
+            'zscore_reference': zscore_reference,
+        }
 
+    def _transform_stage(self, X, feature_names, report):
+        """Tahap 4-5: fitur turunan lalu PowerTransformer + StandardScaler"""
         # === 4. FEATURE ENGINEERING - Tambah fitur turunan ===
-        print(f"\n=== FEATURE ENGINEERING ===")
-        X_augmented = self.create_derivative_features(X)
+        report('features')
+        X_augmented = self.create_derivative_features(X, feature_names)
 
         # === 5. TRANSFORMASI DAN NORMALISASI (SIMPLE PIPELINE) ===
         # Gunakan PowerTransformer (Yeo-Johnson) yang dapat menangani nilai negatif + StandardScaler
-        print("Step 1: PowerTransformer (Yeo-Johnson) to stabilize variance / reduce skewness")
+        report('transform')
+        pt, scaler, X_scaled = self.fit_transform(X_augmented)
+
+        return {
+            'X_scaled': X_scaled,
+            'power_transformer': pt,
+            'scaler': scaler,
+            'transform_method': "PowerTransformer(Yeo-Johnson) + StandardScaler",
+        }
+
+    def fit_transform(self, X_augmented):
+        """Fit PowerTransformer (Yeo-Johnson) + StandardScaler; kembalikan (pt, scaler, X_scaled)"""
         pt = PowerTransformer(method='yeo-johnson', standardize=False)  # tidak men-standarkan di sini
         X_pt = pt.fit_transform(X_augmented)
-
-        print("Step 2: StandardScaler (final normalization)")
         scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_pt)
+        return pt, scaler, scaler.fit_transform(X_pt)
 
-        transform_method = "PowerTransformer(Yeo-Johnson) + StandardScaler"
+    def make_gmm(self, n_clusters: int, **params):
+        """GaussianMixture dengan konfigurasi clustering; params menimpa nilai default"""
+        return GaussianMixture(**{
+            'n_components': n_clusters,
+            'covariance_type': 'full',
+            'random_state': 100,
+            'n_init': self.GMM_N_INIT,
+            'reg_covar': 1e-4,
+            'max_iter': 500,
+            'init_params': 'kmeans',
+            'tol': 1e-5,
+            **params,
+        })
+
+    def fit_gmm(self, X_scaled, n_clusters: int, progress=None, n_jobs=None):
+        """Fit GMM pada data yang sudah ditransformasi; kembalikan (gmm, label cluster).
+
+        n_init restart EM dijalankan paralel dengan n_jobs worker (default: self.N_JOBS);
+        hasilnya identik dengan GaussianMixture.fit_predict berapa pun jumlah worker.
+        """
+        report = progress or _no_progress
+        if n_jobs is None:
+            n_jobs = self.N_JOBS
+
+        def on_init_done(done):
+            try:
+                report('gmm', init=done, n_init=gmm.n_init)
+            except Exception as e:
+                raise _ProgressInterrupt(e)
 
         # === 6. JALANKAN GMM CLUSTERING  ===
-        print(f"\n=== GMM CLUSTERING (covariance_type='full') ===")
-        print(f"Number of clusters: {n_clusters}")
+        report('gmm', init=0, n_init=self.GMM_N_INIT)
+        logger.debug("GMM clustering: %d clusters (covariance_type='full')", n_clusters)
 
         try:
-            gmm = GaussianMixture(
-                n_components=n_clusters,
-                covariance_type='full', 
-                random_state=100,
-                n_init=30,
-                reg_covar=1e-4,
-                max_iter=500,
-                init_params='kmeans',
-                tol=1e-5
-            )
+            gmm = self.make_gmm(n_clusters)
 
-            clusters = gmm.fit_predict(X_scaled)
+            clusters = fit_predict_parallel(gmm, X_scaled, n_jobs=n_jobs, progress=on_init_done)
 
             # Pastikan minimal 2 cluster
             if len(np.unique(clusters)) < 2:
                 raise ValueError("GMM found less than 2 clusters; coba nilai n_clusters yang lain.")
 
-            score = silhouette_score(X_scaled, clusters)
-            print(f"Silhouette score: {score:.4f}")
-
+        except _ProgressInterrupt as e:
+            # Exception dari callback progress (mis. job dibatalkan) diteruskan apa adanya
+            raise e.error
         except Exception as e:
             raise RuntimeError(f"GMM clustering failed: {str(e)}")
 
-        probabilities = gmm.predict_proba(X_scaled)
+        return gmm, clusters
+
+    def fit_gmm_warm(self, X_scaled, reference_labels, n_clusters: int, n_jobs=None):
+        """Fit GMM satu restart EM yang dimulai dari penugasan cluster lain (mis. jendela tetangga).
+
+        reference_labels: label awal per baris X_scaled (-1 = tidak diketahui). Komponen k dimulai
+        dari anggota label k, sehingga nomor cluster tetap berkesinambungan. Kembalikan
+        (gmm, label cluster, True); jika ada label tanpa anggota atau hasilnya kurang dari 2 cluster,
+        jatuh kembali ke fit_gmm penuh dan kembalikan (gmm, label cluster, False).
+        """
+        gmm = self.make_gmm(n_clusters)
+        init = params_from_labels(X_scaled, reference_labels, n_clusters, gmm.reg_covar)
+        if init is not None:
+            weights, means, precisions = init
+            gmm.set_params(
+                n_init=1,
+                init_params='random_from_data',  # diabaikan karena semua parameter awal diberikan
+                weights_init=weights,
+                means_init=means,
+                precisions_init=precisions,
+            )
+            try:
+                clusters = gmm.fit_predict(X_scaled)
+                if len(np.unique(clusters)) >= 2:
+                    return gmm, clusters, True
+            except ValueError:
+                pass
+
+        gmm, clusters = self.fit_gmm(X_scaled, n_clusters, n_jobs=n_jobs)
+        return gmm, clusters, False
+
+    def perform_window_clustering(self, start_year: int, end_year: int, sector: str, n_clusters: int,
+                                  window_size: int = 5, step: int = 1, zscore_threshold=None,
+                                  dataset=None, progress=None):
+        """Clustering GMM untuk setiap jendela `window_size` tahun (geser `step` tahun) sekaligus.
+
+        Fitur setiap jendela dihitung dari prefix sum (features.WindowStats), bukan dari awal.
+        Setiap GMM di-warm start dari jendela sebelumnya (lihat _fit_window_chain). Nomor cluster tiap jendela lalu disamakan dengan
+        jendela sebelumnya lewat pencocokan Hungarian (overlap wilayah terbesar). Filter outlier
+        (ekstrem + Z-score) diterapkan per jendela; wilayah yang dibuang tidak punya cluster (None).
+        """
+        if zscore_threshold is None:
+            zscore_threshold = self.ZSCORE_THRESHOLD
+        report = progress or _no_progress
+
+        # === 1. Load data (satu matriks wilayah x tahun untuk seluruh rentang) ===
+        report('load')
+        if dataset is None:
+            dataset = self.dataset_cache.get()
+        sector_key = sector.lower()
+        if sector_key != ALL_SECTORS and sector_key not in self.SHEET_MAPPING:
+            raise ValueError(f"Unknown sector: {sector}")
+        data = dataset.sectors[sector_key]
 
-        # === 7. Evaluasi ===
-        silhouette_avg = float(silhouette_score(X_scaled, clusters))
-        silhouette_vals = silhouette_samples(X_scaled, clusters)
+        year_columns = [str(year) for year in range(start_year, end_year + 1)]
+        missing_cols = [col for col in year_columns if col not in data.year_columns]
+        if missing_cols:
+            raise ValueError(f"Columns {missing_cols} not found")
+        if not 1 <= window_size <= len(year_columns):
+            raise ValueError(f"Lebar jendela harus 1-{len(year_columns)} tahun")
+        if step < 1:
+            raise ValueError("Langkah jendela minimal 1 tahun")
+
+        positions = [data.year_columns.index(col) for col in year_columns]
+        X_all = np.nan_to_num(np.asarray(data.values, dtype=np.float64)[:, positions])
+        n_regions = X_all.shape[0]
+
+        # === 2. Fitur per jendela dari prefix sum; outlier dibuang per jendela ===
+        report('features')
+        window_stats = WindowStats(X_all, window_size)
+        offsets = list(range(0, window_stats.n_windows, step))
+        feature_names = list(self.DERIVATIVE_FEATURES)
+
+        windows, window_rows, window_features = [], [], []
+        for offset in offsets:
+            row_means = window_stats.row_stats(offset).mean
+            candidates = np.flatnonzero(row_means <= self.EXTREME_THRESHOLD)
+            z_scores = np.abs(stats.zscore(row_means[candidates]))
+            rows = candidates[z_scores <= zscore_threshold]
+
+            window_rows.append(rows)
+            window_features.append(build_features(
+                X_all[rows, offset:offset + window_size], feature_names,
+                stats=window_stats.row_stats(offset, rows),
+            ))
+            windows.append({
+                'start_year': start_year + offset,
+                'end_year': start_year + offset + window_size - 1,
+                'regions_clustered': int(len(rows)),
+                'extreme_removed': int(n_regions - len(candidates)),
+                'outliers_removed': int(len(candidates) - len(rows)),
+            })
 
-        silhouette_data = []
-        for i in range(n_clusters):
-            vals = silhouette_vals[clusters == i]
-            vals.sort()
-            cluster_silhouette = float(vals.mean()) if len(vals) > 0 else 0.0
-            silhouette_data.append({
-                'cluster_id': int(i),
-                'values': vals.tolist(),
-                'avg': cluster_silhouette
+        # === 3. Fit GMM per jendela, warm start dari jendela sebelumnya ===
+        n_windows = len(offsets)
+        report('gmm', windows=n_windows)
+        logger.debug("GMM windows: %d windows x %d years", n_windows, window_size)
+        fits = _fit_window_chain(self, window_features, window_rows, n_regions, n_clusters, self.N_JOBS)
+
+        # === 4. Selaraskan label antar jendela dan hitung transisi ===
+        report('transitions')
+        labels = np.full((n_windows, n_regions), -1, dtype=np.int64)
+        confidence = np.zeros((n_windows, n_regions))
+        mapping = np.arange(n_clusters)
+        for i, (fit, rows) in enumerate(zip(fits, window_rows)):
+            raw = np.full(n_regions, -1, dtype=np.int64)
+            raw[rows] = fit['clusters']
+            if i > 0:
+                # Warm start biasanya sudah menjaga nomor cluster; Hungarian menangani fallback fit
+                # penuh dan komponen yang bertukar posisi selama EM
+                mapping = _align_labels(labels[i - 1], raw, n_clusters)
+            labels[i, rows] = mapping[fit['clusters']]
+            confidence[i, rows] = fit['confidence']
+
+        for i, (window, offset, fit, rows) in enumerate(zip(windows, offsets, fits, window_rows)):
+            cluster_ids = labels[i, rows]
+            window_means = X_all[rows, offset:offset + window_size].mean(axis=1)
+            window.update({
+                'label': f"{window['start_year']}-{window['end_year']}",
+                'silhouette_score': fit['silhouette_score'],
+                'bic': fit['bic'],
+                'n_iterations': fit['n_iterations'],
+                'converged': fit['converged'],
+                'warm_start': fit['warm_start'],
+                'cluster_stats': [
+                    {
+                        'cluster_id': int(c),
+                        'count': int(np.sum(cluster_ids == c)),
+                        'avg_emission': float(window_means[cluster_ids == c].mean())
+                        if np.any(cluster_ids == c) else 0.0,
+                    }
+                    for c in range(n_clusters)
+                ],
+            })
+
+        # Matriks transisi cluster (from x to) untuk setiap pasangan jendela berurutan
+        transitions = []
+        for i in range(n_windows - 1):
+            both = (labels[i] >= 0) & (labels[i + 1] >= 0)
+            counts = np.zeros((n_clusters, n_clusters), dtype=np.int64)
+            np.add.at(counts, (labels[i, both], labels[i + 1, both]), 1)
+            transitions.append({
+                'from_window': i,
+                'to_window': i + 1,
+                'counts': counts.tolist(),
+                'moved': int(counts.sum() - np.trace(counts)),
             })
-            print(f"Cluster {i} - Size: {len(vals)}, Silhouette: {cluster_silhouette:.4f}")
+
+        # Window x window: proporsi wilayah (yang di-cluster di kedua jendela) yang berpindah cluster
+        present = labels >= 0
+        shared = present[:, None, :] & present[None, :, :]
+        moved = shared & (labels[:, None, :] != labels[None, :, :])
+        shared_counts = shared.sum(axis=2)
+        window_matrix = np.zeros((n_windows, n_windows))
+        np.divide(moved.sum(axis=2), shared_counts, out=window_matrix, where=shared_counts > 0)
+
+        # Lintasan cluster per wilayah (None = dibuang sebagai outlier di jendela tersebut)
+        regions = {}
+        for r, kab in enumerate(data.kabupaten):
+            path = labels[:, r]
+            clustered = path[path >= 0]
+            regions[kab] = {
+                'provinsi': data.provinsi[r],
+                'clusters': [int(c) if c >= 0 else None for c in path.tolist()],
+                'confidence': [float(p) if c >= 0 else None for c, p in zip(path.tolist(), confidence[:, r].tolist())],
+                'changes': int(np.sum(clustered[1:] != clustered[:-1])),
+            }
+
+        return {
+            'sector': sector,
+            'start_year': start_year,
+            'end_year': end_year,
+            'window_size': window_size,
+            'step': step,
+            'n_clusters': int(n_clusters),
+            'zscore_threshold': zscore_threshold,
+            'feature_names': feature_names,
+            'windows': windows,
+            'transitions': transitions,
+            'window_transition_matrix': window_matrix.tolist(),
+            'regions': regions,
+        }
+
+    def build_result(self, prepared, gmm, clusters, n_clusters: int, progress=None):
+        """Evaluasi model dan susun hasil akhir untuk frontend"""
+        report = progress or _no_progress
+        sector = prepared['sector']
+        start_year = prepared['start_year']
+        end_year = prepared['end_year']
+        dataset = prepared['dataset']
+        df = prepared['df']
+        X = prepared['X']
+        X_scaled = prepared['X_scaled']
+        year_columns = prepared['year_columns']
+        extreme_outliers = prepared['extreme_outliers']
+        outliers_info = prepared['outliers_info']
+        zscore_threshold = prepared['zscore_threshold']
+        transform_method = prepared['transform_method']
+
+        # === 7. Evaluasi ===
+        report('evaluate')
+        probabilities = gmm.predict_proba(X_scaled)
 
         gmm_parameters = {
             'weights': gmm.weights_.tolist(),
@@ -366,31 +908,58 @@ class ClusteringService:
             'transform_method': transform_method,
         }
 
+        # Silhouette dicatat sebagai tahap tersendiri (exact vs sampel, lihat evaluate_silhouette)
+        report('silhouette')
+        silhouette = self.evaluate_silhouette(X_scaled, clusters)
+        silhouette_avg = silhouette['score']
+        silhouette_vals = silhouette['samples']
+        logger.debug("Silhouette score (%s): %.4f", silhouette['mode'], silhouette_avg)
 
-        # === 10. Scatter Data ===
-        scatter_data = []
-        for idx in range(len(df)):
-            kabupaten = df.iloc[idx].get('KABUPATEN', 'Unknown')
-            provinsi = df.iloc[idx].get('PROVINSI', 'Unknown')
-            cluster_id = int(clusters[idx])
-            avg_emission = float(X[idx].mean())
-            silhouette_val = float(silhouette_vals[idx])
-            confidence = float(probabilities[idx, cluster_id])
+        silhouette_data = []
+        for i in range(n_clusters):
+            vals = silhouette_vals[clusters == i]
+            vals.sort()
+            cluster_silhouette = float(vals.mean()) if len(vals) > 0 else 0.0
+            silhouette_data.append({
+                'cluster_id': int(i),
+                'values': vals.tolist(),
+                'avg': cluster_silhouette
+            })
+            logger.debug("Cluster %d - Size: %d, Silhouette: %.4f", i, len(vals), cluster_silhouette)
 
-            scatter_data.append({
-                'kabupaten': kabupaten,
-                'provinsi': provinsi,
+        # === 10. Ambil sumber emisi ===
+        report('sources')
+        if sector.lower() == 'all':
+            emission_sources = self.get_all_sectors_sources(start_year, end_year, dataset)
+        else:
+            emission_sources = self.get_emission_sources(sector.lower(), start_year, end_year, dataset)
+
+        # === 11. Kolom per wilayah (dihitung sekaligus dengan NumPy) ===
+        report('assemble')
+        n_regions = len(df)
+        kabupaten = _column_values(df, 'KABUPATEN', 'Unknown')
+        provinsi = _column_values(df, 'PROVINSI', 'Unknown')
+        cluster_list = clusters.astype(int).tolist()
+        avg_emissions = X.mean(axis=1).tolist()
+        silhouette_list = silhouette_vals.tolist()
+        confidences = probabilities[np.arange(n_regions), clusters].tolist()
+        probability_rows = probabilities.tolist()
+
+        scatter_data = [
+            {
+                'kabupaten': kab,
+                'provinsi': prov,
                 'cluster': cluster_id,
                 'avg_emission': avg_emission,
                 'silhouette': silhouette_val,
                 'confidence': confidence
-            })
-
-        # === 11. Tambahkan kolom cluster ===
-        df['Cluster'] = clusters.astype(int)
-        for i in range(n_clusters):
-            df[f'Prob_Cluster_{i+1}'] = probabilities[:, i]
+            }
+            for kab, prov, cluster_id, avg_emission, silhouette_val, confidence in zip(
+                kabupaten, provinsi, cluster_list, avg_emissions, silhouette_list, confidences
+            )
+        ]
 
+        # === 12. Statistik per cluster ===
         cluster_stats = []
         for i in range(n_clusters):
             mask_cluster = clusters == i
@@ -398,24 +967,17 @@ class ClusteringService:
             cluster_stats.append({
                 'cluster_id': int(i),
                 'count': int(np.sum(mask_cluster)),
-                'percentage': float(np.sum(mask_cluster) / len(df) * 100),
+                'percentage': float(np.sum(mask_cluster) / n_regions * 100),
                 'avg_confidence': avg_conf,
                 'avg_emission': float(X[mask_cluster].mean()) if np.sum(mask_cluster) > 0 else 0.0
             })
 
-        # === 12. Ambil sumber emisi ===
-        if sector.lower() == 'all':
-            emission_sources = self.get_all_sectors_sources(start_year, end_year)
-        else:
-            emission_sources = self.get_emission_sources(sector.lower(), start_year, end_year)
-
         # === 13. Data emisi per tahun untuk box plot ===
-        yearly_emissions = {}
-        for idx, row in df.iterrows():
-            kabupaten = row.get('KABUPATEN', '')
-            yearly_emissions[kabupaten] = {}
-            for year_col in year_columns:
-                yearly_emissions[kabupaten][year_col] = float(X[idx, year_columns.index(year_col)])
+        kabupaten_names = _column_values(df, 'KABUPATEN', '')
+        yearly_emissions = {
+            kab: dict(zip(year_columns, row))
+            for kab, row in zip(kabupaten_names, X.tolist())
+        }
 
         # === 14. Susun hasil akhir ===
         all_outliers = extreme_outliers + outliers_info
@@ -426,40 +988,41 @@ class ClusteringService:
             'outliers': all_outliers,
             'extreme_outliers': extreme_outliers,
             'zscore_outliers': outliers_info,
-            'total_regions': int(len(df_original)) + len(extreme_outliers),
+            'total_regions': prepared['total_regions'],
             'extreme_removed': int(len(extreme_outliers)),
             'outliers_removed': int(len(outliers_info)),
-            'regions_clustered': int(len(df)),
+            'regions_clustered': int(n_regions),
             'n_clusters': int(n_clusters),
             'silhouette_score': silhouette_avg,
+            'silhouette_mode': silhouette['mode'],
+            'silhouette_sample_size': silhouette['sample_size'],
             'silhouette_data': silhouette_data,
             'scatter_data': scatter_data,
             'emission_sources': emission_sources,
             'gmm_parameters': gmm_parameters,
             'outlier_method': 'Z-score + Extreme Filter',
-            'zscore_threshold': self.ZSCORE_THRESHOLD,
+            'zscore_threshold': zscore_threshold,
             'yearly_emissions': yearly_emissions,
             'year_columns': year_columns,
             'transform_method': transform_method
         }
 
-        for idx, row in df.iterrows():
-            kabupaten = row.get('KABUPATEN', '')
-            provinsi = row.get('PROVINSI', '')
-            cluster_id = int(row['Cluster'])
-
+        kabupaten_clusters = result['kabupaten_clusters']
+        provinsi_names = _column_values(df, 'PROVINSI', '')
+        for kab, prov, cluster_id, probs, avg_emission in zip(
+            kabupaten_names, provinsi_names, cluster_list, probability_rows, avg_emissions
+        ):
             cluster_info = {
                 'cluster': cluster_id,
-                'provinsi': provinsi,
-                'probabilities': [float(row[f'Prob_Cluster_{i+1}']) for i in range(n_clusters)],
-                'avg_emission': float(X[idx].mean()),
-                'yearly_data': yearly_emissions[kabupaten]
+                'provinsi': prov,
+                'probabilities': probs,
+                'avg_emission': avg_emission,
+                'yearly_data': yearly_emissions[kab]
             }
 
-            if kabupaten in emission_sources:
-                cluster_info['sources'] = emission_sources[kabupaten]
+            if kab in emission_sources:
+                cluster_info['sources'] = emission_sources[kab]
 
-            result['kabupaten_clusters'][kabupaten] = cluster_info
+            kabupaten_clusters[kab] = cluster_info
 
-        print(f"\n=== CLUSTERING COMPLETE ===")
         return result
@@ -0,0 +1,443 @@
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset_snapshots import SnapshotManager
+from dataset_store import DatasetStore
+
+
+# Pemetaan sektor -> nama sheet dan pola sumber emisi (sama dengan ClusteringService)
+SHEET_MAPPING = {
+    'energi': 'Energi',
+    'kehutanan': 'Kehutanan',
+    'limbah': 'Limbah',
+    'pertanian': 'Pertanian',
+    'ippu': 'Ippu'
+}
+
+SOURCE_PATTERNS = {
+    'energi': [
+        'INDUSTRI BATU BARA', 'INDUSTRI ENERGI',
+        'MANUFAKTUR & KONSTRUKSI', 'MINYAK & GAS BUMI',
+        'PERKANTORAN & PEMUKIMAN', 'TRANSPORTASI'
+    ],
+    'kehutanan': ['BIOMASS', 'PEAT DECOMPOSITION', 'PEAT FIRE'],
+    'limbah': [
+        'LIMBAH CAIR DOMESTIK', 'LIMBAH CAIR INDUSTRI',
+        'LIMBAH PADAT', 'PEMBAKARAN', 'PENGOLAHAN SECARA BIOLOGIS'
+    ],
+    'pertanian': [
+        'Biomass Burning', 'Liming', 'Livestock',
+        'N2O from Managed Soils', 'Rice Cultivation', 'Urea'
+    ],
+    'ippu': [
+        'INDUSTRI KIMIA', 'INDUSTRI LOGAM',
+        'INDUSTRI MINERAL', 'INDUSTRI NON-ENERGI', 'LAINNYA'
+    ]
+}
+
+
+class SectorData:
+    """Data satu sektor dalam bentuk array NumPy (hasil parsing Excel satu kali)"""
+
+    def __init__(self, kabupaten, provinsi, year_columns, values,
+                 source_kabupaten, sources, source_years, source_values, source_mask,
+                 region_index=None):
+        # Data agregat: regions x years
+        self.kabupaten = kabupaten
+        self.provinsi = provinsi
+        self.year_columns = year_columns
+        self.values = values
+
+        # Data mentah per sumber: regions x sources x years
+        self.source_kabupaten = source_kabupaten
+        self.sources = sources
+        self.source_years = source_years
+        self.source_values = source_values
+        # source_mask[s, y] = True jika kolom "{source}_{year}" ada di sheet mentah
+        self.source_mask = source_mask
+
+        # Posisi setiap baris pada indeks wilayah kanonik (baris sektor 'all')
+        self.region_index = region_index
+
+        # Prefix sum sepanjang sumbu tahun, dihitung sekali saat pertama dibutuhkan
+        self._source_prefix = None
+
+    def _prefix_sums(self):
+        if self._source_prefix is None:
+            n_regions, n_sources, n_years = self.source_values.shape
+            value_prefix = np.zeros((n_regions, n_sources, n_years + 1), dtype=np.float64)
+            np.cumsum(self.source_values, axis=2, dtype=np.float64, out=value_prefix[:, :, 1:])
+            count_prefix = np.zeros((n_sources, n_years + 1), dtype=np.int64)
+            np.cumsum(self.source_mask, axis=1, out=count_prefix[:, 1:])
+            self._source_prefix = (value_prefix, count_prefix)
+        return self._source_prefix
+
+    def source_averages(self, start_year, end_year):
+        """Rata-rata per sumber atas kolom tahun yang ada di [start_year, end_year].
+
+        Memakai prefix sum sehingga biaya tiap query O(regions x sources).
+        Mengembalikan (daftar sumber, array regions x sumber).
+        """
+        value_prefix, count_prefix = self._prefix_sums()
+        lo = int(np.searchsorted(self.source_years, start_year, side='left'))
+        hi = int(np.searchsorted(self.source_years, end_year, side='right'))
+
+        counts = count_prefix[:, hi] - count_prefix[:, lo]
+        source_sel = np.flatnonzero(counts > 0)
+        sums = value_prefix[:, source_sel, hi] - value_prefix[:, source_sel, lo]
+        averages = sums / counts[source_sel]
+        return [self.sources[s] for s in source_sel], averages
+
+    def to_frame(self):
+        """Bangun DataFrame agregat (KABUPATEN, PROVINSI, tahun...) dari array"""
+        df = pd.DataFrame(self.values, columns=self.year_columns)
+        df.insert(0, 'PROVINSI', self.provinsi)
+        df.insert(0, 'KABUPATEN', self.kabupaten)
+        return df
+
+
+ALL_SECTORS = 'all'
+
+RAW_FILE_NAME = 'data_emisi_klhk_mentah.xlsx'
+AGGREGATED_FILE_NAME = 'data_emisi_gabungan.xlsx'
+
+# Snapshot hasil upload delta: workbook dasar + file delta (berurutan) yang belum digabung
+DELTA_DIR_NAME = 'deltas'
+DELTA_MANIFEST_NAME = 'deltas.json'
+
+
+class Dataset:
+    """Snapshot dataset yang tidak berubah setelah dibuat"""
+
+    def __init__(self, version, sectors, excel_dir=None, path=None):
+        self.version = version
+        self.sectors = sectors
+        self.excel_dir = excel_dir
+        self.path = path  # folder snapshot (workbook mentah + gabungan)
+
+    @property
+    def raw_file(self):
+        return os.path.join(self.path, RAW_FILE_NAME)
+
+    @property
+    def aggregated_file(self):
+        return os.path.join(self.path, AGGREGATED_FILE_NAME)
+
+    @property
+    def year_range(self):
+        """(tahun pertama, tahun terakhir) yang tersedia di semua sektor (= rentang sektor 'all')"""
+        return self.sector_year_range(ALL_SECTORS)
+
+    def sector_year_range(self, sector):
+        """(tahun pertama, tahun terakhir) yang tersedia untuk satu sektor"""
+        years = [int(col) for col in self.sectors[sector].year_columns]
+        return min(years), max(years)
+
+    def __reduce__(self):
+        # Dikirim ke worker process sebagai referensi, bukan salinan array
+        return _pinned_dataset, (self.excel_dir, self.version)
+
+
+class DatasetCache:
+    """Cache dataset bersama di atas snapshot bernomor yang tidak pernah diubah.
+
+    Versi dataset = nomor snapshot yang ditunjuk file CURRENT. Request cukup membaca
+    penunjuk itu; data baru dimuat (mmap dari store snapshot) hanya jika nomornya berubah.
+    """
+
+    def __init__(self, excel_dir=None):
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.EXCEL_DIR = excel_dir or os.path.join(base_dir, 'Excel')
+        # Workbook awal; disalin menjadi snapshot pertama jika belum ada snapshot sama sekali
+        self.RAW_EXCEL_FILE = os.path.join(self.EXCEL_DIR, RAW_FILE_NAME)
+        self.EXCEL_FILE = os.path.join(self.EXCEL_DIR, AGGREGATED_FILE_NAME)
+
+        self.snapshots = SnapshotManager(
+            os.path.join(self.EXCEL_DIR, 'snapshots'),
+            retention=int(os.environ.get('DATASET_SNAPSHOT_RETENTION', '3')),
+        )
+
+        self._dataset = None
+        # Dataset versi tertentu yang dimuat lewat get_version (worker proses), paling banyak RETENTION
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Worker process memakai cache miliknya sendiri (store di-mmap, halaman dibagi antar proses)
+        return shared_cache, (self.EXCEL_DIR,)
+
+    def get(self):
+        """Kembalikan dataset dari snapshot yang sedang dipublikasikan"""
+        version = self.snapshots.current_version()
+        dataset = self._dataset
+        if dataset is not None and dataset.version == version:
+            return dataset
+
+        with self._lock:
+            # Cek ulang: request lain mungkin sudah memuat versi yang sama
+            version = self.snapshots.current_version()
+            if version is None:
+                version = self._bootstrap()
+            dataset = self._dataset
+            if dataset is None or dataset.version != version:
+                dataset = self._load(version)
+                if self._dataset is None or self._dataset.version < version:
+                    self._dataset = dataset
+            return dataset
+
+    def get_version(self, version):
+        """Dataset untuk nomor snapshot tertentu (selama belum terhapus oleh retensi)"""
+        dataset = self._dataset
+        if dataset is not None and dataset.version == version:
+            return dataset
+
+        with self._lock:
+            # Lupakan versi yang snapshot-nya sudah dihapus oleh retensi
+            for cached in [v for v in self._pinned if not os.path.isdir(self.snapshots.snapshot_dir(v))]:
+                del self._pinned[cached]
+
+            dataset = self._pinned.get(version)
+            if dataset is not None:
+                return dataset
+            if not os.path.isdir(self.snapshots.snapshot_dir(version)):
+                raise FileNotFoundError(f"Snapshot dataset versi {version} tidak tersedia lagi")
+
+            dataset = self._load(version)
+            self._pinned[version] = dataset
+            while len(self._pinned) > self.snapshots.RETENTION:
+                del self._pinned[min(self._pinned)]
+            return dataset
+
+    def _bootstrap(self):
+        """Buat snapshot pertama dari workbook di folder Excel"""
+        print(f"📦 Creating first dataset snapshot from {self.EXCEL_DIR}...")
+        staging_dir = self.snapshots.begin()
+        try:
+            shutil.copy2(self.RAW_EXCEL_FILE, os.path.join(staging_dir, RAW_FILE_NAME))
+            shutil.copy2(self.EXCEL_FILE, os.path.join(staging_dir, AGGREGATED_FILE_NAME))
+            self._write_store(staging_dir, with_all_sectors(self._parse_workbooks(staging_dir)))
+            return self.snapshots.commit(staging_dir)
+        except BaseException:
+            self.snapshots.discard(staging_dir)
+            raise
+
+    def _parse_workbooks(self, snapshot_dir):
+        print(f"📦 Loading dataset from Excel...")
+        sheet_names = list(SHEET_MAPPING.values())
+        aggregated = pd.read_excel(os.path.join(snapshot_dir, AGGREGATED_FILE_NAME), sheet_name=sheet_names)
+        raw = pd.read_excel(os.path.join(snapshot_dir, RAW_FILE_NAME), sheet_name=sheet_names)
+
+        sectors = {}
+        for sector, sheet_name in SHEET_MAPPING.items():
+            sectors[sector] = build_sector_data(
+                aggregated[sheet_name], raw[sheet_name], SOURCE_PATTERNS[sector]
+            )
+        return sectors
+
+    def _write_store(self, snapshot_dir, sectors):
+        DatasetStore(os.path.join(snapshot_dir, 'store')).write(sectors, source_version=None)
+
+    def _load(self, version):
+        snapshot_dir = self.snapshots.snapshot_dir(version)
+        stored = DatasetStore(os.path.join(snapshot_dir, 'store')).read()
+        if stored is not None:
+            sectors = {sector: SectorData(**fields) for sector, fields in stored.items()}
+            if ALL_SECTORS not in sectors:
+                # Store dari versi sebelum total lintas sektor disimpan
+                sectors = with_all_sectors(sectors)
+            print(f"📦 Dataset v{version} loaded from store ({len(sectors)} sectors)")
+            return Dataset(version, sectors, self.EXCEL_DIR, snapshot_dir)
+
+        # Store hilang atau formatnya lama: bangun ulang dari workbook snapshot
+        if os.path.exists(os.path.join(snapshot_dir, DELTA_MANIFEST_NAME)):
+            # Workbook snapshot delta belum berisi perubahan; gabungkan dulu lewat UploadService
+            raise RuntimeError(f"Store snapshot v{version} hilang dan workbook-nya belum digabung dengan delta")
+        sectors = with_all_sectors(self._parse_workbooks(snapshot_dir))
+        try:
+            self._write_store(snapshot_dir, sectors)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not write dataset store: {str(e)}")
+
+        print(f"✅ Dataset v{version} cached ({len(sectors)} sectors)")
+        return Dataset(version, sectors, self.EXCEL_DIR, snapshot_dir)
+
+    def begin_snapshot(self):
+        """Folder staging untuk snapshot baru; isi dengan RAW_FILE_NAME dan AGGREGATED_FILE_NAME"""
+        return self.snapshots.begin()
+
+    def discard_snapshot(self, staging_dir):
+        self.snapshots.discard(staging_dir)
+
+    def publish(self, staging_dir, sectors):
+        """Tulis store ke folder staging, publikasikan sebagai snapshot baru, lalu layani data itu.
+
+        Dataset dibangun dari data yang sudah ada di memori (tanpa membaca ulang disk) dan
+        ditukar dengan satu assignment; request yang sedang berjalan tetap memakai dataset
+        lama yang sudah mereka pegang.
+        """
+        sectors = with_all_sectors(sectors)
+        self._write_store(staging_dir, sectors)
+        version = self.snapshots.commit(staging_dir)
+        dataset = Dataset(version, sectors, self.EXCEL_DIR, self.snapshots.snapshot_dir(version))
+        with self._lock:
+            if self._dataset is None or self._dataset.version < version:
+                self._dataset = dataset
+        return dataset
+
+
+_SHARED_CACHES = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_cache(excel_dir):
+    """Satu DatasetCache per proses untuk setiap folder Excel"""
+    with _SHARED_LOCK:
+        if excel_dir not in _SHARED_CACHES:
+            _SHARED_CACHES[excel_dir] = DatasetCache(excel_dir)
+        return _SHARED_CACHES[excel_dir]
+
+
+def _pinned_dataset(excel_dir, version):
+    """Ambil dataset di proses worker dengan nomor snapshot yang sama persis"""
+    return shared_cache(excel_dir).get_version(version)
+
+
+def changed_sectors(previous, current):
+    """Sektor yang datanya berbeda antara dua versi dataset (termasuk 'all' jika ada yang berubah)"""
+    if previous is None:
+        return list(current.sectors)
+
+    def same(a, b):
+        return (
+            list(a.year_columns) == list(b.year_columns)
+            and list(a.sources) == list(b.sources)
+            and [int(y) for y in a.source_years] == [int(y) for y in b.source_years]
+            and np.array_equal(a.kabupaten, b.kabupaten)
+            and np.array_equal(a.provinsi, b.provinsi)
+            and np.array_equal(a.values, b.values)
+            and np.array_equal(a.source_kabupaten, b.source_kabupaten)
+            and np.array_equal(a.source_values, b.source_values)
+            and np.array_equal(a.source_mask, b.source_mask)
+        )
+
+    changed = [
+        sector for sector in SHEET_MAPPING
+        if sector not in previous.sectors or not same(previous.sectors[sector], current.sectors[sector])
+    ]
+    if changed:
+        changed.append(ALL_SECTORS)
+    return changed
+
+
+def region_key(name):
+    """Nama wilayah sebagai kunci pencocokan (None/NaN -> '')"""
+    return '' if name is None or (isinstance(name, float) and np.isnan(name)) else str(name)
+
+
+def with_all_sectors(sectors):
+    """Tambahkan total lintas sektor ('all') pada indeks wilayah kanonik KABUPATEN+PROVINSI.
+
+    Urutan wilayah = urutan kemunculan pertama (sektor sesuai SHEET_MAPPING), sama seperti
+    outer merge berantai yang dulu dijalankan setiap request. Setiap sektor mendapat
+    region_index (posisi barisnya di indeks kanonik). Penjumlahan dilakukan per sektor
+    dengan urutan yang sama, sehingga totalnya identik bit-per-bit.
+    """
+    sectors = {sector: data for sector, data in sectors.items() if sector != ALL_SECTORS}
+
+    positions = {}
+    kabupaten, provinsi = [], []
+    for sector in SHEET_MAPPING:
+        data = sectors[sector]
+        region_index = np.empty(len(data.kabupaten), dtype=np.int64)
+        for i, (kab, prov) in enumerate(zip(data.kabupaten, data.provinsi)):
+            key = (region_key(kab), region_key(prov))
+            pos = positions.get(key)
+            if pos is None:
+                pos = positions[key] = len(kabupaten)
+                kabupaten.append(kab)
+                provinsi.append(prov)
+            region_index[i] = pos
+        data.region_index = region_index
+
+    # Hanya tahun yang ada di setiap sektor; tahun yang baru ditambahkan ke sebagian sektor
+    # (mis. lewat upload delta) tidak boleh dijumlahkan seolah sektor lain bernilai 0
+    common_years = set.intersection(*(set(sectors[sector].year_columns) for sector in SHEET_MAPPING))
+    year_columns = []
+    for sector in SHEET_MAPPING:
+        year_columns += [
+            col for col in sectors[sector].year_columns if col in common_years and col not in year_columns
+        ]
+    year_pos = {col: i for i, col in enumerate(year_columns)}
+
+    values = np.zeros((len(kabupaten), len(year_columns)), dtype=np.float64)
+    for sector in SHEET_MAPPING:
+        data = sectors[sector]
+        keep = np.array([col in year_pos for col in data.year_columns], dtype=bool)
+        cols = np.array([year_pos[col] for col in data.year_columns if col in year_pos], dtype=np.int64)
+        # add.at: baris duplikat dalam satu sektor ikut dijumlahkan ke wilayah yang sama
+        np.add.at(values, (data.region_index[:, None], cols[None, :]), np.asarray(data.values)[:, keep])
+
+    n_regions = len(kabupaten)
+    sectors[ALL_SECTORS] = SectorData(
+        kabupaten=np.array(kabupaten, dtype=object),
+        provinsi=np.array(provinsi, dtype=object),
+        year_columns=year_columns,
+        values=values,
+        source_kabupaten=np.array(kabupaten, dtype=object),
+        sources=[],
+        source_years=[],
+        source_values=np.zeros((n_regions, 0, 0), dtype=np.float64),
+        source_mask=np.zeros((0, 0), dtype=bool),
+        region_index=np.arange(n_regions, dtype=np.int64),
+    )
+    return sectors
+
+
+def build_sector_data(df_agg, df_raw, source_patterns):
+    """Ubah sheet agregat dan sheet mentah satu sektor menjadi SectorData"""
+    df_agg = df_agg.fillna(0)
+    year_columns = [col for col in df_agg.columns if str(col).isdigit()]
+    values = df_agg[year_columns].to_numpy(dtype=np.float64)
+
+    # Petakan kolom "{source}_{year}" ke posisi (source, year)
+    column_map = {}
+    for col in df_raw.columns:
+        name, sep, year = str(col).rpartition('_')
+        if sep and year.isdigit() and name in source_patterns:
+            column_map[col] = (name, int(year))
+
+    sources = [s for s in source_patterns if any(n == s for n, _ in column_map.values())]
+    source_years = sorted({year for _, year in column_map.values()})
+    source_pos = {s: i for i, s in enumerate(sources)}
+    year_pos = {y: i for i, y in enumerate(source_years)}
+
+    # Nilai per sumber disimpan float64: upload delta menghitung ulang total dari nilai ini,
+    # jadi harus sama persis dengan sel workbook (float32 menggeser total dan label GMM)
+    n_regions = len(df_raw)
+    source_values = np.zeros((n_regions, len(sources), len(source_years)), dtype=np.float64)
+    source_mask = np.zeros((len(sources), len(source_years)), dtype=bool)
+    for col, (name, year) in column_map.items():
+        s, y = source_pos[name], year_pos[year]
+        source_values[:, s, y] = pd.to_numeric(df_raw[col], errors='coerce').fillna(0).to_numpy()
+        source_mask[s, y] = True
+
+    source_kabupaten = (
+        df_raw['KABUPATEN'].to_numpy(dtype=object)
+        if 'KABUPATEN' in df_raw.columns else np.array([''] * n_regions, dtype=object)
+    )
+
+    return SectorData(
+        kabupaten=df_agg['KABUPATEN'].to_numpy(dtype=object),
+        provinsi=df_agg['PROVINSI'].to_numpy(dtype=object),
+        year_columns=[str(col) for col in year_columns],
+        values=values,
+        source_kabupaten=source_kabupaten,
+        sources=sources,
+        source_years=source_years,
+        source_values=source_values,
+        source_mask=source_mask,
+    )
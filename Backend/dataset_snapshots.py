@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+
+
+class SnapshotManager:
+    """Snapshot dataset bernomor yang tidak pernah diubah setelah dipublikasikan.
+
+    Setiap snapshot adalah folder v000001, v000002, ... berisi workbook mentah, workbook
+    gabungan dan store kolumnar. Snapshot ditulis dulu ke folder staging, di-rename ke nama
+    finalnya, lalu file penunjuk CURRENT diganti secara atomik (os.replace). Pembaca hanya
+    melihat snapshot yang sudah lengkap; snapshot lama dihapus sesuai RETENTION.
+    """
+
+    CURRENT_FILE_NAME = 'CURRENT'
+    STAGING_PREFIX = '.staging-'
+
+    def __init__(self, root_dir, retention=3):
+        self.ROOT_DIR = root_dir
+        self.CURRENT_FILE = os.path.join(self.ROOT_DIR, self.CURRENT_FILE_NAME)
+        self.RETENTION = max(1, retention)
+
+        self._lock = threading.Lock()
+
+    def snapshot_dir(self, version):
+        return os.path.join(self.ROOT_DIR, f'v{version:06d}')
+
+    def current_version(self):
+        """Nomor snapshot yang sedang dipublikasikan; None jika belum ada"""
+        try:
+            with open(self.CURRENT_FILE, 'r', encoding='utf-8') as f:
+                return int(json.load(f)['version'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    def list_versions(self):
+        """Semua nomor snapshot yang masih ada di disk, urut naik"""
+        try:
+            names = os.listdir(self.ROOT_DIR)
+        except FileNotFoundError:
+            return []
+        versions = []
+        for name in names:
+            if name.startswith('v') and name[1:].isdigit():
+                versions.append(int(name[1:]))
+        return sorted(versions)
+
+    def begin(self):
+        """Buat folder staging untuk snapshot baru"""
+        os.makedirs(self.ROOT_DIR, exist_ok=True)
+        staging_dir = os.path.join(self.ROOT_DIR, f'{self.STAGING_PREFIX}{uuid.uuid4().hex}')
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    def discard(self, staging_dir):
+        """Buang folder staging yang gagal dipublikasikan"""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def commit(self, staging_dir):
+        """Jadikan folder staging snapshot bernomor berikutnya dan arahkan CURRENT ke sana"""
+        with self._lock:
+            versions = self.list_versions()
+            version = (versions[-1] if versions else 0) + 1
+            os.rename(staging_dir, self.snapshot_dir(version))
+
+            tmp_pointer = f"{self.CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(tmp_pointer, 'w', encoding='utf-8') as f:
+                json.dump({'version': version}, f)
+            os.replace(tmp_pointer, self.CURRENT_FILE)
+
+            self._apply_retention(version)
+        return version
+
+    def _apply_retention(self, current):
+        """Simpan RETENTION snapshot terbaru (termasuk CURRENT), hapus sisanya"""
+        versions = [v for v in self.list_versions() if v <= current]
+        for version in versions[:-self.RETENTION]:
+            # Reader yang masih memegang mmap di Linux tetap aman; di Windows penghapusan bisa
+            # gagal dan akan dicoba lagi saat snapshot berikutnya dipublikasikan
+            shutil.rmtree(self.snapshot_dir(version), ignore_errors=True)
@@ -0,0 +1,145 @@
+import json
+import os
+import uuid
+
+import numpy as np
+
+
+class DatasetStore:
+    """Penyimpanan kolumnar biner (.npy + manifest) yang bisa di-memory-map.
+
+    Ditulis saat upload di samping workbook Excel. Nama kabupaten/provinsi disimpan
+    sekali sebagai kamus, setiap sektor hanya menyimpan kode integer-nya.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, store_dir):
+        self.STORE_DIR = store_dir
+        self.MANIFEST_FILE = os.path.join(self.STORE_DIR, 'manifest.json')
+
+    def read_manifest(self):
+        try:
+            with open(self.MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get('format_version') != self.FORMAT_VERSION:
+            return None
+        return manifest
+
+    def read(self, source_version=None):
+        """Baca store dengan mmap; None jika belum ada atau dibuat dari file sumber lain.
+
+        Mengembalikan {sector: dict field SectorData}.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return None
+        if source_version is not None and manifest.get('source_version') != _to_json(source_version):
+            return None
+
+        names = np.array(manifest['names'], dtype=object)
+
+        def load(file_name):
+            return np.load(os.path.join(self.STORE_DIR, file_name), mmap_mode='r')
+
+        try:
+            sectors = {}
+            for sector, meta in manifest['sectors'].items():
+                files = meta['files']
+                sectors[sector] = dict(
+                    kabupaten=names[load(files['kabupaten'])],
+                    provinsi=names[load(files['provinsi'])],
+                    year_columns=meta['year_columns'],
+                    values=load(files['values']),
+                    source_kabupaten=names[load(files['source_kabupaten'])],
+                    sources=meta['sources'],
+                    source_years=meta['source_years'],
+                    source_values=load(files['source_values']),
+                    source_mask=load(files['source_mask']),
+                    region_index=load(files['region_index']) if 'region_index' in files else None,
+                )
+        except (FileNotFoundError, KeyError, ValueError) as e:
+            print(f"⚠️ Warning: Could not read dataset store: {str(e)}")
+            return None
+
+        return sectors
+
+    def write(self, sectors, source_version):
+        """Tulis semua sektor; manifest diganti terakhir secara atomik (os.replace)"""
+        os.makedirs(self.STORE_DIR, exist_ok=True)
+        tag = uuid.uuid4().hex[:8]
+
+        names = []
+        name_codes = {}
+
+        def encode(values):
+            codes = np.empty(len(values), dtype=np.int32)
+            for i, name in enumerate(values):
+                key = '' if name is None else str(name)
+                if key not in name_codes:
+                    name_codes[key] = len(names)
+                    names.append(key)
+                codes[i] = name_codes[key]
+            return codes
+
+        def save(file_name, array):
+            np.save(os.path.join(self.STORE_DIR, file_name), array)
+            return file_name
+
+        sector_meta = {}
+        for sector, data in sectors.items():
+            sector_meta[sector] = {
+                'year_columns': list(data.year_columns),
+                'sources': list(data.sources),
+                'source_years': [int(year) for year in data.source_years],
+                'files': {
+                    'kabupaten': save(f'{sector}_kabupaten.{tag}.npy', encode(data.kabupaten)),
+                    'provinsi': save(f'{sector}_provinsi.{tag}.npy', encode(data.provinsi)),
+                    'values': save(f'{sector}_values.{tag}.npy', np.ascontiguousarray(data.values)),
+                    'source_kabupaten': save(
+                        f'{sector}_source_kabupaten.{tag}.npy', encode(data.source_kabupaten)
+                    ),
+                    'source_values': save(
+                        f'{sector}_source_values.{tag}.npy',
+                        np.ascontiguousarray(data.source_values, dtype=np.float64)
+                    ),
+                    'source_mask': save(f'{sector}_source_mask.{tag}.npy', np.asarray(data.source_mask)),
+                },
+            }
+            if data.region_index is not None:
+                sector_meta[sector]['files']['region_index'] = save(
+                    f'{sector}_region_index.{tag}.npy', np.asarray(data.region_index, dtype=np.int64)
+                )
+
+        manifest = {
+            'format_version': self.FORMAT_VERSION,
+            'source_version': _to_json(source_version),
+            'names': names,
+            'sectors': sector_meta,
+        }
+        tmp_manifest = f"{self.MANIFEST_FILE}.{tag}.tmp"
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_manifest, self.MANIFEST_FILE)
+
+        self._cleanup(keep_tag=tag)
+        return manifest
+
+    def _cleanup(self, keep_tag):
+        """Hapus file .npy dari versi lama (reader lama tetap aman karena mmap)"""
+        for file_name in os.listdir(self.STORE_DIR):
+            if file_name.endswith('.npy') and f'.{keep_tag}.' not in file_name:
+                try:
+                    os.remove(os.path.join(self.STORE_DIR, file_name))
+                except OSError:
+                    # Di Windows file yang sedang di-mmap tidak bisa dihapus; coba lagi di upload berikutnya
+                    pass
+
+
+def _to_json(value):
+    """Normalisasi tuple bertingkat menjadi list agar bisa dibandingkan dengan isi JSON"""
+    if isinstance(value, (tuple, list)):
+        return [_to_json(v) for v in value]
+    return value
@@ -0,0 +1,179 @@
+import numpy as np
+
+
+class RowStats:
+    """Statistik per baris (kabupaten) yang dihitung sekali dan dipakai bersama oleh fitur"""
+
+    def __init__(self, X, precomputed=None):
+        self.X = X
+        # Statistik yang sudah dihitung di luar (mis. dari WindowStats) tidak dihitung ulang
+        self._cache = dict(precomputed or {})
+
+    def _get(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def mean(self):
+        return self._get('mean', lambda: self.X.mean(axis=1))
+
+    @property
+    def std(self):
+        return self._get('std', lambda: self.X.std(axis=1))
+
+    @property
+    def min(self):
+        return self._get('min', lambda: self.X.min(axis=1))
+
+    @property
+    def max(self):
+        return self._get('max', lambda: self.X.max(axis=1))
+
+    @property
+    def trend(self):
+        """(slope, intercept, r2) regresi linear tiap baris terhadap indeks tahun 0..n-1"""
+        return self._get('trend', lambda: linear_trend(self.X))
+
+
+def linear_trend(X):
+    """Least squares tertutup untuk semua baris sekaligus (setara np.polyfit(x, X[i], 1))"""
+    n_years = X.shape[1]
+    x = np.arange(n_years, dtype=np.float64)
+    x_centered = x - x.mean()
+    sxx = float(x_centered @ x_centered)
+
+    y_mean = X.mean(axis=1)
+    if sxx == 0:
+        # Hanya satu tahun: polyfit memberi slope 0 dan intercept = nilai itu sendiri
+        slope = np.zeros(X.shape[0])
+    else:
+        slope = (X @ x_centered) / sxx
+    intercept = y_mean - slope * x.mean()
+
+    # R² = 1 - SS_res / SS_tot (0 jika baris konstan)
+    residuals = X - (intercept[:, None] + slope[:, None] * x[None, :])
+    ss_res = np.einsum('ij,ij->i', residuals, residuals)
+    y_centered = X - y_mean[:, None]
+    ss_tot = np.einsum('ij,ij->i', y_centered, y_centered)
+    r2 = np.zeros(X.shape[0])
+    np.divide(ss_tot - ss_res, ss_tot, out=r2, where=ss_tot > 0)
+
+    return slope, intercept, r2
+
+
+class WindowStats:
+    """Statistik per baris untuk setiap jendela `window` tahun, dihitung dari prefix sum.
+
+    Jumlah, jumlah kuadrat dan jumlah berbobot indeks tahun dihitung kumulatif sekali untuk
+    seluruh rentang, sehingga mean/std/trend satu jendela hanya O(n_wilayah) berapa pun lebarnya.
+    Min/max diambil dari sliding_window_view (tanpa salinan data).
+    """
+
+    def __init__(self, X, window):
+        X = np.asarray(X, dtype=np.float64)
+        n_regions, n_years = X.shape
+        if not 1 <= window <= n_years:
+            raise ValueError(f"Lebar jendela harus 1-{n_years} tahun")
+        self.X = X
+        self.window = window
+
+        # Geser tiap baris dengan rata-ratanya agar jumlah kuadrat tidak kehilangan presisi
+        self._offset = X.mean(axis=1)
+        Y = X - self._offset[:, None]
+        t = np.arange(n_years, dtype=np.float64)
+        self._sum = self._prefix(Y)
+        self._sum_sq = self._prefix(Y * Y)
+        self._sum_t = self._prefix(Y * t)
+
+        windows = np.lib.stride_tricks.sliding_window_view(X, window, axis=1)
+        self._min = windows.min(axis=2)
+        self._max = windows.max(axis=2)
+
+    @staticmethod
+    def _prefix(values):
+        prefix = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.float64)
+        np.cumsum(values, axis=1, out=prefix[:, 1:])
+        return prefix
+
+    @property
+    def n_windows(self):
+        return self._min.shape[1]
+
+    def row_stats(self, start, rows=None):
+        """RowStats untuk kolom [start, start + window) dengan mean/std/min/max/trend terisi.
+
+        rows (mask/indeks) memilih sebagian baris, mis. setelah outlier dibuang.
+        """
+        rows = slice(None) if rows is None else rows
+        w = self.window
+        end = start + w
+
+        s1 = (self._sum[:, end] - self._sum[:, start])[rows]
+        s2 = (self._sum_sq[:, end] - self._sum_sq[:, start])[rows]
+        # Jumlah berbobot indeks relatif jendela (0..w-1)
+        st = (self._sum_t[:, end] - self._sum_t[:, start])[rows] - start * s1
+
+        shifted_mean = s1 / w
+        ss_tot = np.maximum(s2 - s1 * shifted_mean, 0.0)
+        # Selisih prefix sum membawa galat sebesar ~eps x jumlah kumulatif; di bawah itu jendela
+        # dianggap konstan (std 0, r2 0) seperti perhitungan langsung
+        ss_tot[ss_tot <= 1e-11 * self._sum_sq[rows, end]] = 0.0
+        mean = self._offset[rows] + shifted_mean
+
+        # Regresi linear tertutup terhadap indeks 0..w-1 (sama dengan linear_trend)
+        x_mean = (w - 1) / 2
+        sxx = w * (w * w - 1) / 12
+        slope = (st - x_mean * s1) / sxx if sxx > 0 else np.zeros_like(s1)
+        intercept = mean - slope * x_mean
+        r2 = np.zeros_like(s1)
+        np.divide(slope * slope * sxx, ss_tot, out=r2, where=ss_tot > 0)
+        np.clip(r2, 0.0, 1.0, out=r2)
+
+        return RowStats(self.X[rows, start:end], precomputed={
+            'mean': mean,
+            'std': np.sqrt(ss_tot / w),
+            'min': self._min[rows, start],
+            'max': self._max[rows, start],
+            'trend': (slope, intercept, r2),
+        })
+
+
+# Fitur turunan yang tersedia: nama -> fungsi(RowStats) yang mengembalikan array 1-D
+DERIVATIVE_FEATURES = {
+    'mean': lambda s: s.mean,
+    'std': lambda s: s.std,
+    'trend': lambda s: s.trend[0],
+    'cv': lambda s: s.std / (np.abs(s.mean) + 1e-8),
+    'min': lambda s: s.min,
+    'max': lambda s: s.max,
+    'intercept': lambda s: s.trend[1],
+    'r2': lambda s: s.trend[2],
+}
+
+# Urutan default (sama dengan fitur yang dipakai sejak awal)
+DEFAULT_FEATURES = ['mean', 'std', 'trend', 'cv', 'min', 'max']
+
+
+def register_feature(name, func):
+    """Tambahkan fitur turunan baru; func menerima RowStats dan mengembalikan array per baris"""
+    DERIVATIVE_FEATURES[name] = func
+
+
+def build_features(X, feature_names=None, stats=None):
+    """Gabungkan data original dengan fitur turunan sesuai urutan feature_names.
+
+    stats (RowStats untuk X) boleh diberikan jika statistiknya sudah dihitung, mis. dari WindowStats.
+    """
+    if feature_names is None:
+        feature_names = DEFAULT_FEATURES
+
+    if stats is None:
+        stats = RowStats(X)
+    columns = [X]
+    for name in feature_names:
+        if name not in DERIVATIVE_FEATURES:
+            raise ValueError(f"Unknown derivative feature: {name}")
+        columns.append(np.asarray(DERIVATIVE_FEATURES[name](stats), dtype=np.float64).reshape(-1, 1))
+
+    return np.hstack(columns)
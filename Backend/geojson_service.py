@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from dataset_cache import ALL_SECTORS
+from region_index import RegionIndex
+
+
+def etag_matches(if_none_match, etag):
+    """True jika header If-None-Match cocok dengan etag (perbandingan lemah, daftar koma, '*')"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class GeoJSONService:
+    """GeoJSON peta yang dibaca sekali lalu disajikan sebagai byte siap kirim.
+
+    Setiap tingkat detail (full, medium, low) di-encode sekali (JSON ringkas + gzip) dan
+    diberi ETag; semuanya dibuang otomatis jika file GeoJSON berubah (mtime/size).
+    """
+
+    # detail -> (toleransi Douglas-Peucker dalam derajat, jumlah desimal koordinat)
+    DETAIL_LEVELS = {
+        'full': (None, None),
+        'medium': (0.001, 4),
+        'low': (0.01, 3),
+    }
+
+    def __init__(self, geojson_file):
+        self.GEOJSON_FILE = geojson_file
+        self.GZIP_LEVEL = 6
+        # Properti feature yang berisi nama kabupaten/kota dan provinsi
+        self.FEATURE_NAME_PROPERTY = 'shapeName'
+        self.FEATURE_PROVINCE_PROPERTY = 'Provinsi'
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._geojson = None
+        self._encoded = {}  # detail -> {'body', 'gzip', 'etag', 'gzip_etag'}
+        self._region_indexes = {}  # versi dataset -> RegionIndex
+
+    def _file_version(self):
+        st = os.stat(self.GEOJSON_FILE)  # FileNotFoundError jika peta belum ada
+        return (st.st_mtime_ns, st.st_size)
+
+    def get_geojson(self):
+        """GeoJSON hasil parsing (dipakai bersama, jangan diubah)"""
+        version = self._file_version()
+        with self._lock:
+            if self._version != version:
+                with open(self.GEOJSON_FILE, 'r', encoding='utf-8') as f:
+                    self._geojson = json.load(f)
+                self._encoded = {}
+                self._region_indexes = {}
+                self._version = version
+            return self._geojson
+
+    def get_encoded(self, detail='full'):
+        """Byte JSON, byte gzip dan ETag untuk satu tingkat detail"""
+        if detail not in self.DETAIL_LEVELS:
+            raise ValueError(
+                f"Detail tidak dikenal: {detail} (pilihan: {', '.join(self.DETAIL_LEVELS)})"
+            )
+
+        geojson = self.get_geojson()
+        with self._lock:
+            encoded = self._encoded.get(detail)
+        if encoded is not None:
+            return encoded
+
+        tolerance, decimals = self.DETAIL_LEVELS[detail]
+        data = geojson if tolerance is None else simplify_geojson(geojson, tolerance, decimals)
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha1(body).hexdigest()[:16]
+        encoded = {
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=self.GZIP_LEVEL),
+            # ETag kuat harus berbeda per representasi (identity vs gzip)
+            'etag': f'"{detail}-{digest}"',
+            'gzip_etag': f'"{detail}-{digest}-gz"',
+        }
+
+        with self._lock:
+            # Simpan hanya jika file tidak berubah selama encoding
+            if self._geojson is geojson:
+                self._encoded[detail] = encoded
+        return encoded
+
+    def region_index(self, dataset):
+        """RegionIndex untuk pasangan (GeoJSON saat ini, versi dataset), dibangun sekali"""
+        geojson = self.get_geojson()
+        with self._lock:
+            index = self._region_indexes.get(dataset.version)
+        if index is not None:
+            return index
+
+        regions = dataset.sectors[ALL_SECTORS]
+        index = RegionIndex(
+            geojson.get('features', []),
+            regions.kabupaten,
+            regions.provinsi,
+            name_property=self.FEATURE_NAME_PROPERTY,
+            province_property=self.FEATURE_PROVINCE_PROPERTY,
+        )
+
+        with self._lock:
+            if self._geojson is geojson:
+                # Cukup simpan indeks untuk versi dataset terbaru
+                self._region_indexes = {dataset.version: index}
+        return index
+
+
+def simplify_geojson(geojson, tolerance, decimals):
+    """Salinan GeoJSON dengan geometri disederhanakan (Douglas-Peucker) dan koordinat dibulatkan"""
+    features = []
+    for feature in geojson.get('features', []):
+        simplified = dict(feature)
+        if feature.get('geometry'):
+            simplified['geometry'] = _simplify_geometry(feature['geometry'], tolerance, decimals)
+        features.append(simplified)
+    return {**geojson, 'features': features}
+
+
+def _simplify_geometry(geometry, tolerance, decimals):
+    geometry_type = geometry.get('type')
+    coords = geometry.get('coordinates')
+
+    if geometry_type == 'LineString':
+        coords = _simplify_line(coords, tolerance, decimals, min_points=2)
+    elif geometry_type == 'MultiLineString':
+        coords = [_simplify_line(line, tolerance, decimals, min_points=2) for line in coords]
+    elif geometry_type == 'Polygon':
+        coords = [_simplify_line(ring, tolerance, decimals, min_points=4) for ring in coords]
+    elif geometry_type == 'MultiPolygon':
+        coords = [
+            [_simplify_line(ring, tolerance, decimals, min_points=4) for ring in polygon]
+            for polygon in coords
+        ]
+    elif geometry_type == 'GeometryCollection':
+        return {
+            **geometry,
+            'geometries': [_simplify_geometry(g, tolerance, decimals) for g in geometry['geometries']],
+        }
+    else:
+        return geometry
+
+    return {**geometry, 'coordinates': coords}
+
+
+def _simplify_line(points, tolerance, decimals, min_points):
+    """Douglas-Peucker iteratif; garis/ring yang terlalu pendek setelah disederhanakan dibiarkan utuh"""
+    pts = np.asarray(points, dtype=np.float64)
+    n = len(pts)
+    if n <= min_points:
+        return np.round(pts, decimals).tolist()
+
+    xy = pts[:, :2]
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        a, b = xy[start], xy[end]
+        segment = xy[start + 1:end]
+        dx, dy = b - a
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            # Ring tertutup: ujung = awal, pakai jarak ke titik itu
+            dist = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (segment[:, 1] - a[1]) - dy * (segment[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    if keep.sum() < min_points:
+        return np.round(pts, decimals).tolist()
+    return np.round(pts[keep], decimals).tolist()
@@ -0,0 +1,125 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Dilempar dari callback progress ketika job dibatalkan"""
+
+
+class JobQueueFullError(Exception):
+    """Terlalu banyak job yang belum selesai"""
+
+
+class Job:
+    """Satu pekerjaan latar belakang beserta status dan progress-nya"""
+
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.status = 'queued'  # queued | running | completed | failed | cancelled
+        self.progress = {'stage': 'queued'}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def report(self, stage, **info):
+        """Callback progress untuk service; sekaligus titik pembatalan"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} dibatalkan")
+        self.progress = {'stage': stage, **info}
+
+    def to_dict(self):
+        now = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': now - self.started_at if self.started_at else 0.0,
+        }
+
+
+class JobManager:
+    """Menjalankan job di worker latar belakang dan menyimpan hasilnya selama RESULT_TTL detik"""
+
+    def __init__(self, max_workers=2, max_pending=16, result_ttl=3600):
+        self.MAX_WORKERS = max_workers
+        self.MAX_PENDING = max_pending
+        self.RESULT_TTL = result_ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, params):
+        """Jadwalkan func(report) sebagai job baru; func menerima callback progress"""
+        self._purge_expired()
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.is_finished)
+            if pending >= self.MAX_PENDING:
+                raise JobQueueFullError("Terlalu banyak job yang sedang berjalan, coba lagi nanti")
+
+            job = Job(uuid.uuid4().hex, params)
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        if job.status == 'cancelled':
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.report('started')
+            job.result = func(job.report)
+            job.status = 'completed'
+            job.progress = {'stage': 'completed'}
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        self._purge_expired()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Minta pembatalan; job berhenti pada titik progress berikutnya"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job._cancel_event.set()
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+        return job
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished and now - job.finished_at > self.RESULT_TTL
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,22 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
-from typing import Optional
-import json
+from typing import List, Optional
+import asyncio
 import os
+import time
 
 from clustering_service import ClusteringService
+from dataset_cache import DatasetCache, changed_sectors
+from geojson_service import GeoJSONService, etag_matches
+from job_manager import JobManager, JobQueueFullError
+from metrics import MetricsRegistry, StageTimer, run_timed, server_timing
+from model_registry import ModelRegistry
+from result_cache import ResultCache, StageCache
+from result_format import format_result
 from upload_service import UploadService
+from worker_pool import PoolBusyError, WorkerPool
 
 app = FastAPI()
 
@@ -29,11 +38,52 @@ class ClusteringRequest(BaseModel):
     zscore_threshold: float = 3.0  # default ambang Z-score
 
 
+class SweepRequest(BaseModel):
+    start_year: int
+    end_year: int
+    sector: str
+    min_clusters: int = 2
+    max_clusters: int = 7
+    zscore_threshold: float = 3.0
+    select_by: str = 'bic'  # bic | aic | silhouette
+    include_best_result: bool = False
+
+
+class WindowClusteringRequest(ClusteringRequest):
+    window_size: int = 5  # jumlah tahun per jendela
+    step: int = 1  # pergeseran antar jendela (tahun)
+
+
+class StabilityRequest(ClusteringRequest):
+    n_runs: int = 100
+    method: str = 'subsample'  # subsample | bootstrap
+    sample_fraction: float = 0.8  # hanya untuk subsample
+    include_matrix: bool = False  # sertakan matriks co-assignment wilayah x wilayah
+
+
+class RegionSeries(BaseModel):
+    kabupaten: Optional[str] = None
+    provinsi: Optional[str] = None
+    values: List[Optional[float]]  # satu nilai per tahun (start_year..end_year), kosong = 0
+
+
+class PredictRequest(BaseModel):
+    start_year: int
+    end_year: int
+    sector: str
+    n_clusters: int = 3
+    zscore_threshold: float = 3.0
+    regions: List[RegionSeries]
+
+
 class ClusteringResponse(BaseModel):
     success: bool
     message: str
     data: Optional[dict] = None
 
+class TimedClusteringResponse(ClusteringResponse):
+    timings: Optional[dict] = None
+
 class UploadResponse(BaseModel):
     success: bool
     message: str
@@ -43,49 +93,551 @@ class UploadResponse(BaseModel):
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 GEOJSON_FILE = os.path.join(os.path.dirname(BASE_DIR), 'Frontend', 'geojson', 'peta_indonesia_update3.geojson')
 
-# Initialize services
-clustering_service = ClusteringService()
-upload_service = UploadService()
+# Initialize services (berbagi satu cache dataset)
+dataset_cache = DatasetCache()
+# Pipeline hasil fit disimpan per versi dataset + parameter untuk /api/clustering/predict
+model_registry = ModelRegistry(dataset_cache, max_loaded=int(os.environ.get('MODEL_REGISTRY_MAX_LOADED', '32')))
+# Hasil antara pipeline (filter outlier, fitur, transformer) agar request yang hanya berbeda
+# n_clusters tidak mengulang PowerTransformer; dibatasi ukuran dalam MB
+stage_cache = StageCache(max_bytes=int(os.environ.get('CLUSTERING_STAGE_CACHE_MAX_MB', '64')) * 1024 * 1024)
+clustering_service = ClusteringService(dataset_cache, model_registry, stage_cache)
+upload_service = UploadService(dataset_cache)
+geojson_service = GeoJSONService(GEOJSON_FILE)
+
+# Cache hasil clustering (LRU, dibatasi ukuran dalam MB)
+result_cache = ResultCache(max_bytes=int(os.environ.get('CLUSTERING_CACHE_MAX_MB', '128')) * 1024 * 1024)
+
+# Pool worker clustering agar fit GMM tidak memblokir event loop (mode: thread atau process)
+clustering_pool = WorkerPool(
+    max_workers=int(os.environ.get('CLUSTERING_WORKERS', min(4, os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('CLUSTERING_QUEUE_SIZE', '8')),
+    mode=os.environ.get('CLUSTERING_EXECUTOR', 'thread'),
+)
+
+# Job clustering asinkron (hasil disimpan selama CLUSTERING_JOB_TTL detik)
+job_manager = JobManager(
+    max_workers=int(os.environ.get('CLUSTERING_JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('CLUSTERING_JOB_MAX_PENDING', '16')),
+    result_ttl=int(os.environ.get('CLUSTERING_JOB_TTL', '3600')),
+)
+
+# Upload diproses satu per satu di latar belakang; request upload langsung dijawab 202
+upload_jobs = JobManager(
+    max_workers=1,
+    max_pending=int(os.environ.get('UPLOAD_JOB_MAX_PENDING', '2')),
+    result_ttl=int(os.environ.get('UPLOAD_JOB_TTL', '3600')),
+)
+
+# Metrik Prometheus (/metrics) dan header Server-Timing; METRICS_ENABLED=0 mematikan instrumentasi
+metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
+clustering_stage_seconds = metrics.histogram(
+    'clustering_stage_seconds', 'Durasi per tahap perform_clustering', ['stage'])
+clustering_duration_seconds = metrics.histogram(
+    'clustering_duration_seconds', 'Durasi total perform_clustering (cache miss)', ['sector'])
+clustering_regions = metrics.histogram(
+    'clustering_regions', 'Jumlah wilayah yang di-cluster',
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000))
+clustering_gmm_iterations = metrics.histogram(
+    'clustering_gmm_iterations', 'Iterasi EM model GMM terbaik', buckets=(5, 10, 25, 50, 100, 200, 500))
+clustering_gmm_not_converged = metrics.counter(
+    'clustering_gmm_not_converged_total', 'Fit GMM yang tidak konvergen')
+clustering_requests = metrics.counter(
+    'clustering_requests_total', 'Request clustering menurut status cache (hit | miss)', ['cache'])
+upload_stage_seconds = metrics.histogram(
+    'upload_stage_seconds', 'Durasi per tahap pemrosesan upload', ['stage'])
+metrics.collect('clustering_cache_entries', 'Jumlah hasil di cache clustering',
+                lambda: result_cache.stats()['entries'])
+metrics.collect('clustering_cache_bytes', 'Perkiraan ukuran cache clustering (byte)',
+                lambda: result_cache.stats()['bytes'])
+metrics.collect('clustering_cache_coalesced_total', 'Request identik yang digabung ke komputasi berjalan',
+                lambda: result_cache.stats()['coalesced'], kind='counter')
+metrics.collect('clustering_cache_evictions_total', 'Hasil yang dikeluarkan dari cache clustering',
+                lambda: result_cache.stats()['evictions'], kind='counter')
+metrics.collect('clustering_stage_cache_bytes', 'Perkiraan ukuran cache tahap pipeline (byte)',
+                lambda: stage_cache.stats()['bytes'])
+metrics.collect('clustering_stage_cache_hits_total', 'Tahap pipeline yang diambil dari cache',
+                lambda: stage_cache.stats()['hits'] + stage_cache.stats()['coalesced'], kind='counter')
+metrics.collect('clustering_stage_cache_misses_total', 'Tahap pipeline yang dihitung',
+                lambda: stage_cache.stats()['misses'], kind='counter')
+metrics.collect('clustering_pool_queue_depth', 'Pekerjaan clustering yang menunggu worker',
+                lambda: clustering_pool.stats()['queue_depth'])
+metrics.collect('clustering_pool_rejected_total', 'Request clustering yang ditolak karena antrian penuh',
+                lambda: clustering_pool.stats()['rejected'], kind='counter')
+
+@app.on_event("startup")
+def warm_dataset_cache():
+    """Parse workbook sekali saat startup agar request pertama tidak membaca Excel"""
+    try:
+        dataset_cache.get()
+        model_registry.load()
+    except Exception as e:
+        print(f"⚠️ Warning: Could not preload dataset: {str(e)}")
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    clustering_pool.shutdown()
+    job_manager.shutdown()
+    upload_jobs.shutdown()
 
 @app.get("/")
 def read_root():
     return {"message": "Emissions Clustering API", "status": "running"}
 
 # ============== CLUSTERING ENDPOINTS ==============
-@app.post("/api/clustering", response_model=ClusteringResponse)
-async def run_clustering(request: ClusteringRequest):
-    """Run clustering analysis and return results"""
+def validate_clustering_request(request: ClusteringRequest, dataset):
+    """Validasi parameter clustering; lempar HTTPException 400 jika tidak valid.
+
+    Rentang tahun yang diterima mengikuti data sektor yang diminta pada versi dataset yang dipakai
+    (untuk 'all': tahun yang ada di semua sektor).
+    """
+    sector = request.sector.lower()
+    if sector not in dataset.sectors:
+        raise HTTPException(status_code=400, detail=f"Unknown sector: {request.sector}")
+
+    first_year, last_year = dataset.sector_year_range(sector)
+    if request.start_year < first_year or request.end_year > last_year:
+        raise HTTPException(status_code=400, detail=f"Tahun harus {first_year}-{last_year}")
+
+    if request.start_year > request.end_year:
+        raise HTTPException(status_code=400, detail="Tahun akhir tidak bisa dibawah tahun awal")
+
+    if request.n_clusters < 2:
+        raise HTTPException(status_code=400, detail="Jumlah cluster harus minimal 2")
+
+    if request.n_clusters > 7:
+        raise HTTPException(status_code=400, detail="Jumlah cluster maksimal 10")
+
+    if request.zscore_threshold <= 0:
+        raise HTTPException(status_code=400, detail="Ambang Z-score harus lebih dari 0")
+
+def clustering_cache_key(request: ClusteringRequest, dataset):
+    return (
+        dataset.version,
+        request.sector.lower(),
+        request.start_year,
+        request.end_year,
+        request.n_clusters,
+        request.zscore_threshold,
+    )
+
+def record_clustering(result, stages, sector):
+    """Catat durasi per tahap, jumlah wilayah dan iterasi GMM dari satu clustering"""
+    for stage, seconds in stages.items():
+        clustering_stage_seconds.observe(seconds, stage=stage)
+    clustering_duration_seconds.observe(sum(stages.values()), sector=sector.lower())
+    clustering_regions.observe(result['regions_clustered'])
+    clustering_gmm_iterations.observe(result['gmm_parameters']['n_iterations'])
+    if not result['gmm_parameters']['converged']:
+        clustering_gmm_not_converged.inc()
+
+async def cached_clustering(request: ClusteringRequest, dataset, timings=None):
+    """Hasil clustering dari cache, atau dihitung di pool worker (request identik digabung).
+
+    Jika timings (dict) diberikan, diisi 'cache' (hit | miss) dan 'stages' (detik per tahap,
+    kosong jika hasil dari cache atau metrik dimatikan).
+    """
+    timings = {} if timings is None else timings
+    timings.update(cache='hit', stages={})
+    params = dict(
+        start_year=request.start_year,
+        end_year=request.end_year,
+        sector=request.sector,
+        n_clusters=request.n_clusters,
+        zscore_threshold=request.zscore_threshold,
+        dataset=dataset,
+    )
+
+    async def compute():
+        timings['cache'] = 'miss'
+        if not metrics.ENABLED:
+            return await clustering_pool.run(clustering_service.perform_clustering, **params)
+        result, stages = await clustering_pool.run(run_timed, clustering_service.perform_clustering, **params)
+        record_clustering(result, stages, request.sector)
+        timings['stages'] = stages
+        return result
+
+    result = await result_cache.get_or_compute_async(clustering_cache_key(request, dataset), compute)
+    if metrics.ENABLED:
+        clustering_requests.inc(cache=timings['cache'])
+    return result
+
+@app.post("/api/clustering", response_model=TimedClusteringResponse, response_model_exclude_unset=True)
+async def run_clustering(
+    request: ClusteringRequest,
+    response: Response,
+    result_format: str = Query('json', alias='format'),
+    fields: Optional[str] = None,
+    timings: bool = False,
+):
+    """Run clustering analysis and return results.
+
+    ?format=columnar mengirim data per wilayah sebagai array paralel; ?fields=a,b hanya
+    mengirim field tersebut. Tanpa parameter, bentuk JSON tidak berubah.
+    ?timings=true menambahkan field timings (status cache, detik per tahap); jika metrik aktif,
+    durasi yang sama selalu dikirim di header Server-Timing.
+    """
     try:
-        if request.start_year < 2000 or request.end_year > 2024:
-            raise HTTPException(status_code=400, detail="Tahun harus 2000-2024")
-        
-        if request.start_year > request.end_year:
-            raise HTTPException(status_code=400, detail="Tahun akhir tidak bisa dibawah tahun awal")
-        
-        if request.n_clusters < 2:
-            raise HTTPException(status_code=400, detail="Jumlah cluster harus minimal 2")
-        
-        if request.n_clusters > 7:
-            raise HTTPException(status_code=400, detail="Jumlah cluster maksimal 10")
+        started = time.perf_counter()
+        timing = {}
+        # Pin satu versi dataset agar kunci cache dan data yang dipakai selalu sama
+        dataset = dataset_cache.get()
+        validate_clustering_request(request, dataset)
+        result = await cached_clustering(request, dataset, timing)
+        data = format_result(result, result_format, fields)
+        total = time.perf_counter() - started
+
+        if metrics.ENABLED:
+            response.headers["Server-Timing"] = server_timing(
+                {**timing['stages'], 'total': total}, cache=timing['cache']
+            )
+
+        body = TimedClusteringResponse(
+            success=True,
+            message="Clustering completed successfully",
+            data=data
+        )
+        if timings:
+            body.timings = {**timing, 'total_seconds': total}
+        return body
         
-        result = clustering_service.perform_clustering(
+
+    except HTTPException:
+        raise
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error {str(e)}")
+
+@app.post("/api/clustering/choropleth")
+async def run_clustering_choropleth(request: ClusteringRequest):
+    """Cluster dan confidence per feature id GeoJSON (urutan feature), siap untuk pewarnaan peta.
+
+    cluster = -1 untuk feature tanpa data (nama tidak cocok atau wilayah dibuang sebagai outlier).
+    """
+    try:
+        dataset = dataset_cache.get()
+        validate_clustering_request(request, dataset)
+        result = await cached_clustering(request, dataset)
+        # Indeks dibangun (fuzzy matching nama) pada panggilan pertama per versi dataset
+        index = await asyncio.to_thread(geojson_service.region_index, dataset)
+
+        return {
+            "dataset_version": dataset.version,
+            "n_clusters": result['n_clusters'],
+            "features": index.n_features,
+            **index.choropleth(result['scatter_data']),
+        }
+
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="GeoJSON file not found")
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error {str(e)}")
+
+@app.post("/api/clustering/predict")
+async def predict_clustering(request: PredictRequest):
+    """Cluster dan predict_proba untuk deret waktu wilayah baru/revisi tanpa fit ulang.
+
+    Model dicari dengan parameter yang sama seperti /api/clustering pada versi dataset saat ini;
+    404 jika model untuk parameter tersebut belum pernah di-fit. outlier = 'extreme' / 'zscore'
+    untuk wilayah yang akan dibuang oleh filter outlier jika data itu ikut di-fit.
+    """
+    params = ClusteringRequest(**request.model_dump(exclude={'regions'}))
+    dataset = dataset_cache.get()
+    validate_clustering_request(params, dataset)
+    if not request.regions:
+        raise HTTPException(status_code=400, detail="Minimal satu wilayah harus dikirim")
+
+    # get() bisa membaca artefak joblib dari disk; jangan blokir event loop
+    model = await asyncio.to_thread(model_registry.get, ModelRegistry.make_key(*clustering_cache_key(params, dataset)))
+    if model is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Model belum tersedia; jalankan /api/clustering dengan parameter yang sama terlebih dahulu"
+        )
+
+    n_years = len(model.year_columns)
+    invalid = [i for i, region in enumerate(request.regions) if len(region.values) != n_years]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Setiap wilayah harus berisi {n_years} nilai ({model.year_columns[0]}-"
+                   f"{model.year_columns[-1]}); tidak sesuai pada indeks {invalid}"
+        )
+
+    predicted = model.predict([region.values for region in request.regions])
+    predictions = [
+        {
+            'kabupaten': region.kabupaten,
+            'provinsi': region.provinsi,
+            'cluster': predicted['cluster'][i],
+            'confidence': predicted['confidence'][i],
+            'probabilities': predicted['probabilities'][i],
+            'avg_emission': predicted['avg_emission'][i],
+            'z_score': predicted['z_score'][i],
+            'outlier': predicted['outlier'][i],
+        }
+        for i, region in enumerate(request.regions)
+    ]
+    return {
+        "dataset_version": dataset.version,
+        "model": model.summary(),
+        "predictions": predictions,
+    }
+
+@app.get("/api/clustering/models")
+async def list_clustering_models():
+    """Model tersimpan untuk versi dataset saat ini (dipakai oleh /api/clustering/predict)"""
+    dataset = dataset_cache.get()
+    return {"dataset_version": dataset.version, "models": model_registry.list_models(dataset.version)}
+
+@app.get("/api/clustering/cache-stats")
+async def clustering_cache_stats():
+    """Statistik cache hasil clustering (hit/miss) untuk menentukan ukurannya; stages = cache per tahap"""
+    return {**result_cache.stats(), "stages": stage_cache.stats()}
+
+@app.get("/api/clustering/pool-stats")
+async def clustering_pool_stats():
+    """Statistik pool worker clustering (kedalaman antrian, waktu tunggu)"""
+    return clustering_pool.stats()
+
+@app.post("/api/clustering/sweep", response_model=ClusteringResponse)
+async def run_clustering_sweep(request: SweepRequest):
+    """Bandingkan beberapa nilai n_clusters (BIC, AIC, silhouette) dalam satu request"""
+    try:
+        dataset = dataset_cache.get()
+        validate_clustering_request(ClusteringRequest(
             start_year=request.start_year,
             end_year=request.end_year,
             sector=request.sector,
-            n_clusters=request.n_clusters,
+            n_clusters=request.min_clusters,
+            zscore_threshold=request.zscore_threshold,
+        ), dataset)
+        if request.max_clusters < request.min_clusters or request.max_clusters > 7:
+            raise HTTPException(status_code=400, detail="Rentang cluster harus di antara 2 dan 7")
+
+        sweep = await clustering_pool.run(
+            clustering_service.perform_sweep,
+            start_year=request.start_year,
+            end_year=request.end_year,
+            sector=request.sector,
+            cluster_range=range(request.min_clusters, request.max_clusters + 1),
+            zscore_threshold=request.zscore_threshold,
+            select_by=request.select_by,
+            include_best_result=request.include_best_result,
+            dataset=dataset,
         )
-        
+
+        # Hasil lengkap untuk k terbaik juga bisa langsung dipakai /api/clustering
+        if sweep['best_result'] is not None:
+            best_request = ClusteringRequest(
+                start_year=request.start_year,
+                end_year=request.end_year,
+                sector=request.sector,
+                n_clusters=sweep['best_n_clusters'],
+                zscore_threshold=request.zscore_threshold,
+            )
+            result_cache.put(clustering_cache_key(best_request, dataset), sweep['best_result'])
+
         return ClusteringResponse(
             success=True,
-            message="Clustering completed successfully",
+            message="Sweep completed successfully",
+            data=sweep
+        )
+
+    except HTTPException:
+        raise
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error {str(e)}")
+
+@app.post("/api/clustering/windows", response_model=ClusteringResponse)
+async def run_window_clustering(request: WindowClusteringRequest):
+    """Clustering untuk setiap jendela tahun (mis. tiap 5 tahun 2000-2024) dalam satu request.
+
+    Mengembalikan ringkasan per jendela, lintasan cluster per wilayah, matriks transisi cluster
+    antar jendela berurutan dan matriks window x window (proporsi wilayah yang berpindah cluster).
+    """
+    try:
+        dataset = dataset_cache.get()
+        validate_clustering_request(request, dataset)
+        n_years = request.end_year - request.start_year + 1
+        if not 2 <= request.window_size <= n_years:
+            raise HTTPException(status_code=400, detail=f"Lebar jendela harus 2-{n_years} tahun")
+        if request.step < 1:
+            raise HTTPException(status_code=400, detail="Langkah jendela minimal 1 tahun")
+
+        # Kunci diawali (versi, sektor, ...) agar ikut dipindah/dibuang saat dataset berganti
+        cache_key = clustering_cache_key(request, dataset) + ('windows', request.window_size, request.step)
+
+        async def compute():
+            return await clustering_pool.run(
+                clustering_service.perform_window_clustering,
+                start_year=request.start_year,
+                end_year=request.end_year,
+                sector=request.sector,
+                n_clusters=request.n_clusters,
+                window_size=request.window_size,
+                step=request.step,
+                zscore_threshold=request.zscore_threshold,
+                dataset=dataset,
+            )
+
+        result = await result_cache.get_or_compute_async(cache_key, compute)
+
+        return ClusteringResponse(
+            success=True,
+            message="Window clustering completed successfully",
             data=result
         )
-        
+
+    except HTTPException:
+        raise
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error {str(e)}")
 
+@app.post("/api/clustering/stability", response_model=ClusteringResponse)
+async def run_clustering_stability(request: StabilityRequest):
+    """Stabilitas penugasan cluster per wilayah dari n_runs fit ulang (bootstrap/subsample).
+
+    Nomor cluster mengikuti /api/clustering dengan parameter yang sama; cluster = hasil konsensus,
+    reference_cluster = hasil fit tunggal.
+    """
+    try:
+        dataset = dataset_cache.get()
+        validate_clustering_request(request, dataset)
+        if not 10 <= request.n_runs <= 500:
+            raise HTTPException(status_code=400, detail="Jumlah run harus 10-500")
+
+        cache_key = clustering_cache_key(request, dataset) + (
+            'stability', request.n_runs, request.method, request.sample_fraction, request.include_matrix,
+        )
+
+        async def compute():
+            return await clustering_pool.run(
+                clustering_service.perform_stability,
+                start_year=request.start_year,
+                end_year=request.end_year,
+                sector=request.sector,
+                n_clusters=request.n_clusters,
+                n_runs=request.n_runs,
+                method=request.method,
+                sample_fraction=request.sample_fraction,
+                zscore_threshold=request.zscore_threshold,
+                include_matrix=request.include_matrix,
+                dataset=dataset,
+            )
+
+        result = await result_cache.get_or_compute_async(cache_key, compute)
+
+        return ClusteringResponse(
+            success=True,
+            message="Stability analysis completed successfully",
+            data=result
+        )
+
+    except HTTPException:
+        raise
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error {str(e)}")
+
+# ============== CLUSTERING JOB ENDPOINTS ==============
+@app.post("/api/clustering/jobs", status_code=202)
+async def create_clustering_job(request: ClusteringRequest):
+    """Jalankan clustering di latar belakang dan kembalikan job id"""
+    dataset = dataset_cache.get()
+    validate_clustering_request(request, dataset)
+    cache_key = clustering_cache_key(request, dataset)
+
+    def run(report):
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            if metrics.ENABLED:
+                clustering_requests.inc(cache='hit')
+            return cached
+        timer = StageTimer(forward=report) if metrics.ENABLED else None
+        result = clustering_service.perform_clustering(
+            start_year=request.start_year,
+            end_year=request.end_year,
+            sector=request.sector,
+            n_clusters=request.n_clusters,
+            zscore_threshold=request.zscore_threshold,
+            dataset=dataset,
+            progress=timer or report,
+        )
+        if timer is not None:
+            record_clustering(result, timer.finish(), request.sector)
+            clustering_requests.inc(cache='miss')
+        result_cache.put(cache_key, result)
+        return result
+
+    try:
+        job = job_manager.submit(run, params=request.model_dump())
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+    return job.to_dict()
+
+@app.get("/api/clustering/jobs/{job_id}")
+async def get_clustering_job(job_id: str):
+    """Status dan progress job (tahap, inisialisasi EM ke-k, waktu berjalan)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan atau sudah kedaluwarsa")
+    return job.to_dict()
+
+@app.get("/api/clustering/jobs/{job_id}/result", response_model=ClusteringResponse)
+async def get_clustering_job_result(
+    job_id: str,
+    result_format: str = Query('json', alias='format'),
+    fields: Optional[str] = None,
+):
+    """Hasil job yang sudah selesai, dalam format yang sama dengan /api/clustering"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan atau sudah kedaluwarsa")
+    if job.status == 'failed':
+        raise HTTPException(status_code=500, detail=f"Error {job.error}")
+    if job.status != 'completed':
+        raise HTTPException(status_code=409, detail=f"Job belum selesai (status: {job.status})")
+
+    try:
+        data = format_result(job.result, result_format, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return ClusteringResponse(
+        success=True,
+        message="Clustering completed successfully",
+        data=data
+    )
+
+@app.delete("/api/clustering/jobs/{job_id}")
+async def cancel_clustering_job(job_id: str):
+    """Batalkan job; job yang sedang berjalan berhenti di tahap/inisialisasi EM berikutnya"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan atau sudah kedaluwarsa")
+    return job.to_dict()
+
 # ============== UPLOAD ENDPOINTS ==============
 @app.get("/api/download-template")
 async def download_template():
@@ -136,8 +688,8 @@ async def download_raw_dataset():
         )
 
 @app.get("/api/download-current-dataset")
-async def download_current_dataset():
-    """Download Dataset Saat Ini yang Digunakan"""
+def download_current_dataset():
+    """Download Dataset Saat Ini yang Digunakan (snapshot delta digabung dulu, di threadpool)"""
     try:
         response = upload_service.get_current_dataset()
         return response
@@ -149,12 +701,18 @@ async def download_current_dataset():
             detail=f"Error downloading current dataset: {str(e)}"
         )
 
-@app.post("/api/upload-dataset")
-async def upload_dataset(file: UploadFile = File(...)):
-    """Upload raw emission dataset and process it"""
+@app.post("/api/upload-dataset", status_code=202)
+async def upload_dataset(file: UploadFile = File(...), mode: str = 'full'):
+    """Terima dataset mentah, validasi header, lalu proses di latar belakang.
+
+    ?mode=delta menggabungkan workbook berisi sebagian sheet/wilayah/kolom (mis. tahun baru atau
+    koreksi beberapa kabupaten) ke dataset saat ini; sel kosong berarti tidak berubah.
+    Kembalikan job id; progress dapat dipantau lewat /api/upload-dataset/jobs/{job_id}.
+    Dataset baru langsung dipakai begitu job selesai, tanpa menghentikan clustering yang berjalan.
+    Hasil clustering dan model untuk sektor yang datanya tidak berubah tetap dipakai.
+    """
     try:
-        response = await upload_service.upload_and_process(file)
-        return response
+        temp_file_path = await upload_service.receive_upload(file, mode)
     except HTTPException:
         raise
     except Exception as e:
@@ -163,19 +721,115 @@ async def upload_dataset(file: UploadFile = File(...)):
             detail=f"Error uploading file: {str(e)}"
         )
 
+    def run(report):
+        previous = dataset_cache.get()
+        timer = StageTimer(forward=report) if metrics.ENABLED else None
+        result = upload_service.process_and_cleanup(temp_file_path, progress=timer or report, mode=mode)
+        if timer is not None:
+            for stage, seconds in timer.finish().items():
+                upload_stage_seconds.observe(seconds, stage=stage)
+
+        # Hanya sektor yang berubah yang dihitung ulang; hasil dan model sektor lain dipindah ke versi baru
+        current = dataset_cache.get()
+        changed = changed_sectors(previous, current)
+        unchanged = [sector for sector in previous.sectors if sector not in changed]
+        def rekey(key):
+            if key[0] == previous.version and key[1] in unchanged:
+                return (current.version,) + key[1:]
+            return None
+
+        result_cache.migrate(rekey)
+        stage_cache.migrate(rekey)
+        model_registry.carry_over(previous.version, current.version, unchanged)
+        return {**result, "dataset_version": current.version, "changed_sectors": changed}
+
+    try:
+        job = upload_jobs.submit(run, params={'filename': file.filename, 'mode': mode})
+    except JobQueueFullError as e:
+        upload_service.discard_upload(temp_file_path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+    return {
+        "success": True,
+        "message": "Dataset diterima dan sedang diproses",
+        **job.to_dict(),
+    }
+
+@app.get("/api/upload-dataset/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Status upload: tahap (sheet, write_files, publish), sheet ke-berapa dan jumlah baris diproses"""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job upload tidak ditemukan atau sudah kedaluwarsa")
+    status = job.to_dict()
+    if job.status == 'completed':
+        status['result'] = job.result
+    return status
+
+@app.get("/api/dataset-version")
+async def get_dataset_version():
+    """Nomor snapshot dataset yang sedang dipakai, rentang tahun dan snapshot lama yang masih disimpan.
+
+    year_range = tahun yang ada di semua sektor (sektor 'all'); sector_year_ranges = per sektor.
+    """
+    dataset = dataset_cache.get()
+    first_year, last_year = dataset.year_range
+    return {
+        "version": dataset.version,
+        "year_range": {"start": first_year, "end": last_year},
+        "sector_year_ranges": {
+            sector: dict(zip(("start", "end"), dataset.sector_year_range(sector)))
+            for sector in dataset.sectors
+        },
+        "snapshots": dataset_cache.snapshots.list_versions(),
+        "retention": dataset_cache.snapshots.RETENTION,
+    }
+
 # ============== OTHER ENDPOINTS ==============
+@app.get("/metrics")
+async def get_metrics():
+    """Metrik format Prometheus: durasi per tahap, jumlah wilayah, iterasi GMM, status cache"""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrik dinonaktifkan (METRICS_ENABLED=0)")
+    return Response(content=metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
 @app.get("/api/geojson")
-async def get_geojson():
-    """Return GeoJSON data"""
+async def get_geojson(request: Request, detail: str = 'full'):
+    """Return GeoJSON data (byte siap kirim, gzip, ETag/304; ?detail=low|medium|full)"""
     try:
-        with open(GEOJSON_FILE, 'r', encoding='utf-8') as f:
-            geojson_data = json.load(f)
-        return geojson_data
+        # Request pertama per detail: json.load, penyederhanaan dan gzip; jangan blokir event loop
+        encoded = await asyncio.to_thread(geojson_service.get_encoded, detail)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="GeoJSON file not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading GeoJSON: {str(e)}")
 
+    use_gzip = 'gzip' in request.headers.get('accept-encoding', '')
+    headers = {
+        "ETag": encoded['gzip_etag'] if use_gzip else encoded['etag'],
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get('if-none-match'), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=encoded['gzip'], media_type="application/json", headers=headers)
+    return Response(content=encoded['body'], media_type="application/json", headers=headers)
+
+@app.get("/api/geojson/region-index")
+async def get_region_index():
+    """Laporan pencocokan nama wilayah dataset dengan feature GeoJSON (fuzzy dan yang tidak cocok)"""
+    try:
+        dataset = dataset_cache.get()
+        index = await asyncio.to_thread(geojson_service.region_index, dataset)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="GeoJSON file not found")
+    return {"dataset_version": dataset.version, **index.report()}
+
 @app.get("/api/sectors")
 async def get_sectors():
     """Return available sectors"""
@@ -0,0 +1,186 @@
+import threading
+import time
+
+
+# Batas bucket histogram durasi (detik)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class StageTimer:
+    """Callback progress yang mencatat durasi setiap tahap (waktu sampai tahap berikutnya dimulai).
+
+    Panggilan berulang untuk tahap yang sama (mis. tiap inisialisasi EM) tidak memulai tahap baru.
+    Jika forward diberikan, setiap panggilan juga diteruskan ke callback tersebut.
+    """
+
+    def __init__(self, forward=None):
+        self.forward = forward
+        self.stages = {}
+        self._current = None
+        self._started = None
+
+    def __call__(self, stage, **info):
+        if stage != self._current:
+            now = time.perf_counter()
+            self._close(now)
+            self._current = stage
+            self._started = now
+        if self.forward is not None:
+            self.forward(stage, **info)
+
+    def _close(self, now):
+        if self._current is not None:
+            self.stages[self._current] = self.stages.get(self._current, 0.0) + now - self._started
+
+    def finish(self):
+        """Tutup tahap terakhir dan kembalikan {tahap: detik}"""
+        self._close(time.perf_counter())
+        self._current = None
+        return self.stages
+
+
+def run_timed(func, *args, **kwargs):
+    """Jalankan func(*args, progress=timer, **kwargs); kembalikan (hasil, durasi per tahap).
+
+    Fungsi modul (bukan closure) agar bisa dikirim ke ProcessPoolExecutor.
+    """
+    timer = StageTimer()
+    result = func(*args, progress=timer, **kwargs)
+    return result, timer.finish()
+
+
+def server_timing(stages, cache=None):
+    """Nilai header Server-Timing: durasi per tahap dalam milidetik, plus status cache"""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items()]
+    if cache is not None:
+        parts.append(f'cache;desc="{cache}"')
+    return ', '.join(parts)
+
+
+def _format_labels(labels):
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histogram kumulatif ala Prometheus, satu seri per kombinasi label"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # nilai label -> [jumlah per bucket, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(labels + [('le', _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Counter yang hanya bertambah, satu seri per kombinasi label"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}")
+        return lines
+
+
+class _Collected:
+    """Metrik yang nilainya dibaca dari callback saat /metrics diminta (mis. statistik cache)"""
+
+    def __init__(self, name, documentation, kind, func):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.func = func
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(self.func())}",
+        ]
+
+
+class MetricsRegistry:
+    """Kumpulan metrik yang dirender dalam format teks Prometheus untuk endpoint /metrics.
+
+    Jika ENABLED False, pemanggil tidak memasang StageTimer sama sekali sehingga tidak ada
+    biaya tambahan di jalur clustering/upload.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    def __init__(self, enabled=True):
+        self.ENABLED = enabled
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def collect(self, name, documentation, func, kind='gauge'):
+        return self._register(_Collected(name, documentation, kind, func))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
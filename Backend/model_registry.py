@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+from features import build_features
+
+
+class ClusteringModel:
+    """Pipeline yang sudah di-fit: fitur turunan -> PowerTransformer -> StandardScaler -> GMM.
+
+    Dipakai untuk menilai deret waktu wilayah baru/revisi tanpa fit ulang. Referensi Z-score
+    (mean/std rata-rata per wilayah saat fit) disimpan agar wilayah yang akan dibuang sebagai
+    outlier oleh perform_clustering bisa ditandai.
+    """
+
+    def __init__(self, key, power_transformer, scaler, gmm, feature_names, year_columns,
+                 zscore_reference, extreme_threshold, created_at=None):
+        self.key = key  # (versi dataset, sektor, tahun awal, tahun akhir, n_clusters, zscore_threshold)
+        self.power_transformer = power_transformer
+        self.scaler = scaler
+        self.gmm = gmm
+        self.feature_names = list(feature_names)
+        self.year_columns = list(year_columns)
+        self.zscore_reference = zscore_reference  # (mean, std) rata-rata per wilayah
+        self.extreme_threshold = extreme_threshold
+        self.created_at = created_at or time.time()
+
+    @property
+    def dataset_version(self):
+        return self.key[0]
+
+    @property
+    def zscore_threshold(self):
+        return self.key[5]
+
+    def predict(self, X):
+        """Cluster, probabilitas dan penanda outlier untuk X (n_wilayah x n_tahun, urutan year_columns)"""
+        X = np.nan_to_num(np.asarray(X, dtype=np.float64).reshape(-1, len(self.year_columns)))
+        X_scaled = self.scaler.transform(
+            self.power_transformer.transform(build_features(X, self.feature_names))
+        )
+        probabilities = self.gmm.predict_proba(X_scaled)
+        clusters = probabilities.argmax(axis=1)
+
+        avg_emission = X.mean(axis=1)
+        mean, std = self.zscore_reference
+        z_scores = np.abs(avg_emission - mean) / std if std > 0 else np.zeros(len(X))
+        outlier = np.where(
+            avg_emission > self.extreme_threshold, 'extreme',
+            np.where(z_scores > self.zscore_threshold, 'zscore', ''),
+        )
+
+        return {
+            'cluster': clusters.tolist(),
+            'confidence': probabilities[np.arange(len(X)), clusters].tolist(),
+            'probabilities': probabilities.tolist(),
+            'avg_emission': avg_emission.tolist(),
+            'z_score': z_scores.tolist(),
+            'outlier': [reason or None for reason in outlier.tolist()],
+        }
+
+    def summary(self):
+        version, sector, start_year, end_year, n_clusters, zscore_threshold = self.key
+        return {
+            'dataset_version': version,
+            'sector': sector,
+            'start_year': start_year,
+            'end_year': end_year,
+            'n_clusters': n_clusters,
+            'zscore_threshold': zscore_threshold,
+            'feature_names': self.feature_names,
+            'n_iterations': int(self.gmm.n_iter_),
+            'converged': bool(self.gmm.converged_),
+            'created_at': self.created_at,
+        }
+
+
+class ModelRegistry:
+    """Model clustering tersimpan (joblib) per versi dataset dan parameter.
+
+    File disimpan di folder models/ milik snapshot dataset, jadi ikut terhapus oleh retensi
+    snapshot. Paling banyak MAX_LOADED model ditahan di memori (LRU); sisanya dibaca dari
+    disk saat diminta, sehingga model yang disimpan oleh worker proses lain juga terlihat.
+    """
+
+    ARTIFACT_FORMAT = 1
+    MODELS_DIR_NAME = 'models'
+
+    def __init__(self, dataset_cache, max_loaded=32):
+        self.dataset_cache = dataset_cache
+        self.MAX_LOADED = max_loaded
+
+        self._models = OrderedDict()  # key -> ClusteringModel
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Worker proses membuat registry sendiri di atas folder snapshot yang sama
+        return (ModelRegistry, (self.dataset_cache, self.MAX_LOADED))
+
+    @staticmethod
+    def make_key(dataset_version, sector, start_year, end_year, n_clusters, zscore_threshold):
+        return (
+            int(dataset_version),
+            sector.lower(),
+            int(start_year),
+            int(end_year),
+            int(n_clusters),
+            float(zscore_threshold),
+        )
+
+    def models_dir(self, dataset_version):
+        return os.path.join(self.dataset_cache.snapshots.snapshot_dir(dataset_version), self.MODELS_DIR_NAME)
+
+    def model_path(self, key):
+        version, sector, start_year, end_year, n_clusters, zscore_threshold = key
+        file_name = f"{sector}_{start_year}-{end_year}_k{n_clusters}_z{zscore_threshold:g}.joblib"
+        return os.path.join(self.models_dir(version), file_name)
+
+    def _remember(self, model):
+        with self._lock:
+            self._models[model.key] = model
+            self._models.move_to_end(model.key)
+            while len(self._models) > self.MAX_LOADED:
+                self._models.popitem(last=False)
+
+    def save(self, model):
+        """Simpan model ke disk (atomik) dan ke memori; True jika file ditulis.
+
+        Dilewati jika snapshot sudah dihapus, atau jika artefak untuk key ini sudah ada (fit dengan
+        parameter dan data yang sama menghasilkan model yang sama), agar cache miss berikutnya
+        tidak menulis ulang file.
+        """
+        snapshot_dir = self.dataset_cache.snapshots.snapshot_dir(model.dataset_version)
+        if not os.path.isdir(snapshot_dir):
+            return False
+
+        path = self.model_path(model.key)
+        if os.path.exists(path):
+            self._remember(model)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        artifact = {'format': self.ARTIFACT_FORMAT, 'model': model}
+        try:
+            joblib.dump(artifact, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._remember(model)
+        return True
+
+    def _read(self, path):
+        try:
+            artifact = joblib.load(path)
+        except (OSError, EOFError, ValueError, AttributeError, ImportError) as e:
+            print(f"⚠️ Warning: Could not load model {path}: {str(e)}")
+            return None
+        if not isinstance(artifact, dict) or artifact.get('format') != self.ARTIFACT_FORMAT:
+            return None
+        return artifact['model']
+
+    def get(self, key):
+        """Model untuk key; None jika belum pernah di-fit (atau snapshot-nya sudah dihapus)"""
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+        path = self.model_path(key)
+        if not os.path.exists(path):
+            return None
+        model = self._read(path)
+        if model is not None:
+            self._remember(model)
+        return model
+
+    def carry_over(self, from_version, to_version, sectors):
+        """Salin model sektor yang datanya tidak berubah ke versi dataset baru (tanpa fit ulang)"""
+        models_dir = self.models_dir(from_version)
+        copied = 0
+        for name in self._artifact_names(models_dir):
+            model = self._read(os.path.join(models_dir, name))
+            if model is None or model.key[1] not in sectors:
+                continue
+            model.key = (to_version,) + tuple(model.key[1:])
+            if self.save(model):
+                copied += 1
+        return copied
+
+    def _artifact_names(self, models_dir):
+        try:
+            return [name for name in os.listdir(models_dir) if name.endswith('.joblib')]
+        except FileNotFoundError:
+            return []
+
+    def list_models(self, dataset_version):
+        """Ringkasan semua model tersimpan untuk satu versi dataset"""
+        models_dir = self.models_dir(dataset_version)
+        models = (self._read(os.path.join(models_dir, name)) for name in sorted(self._artifact_names(models_dir)))
+        return [model.summary() for model in models if model is not None]
+
+    def load(self):
+        """Muat model terbaru versi dataset saat ini ke memori (dipanggil saat startup)"""
+        version = self.dataset_cache.snapshots.current_version()
+        if version is None:
+            return 0
+        models_dir = self.models_dir(version)
+        paths = sorted(
+            (os.path.join(models_dir, name) for name in self._artifact_names(models_dir)),
+            key=os.path.getmtime,
+        )
+
+        loaded = 0
+        for path in paths[-self.MAX_LOADED:]:
+            model = self._read(path)
+            if model is not None:
+                self._remember(model)
+                loaded += 1
+        print(f"✅ Loaded {loaded} clustering model(s) for dataset v{version}")
+        return loaded
@@ -0,0 +1,153 @@
+import warnings
+
+import numpy as np
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.mixture import GaussianMixture
+from sklearn.utils import check_random_state
+
+
+# Loop EM di bawah meniru GaussianMixture.fit_predict memakai method privat sklearn; hanya
+# dipakai untuk versi yang sudah diverifikasi identik (tests/test_parallel_gmm.py)
+SUPPORTED_SKLEARN = ((1, 4), (1, 5))  # [min, max)
+_PRIVATE_METHODS = (
+    '_validate_params', '_validate_data', '_check_parameters', '_initialize_parameters',
+    '_get_parameters', '_set_parameters', '_e_step', '_m_step', '_compute_lower_bound',
+)
+
+
+def _sklearn_version():
+    return tuple(int(part) for part in sklearn.__version__.split('.')[:2] if part.isdigit())
+
+
+def parallel_supported():
+    """True jika versi sklearn dan method privat yang dipakai fit_predict_parallel tersedia"""
+    low, high = SUPPORTED_SKLEARN
+    return low <= _sklearn_version() < high and all(
+        hasattr(GaussianMixture, name) for name in _PRIVATE_METHODS
+    )
+
+
+def _run_em(template, X, init_params):
+    """Satu restart EM dari parameter awal yang sudah ditentukan (loop sama dengan sklearn)"""
+    est = clone(template)
+    est._set_parameters(init_params)
+
+    lower_bound = -np.inf
+    converged = False
+    n_iter = 0
+    for n_iter in range(1, est.max_iter + 1):
+        prev_lower_bound = lower_bound
+
+        log_prob_norm, log_resp = est._e_step(X)
+        est._m_step(X, log_resp)
+        lower_bound = est._compute_lower_bound(log_resp, log_prob_norm)
+
+        if abs(lower_bound - prev_lower_bound) < est.tol:
+            converged = True
+            break
+
+    return lower_bound, est._get_parameters(), n_iter, converged
+
+
+def fit_predict_parallel(gmm, X, n_jobs=1, progress=None):
+    """Setara gmm.fit_predict(X), tetapi n_init restart EM dijalankan paralel.
+
+    Inisialisasi (KMeans) tetap dijalankan berurutan dengan satu RandomState seperti di sklearn,
+    sehingga setiap restart mendapat titik awal yang sama persis. Model terbaik dipilih dengan
+    aturan sklearn (lower bound terbesar, restart paling awal jika seri), jadi hasilnya identik
+    bit-per-bit untuk berapa pun jumlah worker. progress(selesai) dipanggil setiap satu restart selesai.
+    Di luar SUPPORTED_SKLEARN jatuh kembali ke gmm.fit_predict (berurutan).
+    """
+    if not parallel_supported():
+        clusters = gmm.fit_predict(X)
+        if progress is not None:
+            progress(gmm.n_init)
+        return clusters
+
+    gmm._validate_params()
+    X = gmm._validate_data(X, dtype=[np.float64, np.float32], ensure_min_samples=2)
+    if X.shape[0] < gmm.n_components:
+        raise ValueError(
+            "Expected n_samples >= n_components "
+            f"but got n_components = {gmm.n_components}, "
+            f"n_samples = {X.shape[0]}"
+        )
+    gmm._check_parameters(X)
+    if gmm.max_iter == 0 or (gmm.warm_start and hasattr(gmm, 'converged_')):
+        # Kasus khusus sklearn; tidak ada restart yang bisa diparalelkan
+        return gmm.fit_predict(X)
+
+    # === 1. Titik awal tiap restart, berurutan agar konsumsi RandomState sama dengan sklearn ===
+    random_state = check_random_state(gmm.random_state)
+    init_params = []
+    for _ in range(gmm.n_init):
+        gmm._initialize_parameters(X, random_state)
+        init_params.append(tuple(np.copy(p) for p in gmm._get_parameters()))
+
+    # === 2. EM untuk setiap restart (paralel) ===
+    template = clone(gmm)
+    if n_jobs == 1:
+        runs = (_run_em(template, X, params) for params in init_params)
+    else:
+        runs = Parallel(n_jobs=n_jobs, return_as='generator')(
+            delayed(_run_em)(template, X, params) for params in init_params
+        )
+
+    # === 3. Pilih restart terbaik dengan urutan yang sama seperti sklearn ===
+    max_lower_bound = -np.inf
+    best_params = None
+    best_n_iter = 0
+    any_converged = False
+    for done, (lower_bound, params, n_iter, converged) in enumerate(runs, start=1):
+        any_converged = any_converged or converged
+        if lower_bound > max_lower_bound or max_lower_bound == -np.inf:
+            max_lower_bound = lower_bound
+            best_params = params
+            best_n_iter = n_iter
+        if progress is not None:
+            progress(done)
+
+    gmm.converged_ = any_converged
+    if not gmm.converged_:
+        warnings.warn(
+            "Initialization %d did not converge. "
+            "Try different init parameters, "
+            "or increase max_iter, tol "
+            "or check for degenerate data." % gmm.n_init,
+            ConvergenceWarning,
+        )
+
+    gmm._set_parameters(best_params)
+    gmm.n_iter_ = best_n_iter
+    gmm.lower_bound_ = max_lower_bound
+
+    # E-step terakhir agar label konsisten dengan fit(X).predict(X), seperti sklearn
+    _, log_resp = gmm._e_step(X)
+    return log_resp.argmax(axis=1)
+
+
+def params_from_labels(X, labels, n_components, reg_covar):
+    """(weights, means, precisions) GMM kovarians 'full' dari label awal (-1 = baris diabaikan).
+
+    Dipakai sebagai weights_init/means_init/precisions_init untuk warm start dari penugasan
+    cluster lain. None jika ada komponen tanpa anggota.
+    """
+    known = labels >= 0
+    counts = np.bincount(labels[known], minlength=n_components)
+    if counts.shape[0] != n_components or np.any(counts == 0):
+        return None
+
+    X_known = X[known]
+    n_features = X.shape[1]
+    means = np.empty((n_components, n_features))
+    covariances = np.empty((n_components, n_features, n_features))
+    for k in range(n_components):
+        members = X_known[labels[known] == k]
+        means[k] = members.mean(axis=0)
+        diff = members - means[k]
+        covariances[k] = diff.T @ diff / len(members)
+        covariances[k].flat[::n_features + 1] += reg_covar
+    return counts / counts.sum(), means, np.linalg.inv(covariances)
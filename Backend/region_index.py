@@ -0,0 +1,155 @@
+import difflib
+import re
+import unicodedata
+
+import numpy as np
+
+
+_PREFIXES = (
+    ('KOTA ADMINISTRASI ', 'KOTA'),
+    ('KOTA ADM ', 'KOTA'),
+    ('KOTA ', 'KOTA'),
+    ('KABUPATEN ', 'KAB'),
+    ('KAB ', 'KAB'),
+)
+
+
+def normalize_name(name):
+    """Nama wilayah -> (jenis, nama dasar): huruf besar, tanpa tanda baca, prefiks KAB./KOTA dipisah"""
+    text = unicodedata.normalize('NFKD', str(name or '')).encode('ascii', 'ignore').decode('ascii')
+    text = re.sub(r'[^A-Z0-9]+', ' ', text.upper()).strip()
+    for prefix, kind in _PREFIXES:
+        if text.startswith(prefix):
+            return kind, text[len(prefix):].strip()
+    return None, text
+
+
+def _kind_score(feature_kind, region_kind):
+    """Kecocokan jenis wilayah; None jika KAB vs KOTA (pasti berbeda wilayah)"""
+    if feature_kind == region_kind:
+        return 2
+    if {feature_kind, region_kind} == {'KAB', 'KOTA'}:
+        return None
+    # Di spreadsheet kota ditulis tanpa prefiks ("BOGOR" vs "KAB. BOGOR")
+    if 'KOTA' in (feature_kind, region_kind):
+        return 1
+    return 0
+
+
+class RegionIndex:
+    """Pemetaan feature GeoJSON -> baris wilayah kanonik dataset (KABUPATEN+PROVINSI).
+
+    Dibangun sekali per versi dataset dan versi GeoJSON. Nama dicocokkan setelah normalisasi;
+    yang tidak cocok persis direkonsiliasi dengan difflib (FUZZY_CUTOFF), dan semua hasil
+    fuzzy serta nama yang tetap tidak cocok dicatat untuk dilaporkan.
+    """
+
+    FUZZY_CUTOFF = 0.85
+
+    def __init__(self, features, kabupaten, provinsi, name_property='shapeName',
+                 province_property='Provinsi'):
+        self.n_features = len(features)
+        self.n_regions = len(kabupaten)
+        self.kabupaten = list(kabupaten)
+        self.provinsi = list(provinsi)
+        self.region_positions = {}
+        for pos, key in enumerate(zip(map(str, kabupaten), map(str, provinsi))):
+            self.region_positions.setdefault(key, pos)
+
+        region_names = [normalize_name(name) for name in kabupaten]
+        region_provinces = [normalize_name(name)[1] for name in provinsi]
+        by_base = {}
+        for pos, (_, base) in enumerate(region_names):
+            by_base.setdefault(base, []).append(pos)
+        bases = list(by_base)
+
+        # feature_region[f] = posisi wilayah kanonik untuk feature f, -1 jika tidak cocok
+        self.feature_region = np.full(self.n_features, -1, dtype=np.int64)
+        self.feature_names = []
+        self.fuzzy_matches = []
+        self.unmatched_features = []
+
+        for feature_id, feature in enumerate(features):
+            properties = feature.get('properties') or {}
+            name = properties.get(name_property)
+            self.feature_names.append(name)
+            kind, base = normalize_name(name)
+            province = normalize_name(properties.get(province_property))[1]
+
+            best = self._best_candidate(
+                by_base.get(base, []), kind, province, region_names, region_provinces
+            )
+            ratio = 1.0
+            if best is None and base:
+                for candidate_base in difflib.get_close_matches(base, bases, n=5, cutoff=self.FUZZY_CUTOFF):
+                    candidate = self._best_candidate(
+                        by_base[candidate_base], kind, province, region_names, region_provinces
+                    )
+                    if candidate is not None:
+                        best = candidate
+                        ratio = difflib.SequenceMatcher(None, base, candidate_base).ratio()
+                        break
+
+            if best is None:
+                self.unmatched_features.append({'feature_id': feature_id, 'name': name})
+                continue
+
+            self.feature_region[feature_id] = best
+            if ratio < 1.0:
+                self.fuzzy_matches.append({
+                    'feature_id': feature_id,
+                    'name': name,
+                    'kabupaten': self.kabupaten[best],
+                    'provinsi': self.provinsi[best],
+                    'score': round(ratio, 4),
+                })
+
+        matched = np.zeros(self.n_regions, dtype=bool)
+        matched[self.feature_region[self.feature_region >= 0]] = True
+        self.unmatched_regions = [
+            {'kabupaten': self.kabupaten[pos], 'provinsi': self.provinsi[pos]}
+            for pos in np.flatnonzero(~matched)
+        ]
+
+    @staticmethod
+    def _best_candidate(candidates, kind, province, region_names, region_provinces):
+        """Kandidat dengan jenis paling cocok, lalu provinsi sama; seri -> urutan kanonik pertama"""
+        best, best_score = None, None
+        for pos in candidates:
+            kind_score = _kind_score(kind, region_names[pos][0])
+            if kind_score is None:
+                continue
+            score = (kind_score, bool(province) and province == region_provinces[pos])
+            if best_score is None or score > best_score:
+                best, best_score = pos, score
+        return best
+
+    def report(self):
+        return {
+            'features': self.n_features,
+            'regions': self.n_regions,
+            'matched_features': int(np.sum(self.feature_region >= 0)),
+            'fuzzy_matches': self.fuzzy_matches,
+            'unmatched_features': self.unmatched_features,
+            'unmatched_regions': self.unmatched_regions,
+        }
+
+    def choropleth(self, scatter_data):
+        """Cluster dan confidence per feature id dari scatter_data hasil clustering.
+
+        cluster = -1 (confidence 0) untuk feature tanpa data (tidak cocok atau dibuang sebagai outlier).
+        """
+        region_cluster = np.full(self.n_regions, -1, dtype=np.int64)
+        region_confidence = np.zeros(self.n_regions, dtype=np.float64)
+        for row in scatter_data:
+            pos = self.region_positions.get((str(row['kabupaten']), str(row['provinsi'])))
+            if pos is not None:
+                region_cluster[pos] = row['cluster']
+                region_confidence[pos] = row['confidence']
+
+        valid = self.feature_region >= 0
+        cluster = np.full(self.n_features, -1, dtype=np.int64)
+        confidence = np.zeros(self.n_features, dtype=np.float64)
+        cluster[valid] = region_cluster[self.feature_region[valid]]
+        confidence[valid] = region_confidence[self.feature_region[valid]]
+        return {'cluster': cluster.tolist(), 'confidence': confidence.tolist()}
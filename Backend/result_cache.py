@@ -0,0 +1,267 @@
+import asyncio
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from job_manager import JobCancelled
+
+
+class _OwnerAbandoned(Exception):
+    """Request pemilik komputasi dibatalkan; request yang menunggu harus menghitung ulang sendiri"""
+
+
+def _is_abandoned(error):
+    # Pembatalan job/task milik pemilik bukan kegagalan komputasi, jangan diteruskan ke request lain
+    return isinstance(error, JobCancelled) or not isinstance(error, Exception)
+
+
+class ResultCache:
+    """LRU cache hasil clustering dengan batas ukuran (byte) dan penggabungan request identik.
+
+    Nilai yang dikembalikan dipakai bersama oleh semua pemanggil, jadi tidak boleh diubah.
+    """
+
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.MAX_BYTES = max_bytes
+
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _begin(self, key):
+        """Kembalikan ('hit', value), ('wait', future) atau ('owner', (future, generation))"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return 'hit', entry[0]
+
+            # Komputasi yang sedang berjalan; request identik menunggu Future yang sama
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                return 'wait', pending
+
+            self.misses += 1
+            pending = Future()
+            self._inflight[key] = pending
+            return 'owner', (pending, self._generation)
+
+    def _finish(self, key, pending, generation, value=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            pending.set_exception(_OwnerAbandoned() if _is_abandoned(error) else error)
+            return
+        pending.set_result(value)
+        self._store(key, value, generation)
+
+    def get_or_compute(self, key, compute):
+        while True:
+            state, payload = self._begin(key)
+            if state == 'hit':
+                return payload
+            if state == 'owner':
+                break
+            try:
+                return payload.result()
+            except _OwnerAbandoned:
+                continue
+
+        pending, generation = payload
+        try:
+            value = compute()
+        except BaseException as e:
+            self._finish(key, pending, generation, error=e)
+            raise
+        self._finish(key, pending, generation, value=value)
+        return value
+
+    async def get_or_compute_async(self, key, compute):
+        """Sama seperti get_or_compute, tetapi compute adalah coroutine function"""
+        while True:
+            state, payload = self._begin(key)
+            if state == 'hit':
+                return payload
+            if state == 'owner':
+                break
+            try:
+                return await asyncio.wrap_future(payload)
+            except _OwnerAbandoned:
+                continue
+
+        pending, generation = payload
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._finish(key, pending, generation, error=e)
+            raise
+        self._finish(key, pending, generation, value=value)
+        return value
+
+    def get(self, key):
+        """Ambil hasil yang sudah ada tanpa menghitung; None jika belum ada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            generation = self._generation
+        self._store(key, value, generation)
+
+    def _store(self, key, value, generation):
+        size = self._estimate_size(value)
+        with self._lock:
+            # Jangan simpan hasil yang dihitung sebelum clear() atau yang lebih besar dari seluruh cache
+            if generation != self._generation or size > self.MAX_BYTES:
+                return
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+
+            while self._total_bytes > self.MAX_BYTES:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    @staticmethod
+    def _estimate_size(value):
+        """Perkiraan panjang JSON yang akan dikirim ke frontend, tanpa men-serialize hasil"""
+        return estimate_json_size(value)
+
+    def migrate(self, rekey):
+        """Ganti kunci semua entri: rekey(key) -> kunci baru, atau None untuk membuang entri.
+
+        Dipakai setelah dataset baru dipublikasikan: hasil untuk sektor yang tidak berubah
+        dipindahkan ke versi dataset baru, sisanya dibuang.
+        """
+        with self._lock:
+            entries = OrderedDict()
+            for key, (value, size) in self._entries.items():
+                new_key = rekey(key)
+                if new_key is None:
+                    self._total_bytes -= size
+                    continue
+                if new_key in entries:
+                    self._total_bytes -= entries[new_key][1]
+                entries[new_key] = (value, size)
+            self._entries = entries
+            return len(entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.MAX_BYTES,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'in_flight': len(self._inflight),
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+class StageCache(ResultCache):
+    """Cache hasil antara pipeline clustering (DataFrame, array, transformer yang sudah di-fit).
+
+    Sama dengan ResultCache (LRU berbatas byte, request identik digabung), tetapi ukuran dihitung
+    dari memori objek, bukan JSON. Saat dikirim ke worker proses, setiap proses memakai satu
+    StageCache miliknya (lihat shared_stage_cache) yang bertahan antar task.
+    """
+
+    def __reduce__(self):
+        return shared_stage_cache, (self.MAX_BYTES,)
+
+    @staticmethod
+    def _estimate_size(value):
+        """Perkiraan memori: nbytes array, memory_usage DataFrame, rekursif untuk wadah/atribut objek"""
+        seen = set()
+
+        def size_of(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            if isinstance(obj, np.ndarray):
+                return obj.nbytes
+            if isinstance(obj, pd.DataFrame):
+                return int(obj.memory_usage(index=True, deep=True).sum())
+            if isinstance(obj, dict):
+                return sys.getsizeof(obj) + sum(size_of(k) + size_of(v) for k, v in obj.items())
+            if isinstance(obj, (list, tuple)):
+                return sys.getsizeof(obj) + sum(size_of(item) for item in obj)
+            if hasattr(obj, '__dict__') and not isinstance(obj, type):
+                return sys.getsizeof(obj) + size_of(vars(obj))
+            return sys.getsizeof(obj)
+
+        return size_of(value)
+
+
+_SHARED_STAGE_CACHES = {}
+_SHARED_STAGE_LOCK = threading.Lock()
+
+
+def shared_stage_cache(max_bytes):
+    """Satu StageCache per proses untuk setiap batas ukuran"""
+    with _SHARED_STAGE_LOCK:
+        if max_bytes not in _SHARED_STAGE_CACHES:
+            _SHARED_STAGE_CACHES[max_bytes] = StageCache(max_bytes)
+        return _SHARED_STAGE_CACHES[max_bytes]
+
+
+def estimate_json_size(value, sample=8, max_fields=64):
+    """Perkiraan panjang JSON suatu nilai tanpa json.dumps.
+
+    Hasil clustering berisi dict/list per wilayah dan per tahun yang bentuknya seragam, jadi wadah
+    besar cukup diukur dari `sample` elemen pertama lalu dikalikan jumlah elemen (wilayah x tahun),
+    bukan ditelusuri seluruhnya. Dict dengan paling banyak `max_fields` key dianggap record
+    (field-nya berbeda-beda) dan selalu diukur penuh.
+    """
+    if isinstance(value, str):
+        return len(value) + 2
+    if value is None or isinstance(value, (bool, np.bool_)):
+        return 5
+    if isinstance(value, (int, np.integer)):
+        return len(str(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return len(repr(float(value)))
+    if isinstance(value, dict):
+        items = list(islice(value.items(), sample)) if len(value) > max_fields else value.items()
+        measured = sum(
+            len(str(k)) + 4 + estimate_json_size(v, sample, max_fields) for k, v in items
+        )
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        items = value[:sample]
+        measured = sum(estimate_json_size(item, sample, max_fields) + 1 for item in items)
+    else:
+        return len(str(value)) + 2
+    if not len(items):
+        return 2
+    return 2 + measured * len(value) // len(items)
@@ -0,0 +1,87 @@
+RESULT_FORMATS = ('json', 'columnar')
+
+# Field yang dipecah menjadi kolom paralel per wilayah pada format columnar
+_REGION_FIELDS = ('kabupaten_clusters', 'scatter_data', 'yearly_emissions', 'emission_sources')
+
+
+def to_columnar(result):
+    """Ubah hasil clustering ke format kolumnar: array paralel yang diindeks per wilayah.
+
+    Data per wilayah hanya muncul sekali:
+    - region_names: kabupaten, provinsi (urutan wilayah untuk semua array lain)
+    - regions: cluster, avg_emission, silhouette, confidence, probabilities[cluster][wilayah]
+    - yearly_emissions: year_columns + values[wilayah][tahun]
+    - emission_sources: sources + values[wilayah][sumber] (None jika sumber tidak ada)
+    Field lain (cluster_stats, outliers, gmm_parameters, ...) disalin apa adanya.
+    """
+    scatter = result['scatter_data']
+    clusters = result['kabupaten_clusters']
+    yearly = result['yearly_emissions']
+    sources_by_region = result['emission_sources']
+    year_columns = result['year_columns']
+
+    kabupaten = [row['kabupaten'] for row in scatter]
+    n_clusters = result['n_clusters']
+
+    source_names = []
+    seen = set()
+    for name in kabupaten:
+        for source in sources_by_region.get(name, {}):
+            if source not in seen:
+                seen.add(source)
+                source_names.append(source)
+
+    columnar = {key: value for key, value in result.items() if key not in _REGION_FIELDS}
+    columnar.update({
+        'format': 'columnar',
+        'region_names': {
+            'kabupaten': kabupaten,
+            'provinsi': [row['provinsi'] for row in scatter],
+        },
+        'regions': {
+            'cluster': [row['cluster'] for row in scatter],
+            'avg_emission': [row['avg_emission'] for row in scatter],
+            'silhouette': [row['silhouette'] for row in scatter],
+            'confidence': [row['confidence'] for row in scatter],
+            'probabilities': [
+                [clusters[name]['probabilities'][i] for name in kabupaten]
+                for i in range(n_clusters)
+            ],
+        },
+        'yearly_emissions': {
+            'year_columns': year_columns,
+            'values': [[yearly[name][year] for year in year_columns] for name in kabupaten],
+        },
+        'emission_sources': {
+            'sources': source_names,
+            'values': [
+                [sources_by_region.get(name, {}).get(source) for source in source_names]
+                for name in kabupaten
+            ],
+        },
+    })
+    return columnar
+
+
+def format_result(result, result_format='json', fields=None):
+    """Terapkan format (json | columnar) dan pilihan field (daftar dipisah koma).
+
+    Lempar ValueError untuk format atau field yang tidak dikenal.
+    """
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Format tidak dikenal: {result_format} (pilihan: {', '.join(RESULT_FORMATS)})")
+
+    data = to_columnar(result) if result_format == 'columnar' else result
+    if not fields:
+        return data
+
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in data]
+    if unknown:
+        raise ValueError(
+            f"Field tidak dikenal: {', '.join(unknown)} (tersedia: {', '.join(data.keys())})"
+        )
+
+    # Format kolumnar selalu menyertakan urutan wilayah agar array tetap bisa dibaca
+    always = ('format', 'region_names') if result_format == 'columnar' else ()
+    return {key: data[key] for key in data if key in selected or key in always}
@@ -0,0 +1,101 @@
+import numpy as np
+from sklearn import config_context
+from sklearn.metrics import pairwise_distances_chunked, silhouette_samples
+
+
+def silhouette_analysis(X, labels, max_exact=20000, sample_size=2000, random_state=None,
+                        working_memory=64):
+    """Silhouette per sampel dan rata-ratanya dari satu pass jarak berblok.
+
+    - mode 'exact': silhouette_samples sklearn (sekali saja); skor = rata-ratanya, identik
+      dengan silhouette_score.
+    - mode 'sampled' (jika jumlah baris > max_exact): jarak setiap baris hanya dihitung ke
+      sampel acak berukuran sample_size, sehingga biaya O(n x sample_size) bukan O(n²).
+
+    Memori dibatasi oleh working_memory (MB) per blok.
+    Mengembalikan dict: samples, score, mode, sample_size.
+    """
+    labels = np.asarray(labels)
+    n_samples = X.shape[0]
+
+    if max_exact is None or n_samples <= max_exact or sample_size >= n_samples:
+        with config_context(working_memory=working_memory):
+            samples = silhouette_samples(X, labels)
+        return {
+            'samples': samples,
+            'score': float(np.mean(samples)),
+            'mode': 'exact',
+            'sample_size': None,
+        }
+
+    samples = _sampled_silhouette(X, labels, sample_size, random_state, working_memory)
+    return {
+        'samples': samples,
+        'score': float(np.mean(samples)),
+        'mode': 'sampled',
+        'sample_size': int(sample_size),
+    }
+
+
+def _sampled_silhouette(X, labels, sample_size, random_state, working_memory):
+    """Perkiraan silhouette setiap baris memakai jarak ke sampel referensi acak"""
+    rng = np.random.RandomState(random_state)
+    reference = np.sort(rng.choice(X.shape[0], size=sample_size, replace=False))
+
+    cluster_ids, label_codes = np.unique(labels, return_inverse=True)
+    n_clusters = len(cluster_ids)
+    if not 2 <= n_clusters <= X.shape[0] - 1:
+        raise ValueError(
+            "Number of labels is %d. Valid values are 2 to n_samples - 1 (inclusive)" % n_clusters
+        )
+
+    ref_codes = label_codes[reference]
+    ref_onehot = np.zeros((sample_size, n_clusters))
+    ref_onehot[np.arange(sample_size), ref_codes] = 1
+    ref_counts = ref_onehot.sum(axis=0)
+
+    # Posisi setiap baris di sampel referensi (-1 jika tidak terpilih) untuk membuang jarak ke diri sendiri
+    ref_position = np.full(X.shape[0], -1)
+    ref_position[reference] = np.arange(sample_size)
+
+    def reduce_func(D_chunk, start):
+        # Jumlah jarak ke setiap cluster referensi: (baris chunk) x n_clusters
+        cluster_sums = D_chunk @ ref_onehot
+        rows = np.arange(start, start + D_chunk.shape[0])
+        own = label_codes[rows]
+        counts = np.broadcast_to(ref_counts, cluster_sums.shape).copy()
+
+        in_ref = ref_position[rows] >= 0
+        self_dist = np.zeros(len(rows))
+        self_dist[in_ref] = D_chunk[np.flatnonzero(in_ref), ref_position[rows][in_ref]]
+        own_sums = cluster_sums[np.arange(len(rows)), own] - self_dist
+        own_counts = counts[np.arange(len(rows)), own] - in_ref
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = cluster_sums / counts
+            # Cluster tanpa anggota di sampel referensi tidak ikut menentukan cluster terdekat
+            means[counts == 0] = np.inf
+            means[np.arange(len(rows)), own] = np.inf
+            intra = own_sums / own_counts
+        inter = means.min(axis=1)
+        return intra, inter, own_counts
+
+    intra_parts, inter_parts, count_parts = [], [], []
+    with config_context(working_memory=working_memory):
+        for intra, inter, own_counts in pairwise_distances_chunked(
+            X, X[reference], reduce_func=reduce_func
+        ):
+            intra_parts.append(intra)
+            inter_parts.append(inter)
+            count_parts.append(own_counts)
+
+    intra = np.concatenate(intra_parts)
+    inter = np.concatenate(inter_parts)
+    own_counts = np.concatenate(count_parts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        samples = (inter - intra) / np.maximum(intra, inter)
+    # Sama seperti sklearn: 0 untuk cluster berisi satu titik (di sini: tanpa referensi lain),
+    # juga 0 jika tidak ada cluster lain di sampel referensi
+    samples[(own_counts <= 0) | ~np.isfinite(inter)] = 0
+    return np.nan_to_num(samples)
@@ -0,0 +1,19 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Modul backend berada langsung di folder Backend/ (bukan paket)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from dataset_cache import AGGREGATED_FILE_NAME, RAW_FILE_NAME
+
+
+@pytest.fixture
+def excel_dir(tmp_path):
+    """Salinan workbook dataset di folder sementara (snapshot/model tidak ditulis ke Backend/Excel)"""
+    for name in (RAW_FILE_NAME, AGGREGATED_FILE_NAME):
+        shutil.copy2(os.path.join(BACKEND_DIR, 'Excel', name), tmp_path / name)
+    return str(tmp_path)
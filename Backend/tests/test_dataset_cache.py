@@ -0,0 +1,32 @@
+import pickle
+import shutil
+
+import pytest
+
+from dataset_cache import ALL_SECTORS, DatasetCache
+
+
+def publish_copy(cache):
+    """Publikasikan snapshot baru berisi data yang sama dengan snapshot saat ini"""
+    current = cache.get()
+    staging_dir = cache.begin_snapshot()
+    for path in (current.raw_file, current.aggregated_file):
+        shutil.copy2(path, staging_dir)
+    sectors = {sector: data for sector, data in current.sectors.items() if sector != ALL_SECTORS}
+    return cache.publish(staging_dir, sectors).version
+
+
+def test_get_version_reuses_loaded_dataset_until_snapshot_removed(excel_dir):
+    cache = DatasetCache(excel_dir)
+    cache.snapshots.RETENTION = 2
+    first = cache.get().version
+    publish_copy(cache)
+
+    # Worker proses: cache sendiri (hasil unpickle), dataset diambil per nomor snapshot
+    worker = pickle.loads(pickle.dumps(cache))
+    pinned = worker.get_version(first)
+    assert worker.get_version(first) is pinned
+
+    publish_copy(cache)  # retensi 2: snapshot pertama dihapus
+    with pytest.raises(FileNotFoundError):
+        worker.get_version(first)
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import openpyxl
+
+from dataset_cache import RAW_FILE_NAME, DatasetCache
+from upload_service import UploadService
+
+COLUMN = 'TRANSPORTASI_2024'
+
+
+def write_workbooks(excel_dir, out_dir, n_rows=40):
+    """Ubah satu kolom sumber Energi di n_rows baris; kembalikan (workbook dasar, workbook penuh,
+    workbook delta). Workbook dasar juga disimpan ulang lewat openpyxl agar sel lain identik.
+    """
+    full = openpyxl.load_workbook(os.path.join(excel_dir, RAW_FILE_NAME))
+    base_path = os.path.join(out_dir, 'base.xlsx')
+    full.save(base_path)
+    sheet = full['Energi']
+    header = [cell.value for cell in sheet[1]]
+    kabupaten_col = header.index('KABUPATEN') + 1
+    provinsi_col = header.index('PROVINSI') + 1
+    value_col = header.index(COLUMN) + 1
+
+    delta = openpyxl.Workbook()
+    delta.remove(delta.active)
+    delta_sheet = delta.create_sheet('Energi')
+    delta_sheet.append(['KABUPATEN', 'PROVINSI', COLUMN])
+
+    rng = np.random.default_rng(0)
+    for row in range(2, n_rows + 2):
+        # Nilai dengan banyak digit: tidak bisa direpresentasikan persis sebagai float32
+        value = float(rng.uniform(1000, 5000)) + 0.123456789
+        sheet.cell(row, value_col, value=value)
+        delta_sheet.append([sheet.cell(row, kabupaten_col).value, sheet.cell(row, provinsi_col).value, value])
+
+    full_path = os.path.join(out_dir, 'full.xlsx')
+    delta_path = os.path.join(out_dir, 'delta.xlsx')
+    full.save(full_path)
+    delta.save(delta_path)
+    return base_path, full_path, delta_path
+
+
+def test_delta_upload_matches_full_upload(excel_dir, tmp_path_factory):
+    base_path, full_path, delta_path = write_workbooks(excel_dir, str(tmp_path_factory.mktemp('upload')))
+
+    full_cache = DatasetCache(str(tmp_path_factory.mktemp('full')))
+    ok, message = UploadService(full_cache).process_uploaded_file(full_path)
+    assert ok, message
+
+    # Dasar delta = upload penuh workbook asli, sehingga hanya sel yang disentuh delta yang berbeda
+    delta_cache = DatasetCache(str(tmp_path_factory.mktemp('delta')))
+    delta_upload = UploadService(delta_cache)
+    ok, message = delta_upload.process_uploaded_file(base_path)
+    assert ok, message
+    ok, message = delta_upload.process_delta_file(delta_path)
+    assert ok, message
+
+    expected, actual = full_cache.get(), delta_cache.get()
+    for sector in ('energi', 'all'):
+        np.testing.assert_array_equal(actual.sectors[sector].values, expected.sectors[sector].values)
+    np.testing.assert_array_equal(actual.sectors['energi'].source_values, expected.sectors['energi'].source_values)
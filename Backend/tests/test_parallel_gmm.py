@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from sklearn.mixture import GaussianMixture
+
+import parallel_gmm
+from parallel_gmm import fit_predict_parallel, params_from_labels
+
+
+def make_data(seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0.0, 0.0, 0.0], [4.0, 1.0, -2.0], [-3.0, 5.0, 1.0]])
+    return np.vstack([rng.normal(center, scale, (150, 3)) for center, scale in zip(centers, (1.0, 0.7, 1.5))])
+
+
+def make_gmm(n_components=3):
+    # Parameter sama dengan ClusteringService.make_gmm, n_init dikurangi agar tes cepat
+    return GaussianMixture(
+        n_components=n_components, covariance_type='full', random_state=100, n_init=5,
+        reg_covar=1e-4, max_iter=500, init_params='kmeans', tol=1e-5,
+    )
+
+
+@pytest.mark.skipif(not parallel_gmm.parallel_supported(), reason="sklearn di luar SUPPORTED_SKLEARN")
+@pytest.mark.parametrize('n_jobs', [1, -1])
+@pytest.mark.parametrize('n_components', [2, 3, 5])
+def test_matches_sklearn_fit_predict(n_jobs, n_components):
+    X = make_data()
+    expected = make_gmm(n_components)
+    expected_labels = expected.fit_predict(X)
+
+    gmm = make_gmm(n_components)
+    done = []
+    labels = fit_predict_parallel(gmm, X, n_jobs=n_jobs, progress=done.append)
+
+    np.testing.assert_array_equal(labels, expected_labels)
+    assert gmm.lower_bound_ == expected.lower_bound_
+    assert gmm.n_iter_ == expected.n_iter_
+    assert gmm.converged_ == expected.converged_
+    np.testing.assert_array_equal(gmm.means_, expected.means_)
+    assert done == list(range(1, gmm.n_init + 1))
+
+
+def test_falls_back_to_sklearn_when_unsupported(monkeypatch):
+    monkeypatch.setattr(parallel_gmm, 'SUPPORTED_SKLEARN', ((0, 0), (0, 1)))
+    X = make_data()
+    expected_labels = make_gmm().fit_predict(X)
+
+    done = []
+    labels = fit_predict_parallel(make_gmm(), X, n_jobs=-1, progress=done.append)
+
+    np.testing.assert_array_equal(labels, expected_labels)
+    assert done == [5]
+
+
+def test_params_from_labels():
+    X = make_data()
+    labels = np.repeat(np.arange(3), 150)
+    labels[:10] = -1
+
+    weights, means, precisions = params_from_labels(X, labels, 3, reg_covar=1e-4)
+
+    np.testing.assert_allclose(weights, [140 / 440, 150 / 440, 150 / 440])
+    np.testing.assert_allclose(means[0], X[10:150].mean(axis=0))
+    covariance = np.cov(X[150:300].T, bias=True) + 1e-4 * np.eye(3)
+    np.testing.assert_allclose(precisions[1], np.linalg.inv(covariance))
+    assert params_from_labels(X, np.where(labels == 2, 1, labels), 3, reg_covar=1e-4) is None
@@ -0,0 +1,56 @@
+import numpy as np
+from sklearn.metrics import silhouette_samples
+
+from silhouette import silhouette_analysis
+
+
+def make_blobs_with_tiny_cluster(n_samples=5000, tiny=3, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0.0, 0.0], [6.0, 0.0], [0.0, 6.0], [30.0, 30.0]])
+    sizes = [(n_samples - tiny) // 3, (n_samples - tiny) // 3]
+    sizes += [n_samples - tiny - sum(sizes), tiny]
+    X = np.vstack([rng.normal(center, 1.0, (size, 2)) for center, size in zip(centers, sizes)])
+    labels = np.repeat(np.arange(len(sizes)), sizes)
+    return X, labels
+
+
+def test_sampled_matches_exact():
+    X, labels = make_blobs_with_tiny_cluster()
+    exact = silhouette_samples(X, labels)
+
+    result = silhouette_analysis(X, labels, max_exact=1000, sample_size=1000, random_state=0)
+
+    assert result['mode'] == 'sampled'
+    assert abs(result['score'] - exact.mean()) < 0.02
+    assert np.corrcoef(result['samples'], exact)[0, 1] > 0.95
+
+
+def test_sampled_with_cluster_missing_from_reference():
+    X, labels = make_blobs_with_tiny_cluster()
+    exact = silhouette_samples(X, labels)
+    tiny = labels == labels.max()
+
+    # Cari seed yang sampel referensinya tidak memuat satu pun anggota cluster kecil
+    sample_size = 500
+    for seed in range(100):
+        reference = np.random.RandomState(seed).choice(len(X), size=sample_size, replace=False)
+        if not tiny[reference].any():
+            break
+    else:
+        raise AssertionError("no seed without a tiny-cluster reference")
+
+    result = silhouette_analysis(X, labels, max_exact=1000, sample_size=sample_size, random_state=seed)
+
+    assert np.all(np.isfinite(result['samples']))
+    assert abs(result['score'] - exact.mean()) < 0.02
+    # Cluster kecil tidak punya referensi sendiri: nilainya 0 seperti cluster satu titik
+    assert np.all(result['samples'][tiny] == 0)
+    assert np.count_nonzero(result['samples'][~tiny]) == np.count_nonzero(~tiny)
+
+
+def test_exact_mode_below_threshold():
+    X, labels = make_blobs_with_tiny_cluster(n_samples=300)
+    result = silhouette_analysis(X, labels, max_exact=1000)
+
+    assert result['mode'] == 'exact'
+    np.testing.assert_allclose(result['samples'], silhouette_samples(X, labels))
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from clustering_service import ClusteringService
+from dataset_cache import DatasetCache
+from job_manager import JobCancelled
+from result_cache import StageCache
+
+
+def make_service(dataset_cache, stage_cache=None):
+    service = ClusteringService(dataset_cache, stage_cache=stage_cache)
+    service.GMM_N_INIT = 2  # cukup untuk tes, hasil tetap deterministik
+    return service
+
+
+def run_in_thread(func, **kwargs):
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = func(**kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def test_cancelled_job_does_not_fail_request_sharing_stage(excel_dir):
+    dataset_cache = DatasetCache(excel_dir)
+    stage_cache = StageCache()
+    service = make_service(dataset_cache, stage_cache)
+    params = {'start_year': 2010, 'end_year': 2020, 'sector': 'energi'}
+
+    in_stage = threading.Event()
+    cancel = threading.Event()
+
+    def cancelled_job(stage, **info):
+        # 'outliers' dilaporkan di dalam compute tahap load yang digabung oleh StageCache
+        if stage == 'outliers':
+            in_stage.set()
+            cancel.wait(30)
+            raise JobCancelled('job cancelled')
+
+    job_thread, job = run_in_thread(service.perform_clustering, n_clusters=3, progress=cancelled_job, **params)
+    assert in_stage.wait(30)
+
+    request_thread, request = run_in_thread(service.perform_clustering, n_clusters=4, **params)
+    deadline = time.monotonic() + 30
+    while stage_cache.stats()['coalesced'] == 0:
+        assert time.monotonic() < deadline, "request kedua tidak menunggu tahap yang sama"
+        time.sleep(0.01)
+    cancel.set()
+
+    job_thread.join(60)
+    request_thread.join(60)
+    assert isinstance(job.get('error'), JobCancelled)
+    assert 'error' not in request, request.get('error')
+
+    expected = make_service(dataset_cache).perform_clustering(n_clusters=4, **params)
+    assert request['result']['kabupaten_clusters'] == expected['kabupaten_clusters']
+
+
+def test_waiter_still_receives_compute_errors():
+    cache = StageCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(30)
+        raise ValueError('bad input')
+
+    owner_thread, owner = run_in_thread(cache.get_or_compute, key='k', compute=failing)
+    assert started.wait(30)
+    waiter_thread, waiter = run_in_thread(cache.get_or_compute, key='k', compute=lambda: pytest.fail('recomputed'))
+    while cache.stats()['coalesced'] == 0:
+        time.sleep(0.01)
+    release.set()
+    owner_thread.join(30)
+    waiter_thread.join(30)
+
+    assert isinstance(owner['error'], ValueError)
+    assert isinstance(waiter['error'], ValueError)
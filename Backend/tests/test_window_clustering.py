@@ -0,0 +1,22 @@
+import pytest
+
+from clustering_service import ClusteringService
+from dataset_cache import DatasetCache
+
+
+@pytest.mark.parametrize('n_jobs', [4, -1])
+def test_window_clustering_independent_of_n_jobs(excel_dir, n_jobs):
+    dataset_cache = DatasetCache(excel_dir)
+    dataset = dataset_cache.get()
+    results = []
+    for jobs in (1, n_jobs):
+        service = ClusteringService(dataset_cache)
+        service.GMM_N_INIT = 4  # cukup untuk tes
+        service.N_JOBS = jobs
+        results.append(service.perform_window_clustering(
+            start_year=2000, end_year=2024, sector='energi', n_clusters=3, window_size=5, dataset=dataset,
+        ))
+
+    sequential, parallel = results
+    assert all(window['warm_start'] for window in sequential['windows'][1:])
+    assert parallel == sequential
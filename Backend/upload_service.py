@@ -1,12 +1,70 @@
 from fastapi import HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
-import pandas as pd
+from fastapi.responses import FileResponse
+import asyncio
+import functools
+import json
+import numpy as np
+import openpyxl
 import os
 import shutil
+import threading
+import uuid
 from datetime import datetime
 
+from dataset_cache import (
+    AGGREGATED_FILE_NAME, ALL_SECTORS, DELTA_DIR_NAME, DELTA_MANIFEST_NAME, RAW_FILE_NAME,
+    DatasetCache, SectorData, SHEET_MAPPING, SOURCE_PATTERNS, region_key,
+)
+
+# nama sheet -> sektor (kebalikan SHEET_MAPPING)
+SHEET_SECTORS = {sheet: sector for sector, sheet in SHEET_MAPPING.items()}
+
+
+# full: ganti seluruh dataset; delta: gabungkan baris/kolom yang dikirim ke dataset saat ini
+UPLOAD_MODES = ('full', 'delta')
+
+
+def _no_progress(stage, **info):
+    pass
+
+
+def _to_number(value, sheet_name, row_number):
+    """Nilai sel -> angka; sel kosong dianggap 0 (sama seperti fillna(0))"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Nilai tidak valid di sheet '{sheet_name}' baris {row_number}: {value!r}")
+
+
+def _source_column(column, sources):
+    """Kolom "{sumber}_{tahun}" -> (sumber, tahun); None jika bukan kolom sumber yang dikenal"""
+    name, sep, year = str(column).rpartition('_')
+    if sep and year.isdigit() and name in sources:
+        return name, int(year)
+    return None
+
+
+def _link_or_copy(src, dst):
+    """Hard link jika bisa (file snapshot tidak pernah diubah di tempat), selain itu salin"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _write_through(rows, sheet):
+    """Teruskan baris sambil menuliskannya ke sheet (workbook mentah hasil penggabungan)"""
+    for row in rows:
+        sheet.append(list(row))
+        yield row
+
+
 class UploadService:
-    def __init__(self):
+    def __init__(self, dataset_cache=None):
         self.BASE_DIR = os.path.dirname(os.path.abspath(__file__))
         self.EXCEL_DIR = os.path.join(self.BASE_DIR, 'Excel')
         self.EXCEL_FILE = os.path.join(self.EXCEL_DIR, 'data_emisi_gabungan.xlsx')
@@ -14,23 +72,20 @@ class UploadService:
         self.ORIGINAL_RAW_FILE = os.path.join(self.EXCEL_DIR, 'data_emisi_klhk_original.xlsx')
         self.TEMPLATE_FILE = os.path.join(self.EXCEL_DIR, 'Template_emisi.xlsx')
 
+        # Laporan progress upload setiap N baris per sheet
+        self.PROGRESS_EVERY_ROWS = 100
+
+        # Penggabungan delta ke workbook mentah hanya dijalankan satu per satu
+        self._materialize_lock = threading.Lock()
+
+        # Cache dataset bersama; upload dipublikasikan sebagai snapshot baru di cache ini
+        self.dataset_cache = dataset_cache or DatasetCache(self.EXCEL_DIR)
+
         # Initialize original file backup
         if not os.path.exists(self.ORIGINAL_RAW_FILE) and os.path.exists(self.RAW_EXCEL_FILE):
             shutil.copy2(self.RAW_EXCEL_FILE, self.ORIGINAL_RAW_FILE)
             print(f"📦 Created original backup: {self.ORIGINAL_RAW_FILE}")
 
-        self.SOURCE_PATTERNS = {
-            'Energi': ['INDUSTRI BATU BARA', 'INDUSTRI ENERGI', 'MANUFAKTUR & KONSTRUKSI',
-                       'MINYAK & GAS BUMI', 'PERKANTORAN & PEMUKIMAN', 'TRANSPORTASI'],
-            'Kehutanan': ['BIOMASS', 'PEAT DECOMPOSITION', 'PEAT FIRE'],
-            'Limbah': ['LIMBAH CAIR DOMESTIK', 'LIMBAH CAIR INDUSTRI', 'LIMBAH PADAT',
-                       'PEMBAKARAN', 'PENGOLAHAN SECARA BIOLOGIS'],
-            'Pertanian': ['Biomass Burning', 'Liming', 'Livestock', 'N2O from Managed Soils',
-                          'Rice Cultivation', 'Urea'],
-            'Ippu': ['INDUSTRI KIMIA', 'INDUSTRI LOGAM', 'INDUSTRI MINERAL',
-                     'INDUSTRI NON-ENERGI', 'LAINNYA']
-        }
-
     def get_template_path(self):
         """Return template file path"""
         return self.TEMPLATE_FILE
@@ -40,8 +95,15 @@ class UploadService:
         return self.ORIGINAL_RAW_FILE
 
     def get_current_dataset(self):
-        """Return current dataset file"""
-        if not os.path.exists(self.RAW_EXCEL_FILE):
+        """Return current dataset file (workbook mentah dari snapshot yang sedang dipakai)"""
+        try:
+            dataset = self.dataset_cache.get()
+            # Snapshot hasil delta: gabungkan dulu workbook dasar dengan file delta
+            self.materialize_snapshot(dataset)
+            raw_file = dataset.raw_file
+        except FileNotFoundError:
+            raw_file = None
+        if raw_file is None or not os.path.exists(raw_file):
             raise HTTPException(
                 status_code=404,
                 detail=f"Dataset tidak ditemukan"
@@ -50,7 +112,7 @@ class UploadService:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
         return FileResponse(
-            path=self.RAW_EXCEL_FILE,
+            path=raw_file,
             filename=f'data_emisi_saat_ini_{timestamp}.xlsx',
             media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
             headers={
@@ -60,97 +122,525 @@ class UploadService:
             }
         )
 
+    def read_sheet_headers(self, file_path: str):
+        """Baca hanya baris header setiap sheet (openpyxl read-only, data tidak disentuh)"""
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            headers = {}
+            for sheet_name in workbook.sheetnames:
+                header = next(workbook[sheet_name].iter_rows(min_row=1, max_row=1, values_only=True), ())
+                headers[sheet_name] = [str(col) for col in header if col is not None]
+            return headers
+        finally:
+            workbook.close()
+
+    def _validate_sheet_header(self, sheet_name, columns, sources):
+        if 'KABUPATEN' not in columns or 'PROVINSI' not in columns:
+            return False, f"Sheet '{sheet_name}' harus memiliki kolom KABUPATEN dan PROVINSI"
+
+        missing_sources = []
+        for source in sources:
+            has_source = any(f"{source}_" in col for col in columns)
+            if not has_source:
+                missing_sources.append(source)
+
+        if missing_sources:
+            return False, f"Sheet '{sheet_name}' tidak memiliki data untuk sumber: {', '.join(missing_sources[:3])}{'...' if len(missing_sources) > 3 else ''}"
+
+        expected_year_pattern = any(
+            any(f"{source}_20" in col for source in sources)
+            for col in columns
+        )
+
+        if not expected_year_pattern:
+            return False, f"Sheet '{sheet_name}' tidak memiliki format kolom tahun yang benar (contoh: INDUSTRI ENERGI_2000)"
+
+        return True, "Sheet valid"
+
     def validate_file_structure(self, file_path: str):
-        """Validate uploaded file matches the template structure"""
+        """Validate uploaded file matches the template structure (header saja)"""
         try:
             required_sheets = ['Energi', 'Kehutanan', 'Limbah', 'Pertanian', 'Ippu']
 
-            expected_sources = self.SOURCE_PATTERNS
-
-            xl_file = pd.ExcelFile(file_path)
+            headers = self.read_sheet_headers(file_path)
 
             # Check missing sheets
-            missing_sheets = [sheet for sheet in required_sheets if sheet not in xl_file.sheet_names]
+            missing_sheets = [sheet for sheet in required_sheets if sheet not in headers]
             if missing_sheets:
                 return False, f"Sheet yang hilang: {', '.join(missing_sheets)}"
 
-            # Validate each sheet
-            for sheet_name, sources in expected_sources.items():
-                try:
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
-
-                    if 'KABUPATEN' not in df.columns or 'PROVINSI' not in df.columns:
-                        return False, f"Sheet '{sheet_name}' harus memiliki kolom KABUPATEN dan PROVINSI"
-
-                    missing_sources = []
-                    for source in sources:
-                        has_source = any(f"{source}_" in col for col in df.columns)
-                        if not has_source:
-                            missing_sources.append(source)
-
-                    if missing_sources:
-                        return False, f"Sheet '{sheet_name}' tidak memiliki data untuk sumber: {', '.join(missing_sources[:3])}{'...' if len(missing_sources) > 3 else ''}"
+            # Validate each sheet header
+            for sector, sheet_name in SHEET_MAPPING.items():
+                is_valid, message = self._validate_sheet_header(sheet_name, headers[sheet_name], SOURCE_PATTERNS[sector])
+                if not is_valid:
+                    return False, message
 
-                    expected_year_pattern = any(
-                        any(f"{source}_20" in col for source in sources)
-                        for col in df.columns
-                    )
+            return True, "File valid"
 
-                    if not expected_year_pattern:
-                        return False, f"Sheet '{sheet_name}' tidak memiliki format kolom tahun yang benar (contoh: INDUSTRI ENERGI_2000)"
+        except Exception as e:
+            return False, f"Error validasi file: {str(e)}"
 
-                except Exception as e:
-                    return False, f"Error membaca sheet '{sheet_name}': {str(e)}"
+    def validate_delta_structure(self, file_path: str):
+        """Validasi header workbook delta: sheet sektor mana saja, kolom KABUPATEN, PROVINSI dan
+        kolom "{sumber}_{tahun}" (boleh sebagian sumber/tahun, boleh tahun baru)"""
+        try:
+            headers = self.read_sheet_headers(file_path)
+            sheets = [sheet for sheet in SHEET_MAPPING.values() if sheet in headers]
+            if not sheets:
+                return False, f"Delta harus berisi minimal satu sheet: {', '.join(SHEET_MAPPING.values())}"
+
+            for sheet_name in sheets:
+                columns = headers[sheet_name]
+                if 'KABUPATEN' not in columns or 'PROVINSI' not in columns:
+                    return False, f"Sheet '{sheet_name}' harus memiliki kolom KABUPATEN dan PROVINSI"
+
+                sources = SOURCE_PATTERNS[SHEET_SECTORS[sheet_name]]
+                unknown = [
+                    col for col in columns
+                    if col not in ('KABUPATEN', 'PROVINSI') and _source_column(col, sources) is None
+                ]
+                if unknown:
+                    return False, f"Sheet '{sheet_name}' berisi kolom yang tidak dikenal: {', '.join(unknown[:3])}{'...' if len(unknown) > 3 else ''}"
+                if len(columns) == 2:
+                    return False, f"Sheet '{sheet_name}' tidak memiliki kolom data (contoh: INDUSTRI ENERGI_2025)"
 
             return True, "File valid"
 
         except Exception as e:
             return False, f"Error validasi file: {str(e)}"
 
-    def process_uploaded_file(self, file_path: str):
-        """Process uploaded raw data file and create aggregated file"""
+    def read_delta_file(self, file_path: str):
+        """Baca workbook delta yang sudah divalidasi.
+
+        Mengembalikan {sheet: {'columns': {kolom: (sumber, tahun)}, 'rows': {(kab, prov): (kab, prov, {kolom: nilai})}}}.
+        Sel kosong berarti "tidak berubah" dan tidak dimasukkan; baris yang sama dua kali digabung.
+        """
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            delta = {}
+            for sector, sheet_name in SHEET_MAPPING.items():
+                if sheet_name not in workbook.sheetnames:
+                    continue
+                sources = SOURCE_PATTERNS[sector]
+                rows = workbook[sheet_name].iter_rows(values_only=True)
+                header = [None if col is None else str(col) for col in next(rows, ())]
+                kabupaten_idx = header.index('KABUPATEN')
+                provinsi_idx = header.index('PROVINSI')
+                columns = {
+                    col: _source_column(col, sources) for col in header
+                    if col is not None and _source_column(col, sources) is not None
+                }
+                column_positions = [(i, col) for i, col in enumerate(header) if col in columns]
+
+                sheet_rows = {}
+                for row_number, row in enumerate(rows, start=2):
+                    if all(value is None for value in row):
+                        continue
+                    kab = row[kabupaten_idx] if kabupaten_idx < len(row) else None
+                    prov = row[provinsi_idx] if provinsi_idx < len(row) else None
+                    cells = {
+                        col: _to_number(row[i], sheet_name, row_number)
+                        for i, col in column_positions
+                        if i < len(row) and row[i] is not None and row[i] != ''
+                    }
+                    key = (region_key(kab), region_key(prov))
+                    if key in sheet_rows:
+                        sheet_rows[key][2].update(cells)
+                    else:
+                        sheet_rows[key] = (kab, prov, cells)
+
+                delta[sheet_name] = {'columns': columns, 'rows': sheet_rows}
+            return delta
+        finally:
+            workbook.close()
+
+    def _stream_sheet(self, sheet_name, rows, output_sheet, sources, years=None, progress=None):
+        """Baca satu sheet baris demi baris: tulis baris agregat langsung dan kumpulkan data store.
+
+        rows = iterator baris (termasuk header). Tahun agregat = semua tahun yang punya kolom
+        sumber di header, kecuali years diberikan. Urutan penjumlahan per tahun sama dengan
+        versi pandas sebelumnya (sumber sesuai SOURCE_PATTERNS), sehingga hasil agregat identik.
+        """
+        header = next(rows, ())
+        col_index = {}
+        for i, col in enumerate(header):
+            if col is not None:
+                col_index.setdefault(str(col), i)
+
+        kabupaten_idx = col_index['KABUPATEN']
+        provinsi_idx = col_index['PROVINSI']
+
+        # Semua kolom "{source}_{year}" untuk tensor region x sumber x tahun di store
+        source_columns = {}
+        for col, i in col_index.items():
+            parsed = _source_column(col, sources)
+            if parsed is not None:
+                source_columns[i] = parsed
+        store_sources = [s for s in sources if any(n == s for n, _ in source_columns.values())]
+        store_years = sorted({year for _, year in source_columns.values()})
+        if years is None:
+            years = store_years
+
+        # Kolom yang dijumlahkan untuk setiap tahun agregat
+        year_sources = [
+            [col_index[f"{source}_{year}"] for source in sources if f"{source}_{year}" in col_index]
+            for year in years
+        ]
+        source_pos = {s: i for i, s in enumerate(store_sources)}
+        year_pos = {y: i for i, y in enumerate(store_years)}
+        source_cells = [(i, source_pos[name], year_pos[year]) for i, (name, year) in source_columns.items()]
+        source_mask = np.zeros((len(store_sources), len(store_years)), dtype=bool)
+        for _, s, y in source_cells:
+            source_mask[s, y] = True
+
+        numeric_columns = sorted(set(source_columns) | {i for columns in year_sources for i in columns})
+
+        output_sheet.append(['KABUPATEN', 'PROVINSI'] + [str(year) for year in years])
+
+        kabupaten, provinsi, totals, source_rows = [], [], [], []
+        for row_number, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+
+            numbers = {
+                i: _to_number(row[i] if i < len(row) else None, sheet_name, row_number)
+                for i in numeric_columns
+            }
+            year_totals = []
+            for columns in year_sources:
+                total = 0
+                for i in columns:
+                    total = total + numbers[i]
+                year_totals.append(total)
+
+            source_row = np.zeros((len(store_sources), len(store_years)), dtype=np.float64)
+            for i, s, y in source_cells:
+                source_row[s, y] = numbers[i]
+
+            output_sheet.append([row[kabupaten_idx], row[provinsi_idx]] + year_totals)
+            kabupaten.append(row[kabupaten_idx])
+            provinsi.append(row[provinsi_idx])
+            totals.append(year_totals)
+            source_rows.append(source_row)
+
+            if progress is not None and len(totals) % self.PROGRESS_EVERY_ROWS == 0:
+                progress(rows_processed=len(totals))
+
+        if progress is not None:
+            progress(rows_processed=len(totals))
+
+        n_regions = len(kabupaten)
+        return SectorData(
+            kabupaten=np.array(kabupaten, dtype=object),
+            provinsi=np.array(provinsi, dtype=object),
+            year_columns=[str(year) for year in years],
+            values=np.array(totals, dtype=np.float64).reshape(n_regions, len(years)),
+            source_kabupaten=np.array(kabupaten, dtype=object),
+            sources=store_sources,
+            source_years=store_years,
+            source_values=(
+                np.stack(source_rows) if source_rows
+                else np.zeros((0, len(store_sources), len(store_years)), dtype=np.float64)
+            ),
+            source_mask=source_mask,
+        )
+
+    def process_uploaded_file(self, file_path: str, progress=None):
+        """Process uploaded raw data file and create aggregated file (satu pass streaming).
+
+        progress(stage, **info) dipanggil per sheet dan setiap PROGRESS_EVERY_ROWS baris.
+        """
+        progress = progress or _no_progress
         try:
             print(f"🔄 Starting file processing...")
             print(f"📂 Source file: {file_path}")
-            print(f"📂 Target RAW file: {self.RAW_EXCEL_FILE}")
-            print(f"📂 Target EXCEL file: {self.EXCEL_FILE}")
-
-            # Replace the old raw file directly (no backup)
-            shutil.copy2(file_path, self.RAW_EXCEL_FILE)
-            print(f"✅ Raw file updated: {self.RAW_EXCEL_FILE}")
 
-            # Create aggregated Excel
-            writer = pd.ExcelWriter(self.EXCEL_FILE, engine='openpyxl')
+            # Create aggregated Excel (write-only: baris ditulis langsung saat dibaca)
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+            output = openpyxl.Workbook(write_only=True)
+            sectors = {}
 
-            for sheet_name, sources in self.SOURCE_PATTERNS.items():
-                print(f"⚙️ Processing sheet: {sheet_name}")
-                df_raw = pd.read_excel(file_path, sheet_name=sheet_name)
+            try:
+                total_sheets = len(SHEET_MAPPING)
+                for sheet_index, (sector, sheet_name) in enumerate(SHEET_MAPPING.items(), start=1):
+                    print(f"⚙️ Processing sheet: {sheet_name}")
+                    sheet_progress = functools.partial(
+                        progress, 'sheet', sheet=sheet_name, sheet_index=sheet_index, total_sheets=total_sheets
+                    )
+                    sheet_progress(rows_processed=0)
+                    sectors[sector] = self._stream_sheet(
+                        sheet_name, workbook[sheet_name].iter_rows(values_only=True),
+                        output.create_sheet(sheet_name), SOURCE_PATTERNS[sector], progress=sheet_progress,
+                    )
+                    print(f"✅ Sheet {sheet_name} processed ({len(sectors[sector].kabupaten)} rows)")
+            finally:
+                workbook.close()
 
-                base_cols = ['KABUPATEN', 'PROVINSI']
-                df_aggregated = df_raw[base_cols].copy()
+            # Tulis snapshot baru di folder staging; dataset lama tidak pernah disentuh
+            progress('write_files')
+            staging_dir = self.dataset_cache.begin_snapshot()
+            try:
+                shutil.copy2(file_path, os.path.join(staging_dir, RAW_FILE_NAME))
+                output.save(os.path.join(staging_dir, AGGREGATED_FILE_NAME))
+                print(f"✅ Raw and aggregated files written to snapshot staging")
+
+                # Tulis store kolumnar dari data di memori lalu publikasikan snapshot secara atomik
+                progress('publish')
+                dataset = self.dataset_cache.publish(staging_dir, sectors)
+            except BaseException:
+                self.dataset_cache.discard_snapshot(staging_dir)
+                raise
+            print(f"✅ Dataset snapshot v{dataset.version} published")
 
-                for year in range(2000, 2025):
-                    year_str = str(year)
-                    year_total = pd.Series(0, index=df_raw.index)
+            return True, "File processed successfully"
 
-                    for source in sources:
-                        col_name = f"{source}_{year}"
-                        if col_name in df_raw.columns:
-                            year_total += df_raw[col_name].fillna(0)
+        except Exception as e:
+            print(f"❌ Error in process_uploaded_file: {str(e)}")
+            return False, f"Error processing file: {str(e)}"
 
-                    df_aggregated[year_str] = year_total
+    def _apply_sheet_delta(self, data, sources, sheet_delta):
+        """SectorData baru = data lama + sel delta; hanya sel agregat (wilayah, tahun) yang
+        tersentuh delta yang dihitung ulang.
+
+        Total dihitung dengan urutan sumber yang sama dengan _stream_sheet. Sumber yang tidak
+        dikirim di delta untuk (wilayah, tahun) itu diambil dari nilai per sumber di store.
+        """
+        columns = sheet_delta['columns']
+        rows = sheet_delta['rows']
+
+        # Sumbu baru: sumber dan tahun gabungan, wilayah lama + wilayah baru di akhir
+        delta_sources = {source for source, _ in columns.values()}
+        delta_years = {year for _, year in columns.values()}
+        new_sources = [s for s in sources if s in data.sources or s in delta_sources]
+        new_years = sorted({int(y) for y in data.source_years} | delta_years)
+        agg_years = sorted({int(col) for col in data.year_columns} | delta_years)
+        source_pos = {s: i for i, s in enumerate(new_sources)}
+        year_pos = {y: i for i, y in enumerate(new_years)}
+        agg_pos = {y: i for i, y in enumerate(agg_years)}
+
+        positions = {}
+        for i, (kab, prov) in enumerate(zip(data.kabupaten, data.provinsi)):
+            positions.setdefault((region_key(kab), region_key(prov)), []).append(i)
+        added = [key for key in rows if key not in positions]
+        n_old = len(data.kabupaten)
+        for offset, key in enumerate(added):
+            positions[key] = [n_old + offset]
+        n_regions = n_old + len(added)
+
+        old_s = np.array([source_pos[s] for s in data.sources], dtype=np.int64)
+        old_y = np.array([year_pos[int(y)] for y in data.source_years], dtype=np.int64)
+        source_values = np.zeros((n_regions, len(new_sources), len(new_years)), dtype=np.float64)
+        source_values[np.ix_(np.arange(n_old), old_s, old_y)] = np.asarray(data.source_values)
+        source_mask = np.zeros((len(new_sources), len(new_years)), dtype=bool)
+        source_mask[np.ix_(old_s, old_y)] = np.asarray(data.source_mask)
+        for source, year in columns.values():
+            source_mask[source_pos[source], year_pos[year]] = True
+
+        values = np.zeros((n_regions, len(agg_years)), dtype=np.float64)
+        old_cols = np.array([agg_pos[int(col)] for col in data.year_columns], dtype=np.int64)
+        values[:n_old, old_cols] = np.asarray(data.values)
+
+        for key, (_, _, cells) in rows.items():
+            by_year = {}
+            for col, value in cells.items():
+                source, year = columns[col]
+                by_year.setdefault(year, {})[source] = value
+            for r in positions[key]:
+                for year, year_cells in by_year.items():
+                    y = year_pos[year]
+                    for source, value in year_cells.items():
+                        source_values[r, source_pos[source], y] = value
+
+                    total = 0
+                    for source in new_sources:
+                        s = source_pos[source]
+                        if source_mask[s, y]:
+                            total = total + year_cells.get(source, float(source_values[r, s, y]))
+                    values[r, agg_pos[year]] = total
+
+        added_kabupaten = np.array([rows[key][0] for key in added], dtype=object)
+        added_provinsi = np.array([rows[key][1] for key in added], dtype=object)
+        return SectorData(
+            kabupaten=np.concatenate([np.asarray(data.kabupaten, dtype=object), added_kabupaten]),
+            provinsi=np.concatenate([np.asarray(data.provinsi, dtype=object), added_provinsi]),
+            year_columns=[str(year) for year in agg_years],
+            values=values,
+            source_kabupaten=np.concatenate([np.asarray(data.source_kabupaten, dtype=object), added_kabupaten]),
+            sources=new_sources,
+            source_years=new_years,
+            source_values=source_values,
+            source_mask=source_mask,
+        )
 
-                df_aggregated.to_excel(writer, sheet_name=sheet_name, index=False)
-                print(f"✅ Sheet {sheet_name} processed")
+    def process_delta_file(self, file_path: str, progress=None):
+        """Gabungkan workbook delta ke dataset saat ini dan publikasikan sebagai snapshot baru.
 
-            writer.close()
-            print(f"✅ Aggregated file created: {self.EXCEL_FILE}")
+        Hanya sektor yang ada di delta yang dibangun ulang (sektor lain dipakai apa adanya).
+        Workbook mentah tidak ditulis ulang di sini: snapshot berisi workbook dasar + rantai
+        file delta, yang baru digabung saat workbook mentah dibutuhkan (materialize_snapshot).
+        """
+        progress = progress or _no_progress
+        try:
+            print(f"🔄 Starting delta processing...")
+            progress('read_delta')
+            delta = self.read_delta_file(file_path)
+
+            progress('apply_delta')
+            current = self.dataset_cache.get()
+            sectors = {sector: data for sector, data in current.sectors.items() if sector != ALL_SECTORS}
+            for sheet_name, sheet_delta in delta.items():
+                sector = SHEET_SECTORS[sheet_name]
+                sectors[sector] = self._apply_sheet_delta(
+                    sectors[sector], SOURCE_PATTERNS[sector], sheet_delta
+                )
+                print(f"✅ Delta {sheet_name} applied ({len(sheet_delta['rows'])} rows)")
 
-            return True, "File processed successfully"
+            progress('write_files')
+            staging_dir = self.dataset_cache.begin_snapshot()
+            try:
+                # Workbook dasar dan rantai delta harus dibaca dari keadaan yang sama: tanpa lock,
+                # materialize_snapshot bisa menggabung lalu menghapus delta di antara keduanya
+                with self._materialize_lock:
+                    _link_or_copy(current.raw_file, os.path.join(staging_dir, RAW_FILE_NAME))
+                    _link_or_copy(current.aggregated_file, os.path.join(staging_dir, AGGREGATED_FILE_NAME))
+
+                    # Rantai delta: delta snapshot saat ini yang belum digabung + delta baru
+                    deltas = []
+                    manifest_path = os.path.join(current.path, DELTA_MANIFEST_NAME)
+                    if os.path.exists(manifest_path):
+                        with open(manifest_path, 'r', encoding='utf-8') as f:
+                            deltas = json.load(f)['deltas']
+                    os.makedirs(os.path.join(staging_dir, DELTA_DIR_NAME))
+                    for name in deltas:
+                        _link_or_copy(
+                            os.path.join(current.path, DELTA_DIR_NAME, name),
+                            os.path.join(staging_dir, DELTA_DIR_NAME, name),
+                        )
+                deltas.append(f"{len(deltas) + 1:04d}.xlsx")
+                shutil.copy2(file_path, os.path.join(staging_dir, DELTA_DIR_NAME, deltas[-1]))
+                with open(os.path.join(staging_dir, DELTA_MANIFEST_NAME), 'w', encoding='utf-8') as f:
+                    json.dump({'base_version': current.version, 'deltas': deltas}, f)
+
+                progress('publish')
+                dataset = self.dataset_cache.publish(staging_dir, sectors)
+            except BaseException:
+                self.dataset_cache.discard_snapshot(staging_dir)
+                raise
+            print(f"✅ Dataset snapshot v{dataset.version} published (delta on v{current.version})")
+
+            return True, "Delta processed successfully"
 
         except Exception as e:
-            print(f"❌ Error in process_uploaded_file: {str(e)}")
-            return False, f"Error processing file: {str(e)}"
+            print(f"❌ Error in process_delta_file: {str(e)}")
+            return False, f"Error processing delta: {str(e)}"
+
+    def _merged_rows(self, rows, sheet_delta):
+        """Baris sheet mentah dengan sel delta diterapkan; kolom dan wilayah baru ditambahkan di akhir"""
+        header = [None if col is None else str(col) for col in next(rows, ())]
+        new_columns = [col for col in sheet_delta['columns'] if col not in header]
+        header = header + new_columns
+        col_index = {}
+        for i, col in enumerate(header):
+            if col is not None:
+                col_index.setdefault(col, i)
+        kabupaten_idx = col_index['KABUPATEN']
+        provinsi_idx = col_index['PROVINSI']
+        yield header
+
+        seen = set()
+        for row in rows:
+            row = list(row) + [None] * (len(header) - len(row))
+            if any(value is not None for value in row):
+                key = (region_key(row[kabupaten_idx]), region_key(row[provinsi_idx]))
+                if key in sheet_delta['rows']:
+                    seen.add(key)
+                    for col, value in sheet_delta['rows'][key][2].items():
+                        row[col_index[col]] = value
+            yield row
+
+        for key, (kab, prov, cells) in sheet_delta['rows'].items():
+            if key in seen:
+                continue
+            row = [None] * len(header)
+            row[kabupaten_idx] = kab
+            row[provinsi_idx] = prov
+            for col, value in cells.items():
+                row[col_index[col]] = value
+            yield row
+
+    def materialize_snapshot(self, dataset):
+        """Gabungkan workbook dasar snapshot dengan rantai delta-nya (sekali, lalu disimpan).
+
+        Menulis workbook mentah dan gabungan yang setara dengan upload penuh, lalu menghapus
+        file delta. Tidak melakukan apa pun untuk snapshot dari upload penuh.
+        """
+        manifest_path = os.path.join(dataset.path, DELTA_MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return False
+
+        with self._materialize_lock:
+            if not os.path.exists(manifest_path):
+                return False
+            print(f"🔄 Merging delta files into snapshot v{dataset.version}...")
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                names = json.load(f)['deltas']
+
+            # Rantai delta digabung berurutan: delta berikutnya menimpa sel yang sama
+            merged = {}
+            for name in names:
+                for sheet_name, sheet_delta in self.read_delta_file(
+                    os.path.join(dataset.path, DELTA_DIR_NAME, name)
+                ).items():
+                    target = merged.setdefault(sheet_name, {'columns': {}, 'rows': {}})
+                    target['columns'].update(sheet_delta['columns'])
+                    for key, (kab, prov, cells) in sheet_delta['rows'].items():
+                        if key in target['rows']:
+                            target['rows'][key][2].update(cells)
+                        else:
+                            target['rows'][key] = (kab, prov, dict(cells))
+
+            tag = uuid.uuid4().hex[:8]
+            raw_tmp = os.path.join(dataset.path, f"{RAW_FILE_NAME}.{tag}.tmp")
+            aggregated_tmp = os.path.join(dataset.path, f"{AGGREGATED_FILE_NAME}.{tag}.tmp")
+            base = openpyxl.load_workbook(dataset.raw_file, read_only=True, data_only=True)
+            try:
+                raw_output = openpyxl.Workbook(write_only=True)
+                aggregated_output = openpyxl.Workbook(write_only=True)
+                for sheet_name in base.sheetnames:
+                    rows = base[sheet_name].iter_rows(values_only=True)
+                    raw_sheet = raw_output.create_sheet(sheet_name)
+                    if sheet_name not in SHEET_SECTORS:
+                        for row in rows:
+                            raw_sheet.append(list(row))
+                        continue
+                    if sheet_name in merged:
+                        rows = self._merged_rows(rows, merged[sheet_name])
+                    self._stream_sheet(
+                        sheet_name, _write_through(rows, raw_sheet),
+                        aggregated_output.create_sheet(sheet_name), SOURCE_PATTERNS[SHEET_SECTORS[sheet_name]],
+                    )
+                raw_output.save(raw_tmp)
+                aggregated_output.save(aggregated_tmp)
+            except BaseException:
+                for path in (raw_tmp, aggregated_tmp):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            finally:
+                base.close()
+
+            # Delta bersifat idempoten: jika proses berhenti sebelum manifest dihapus, penggabungan
+            # berikutnya menghasilkan workbook yang sama
+            os.replace(raw_tmp, dataset.raw_file)
+            os.replace(aggregated_tmp, dataset.aggregated_file)
+            os.remove(manifest_path)
+            shutil.rmtree(os.path.join(dataset.path, DELTA_DIR_NAME), ignore_errors=True)
+            print(f"✅ Snapshot v{dataset.version} workbooks merged ({len(names)} delta files)")
+            return True
+
+    def discard_upload(self, temp_file_path: str):
+        """Hapus file upload yang tidak jadi diproses"""
+        self._cleanup_temp_file(temp_file_path)
 
     def _cleanup_temp_file(self, file_path: str):
         """Safely remove temporary file"""
@@ -161,11 +651,21 @@ class UploadService:
         except Exception as e:
             print(f"⚠️ Warning: Could not remove temp file {file_path}: {str(e)}")
 
-    async def upload_and_process(self, file: UploadFile):
-        """Upload and process emission dataset (no backup or uploads folder)"""
+    async def receive_upload(self, file: UploadFile, mode: str = 'full'):
+        """Simpan file upload ke file sementara dan validasi header-nya.
+
+        mode 'full' memvalidasi struktur template lengkap, 'delta' memvalidasi workbook delta.
+        Mengembalikan path file sementara; lempar HTTPException 400 jika file tidak sesuai template.
+        """
         temp_file_path = None
-        
+
         try:
+            if mode not in UPLOAD_MODES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Mode upload tidak dikenal: {mode} (pilihan: {', '.join(UPLOAD_MODES)})"
+                )
+
             print(f"📥 Receiving file: {file.filename}")
 
             # Validate file extension first (before saving)
@@ -178,13 +678,13 @@ class UploadService:
             # Create temporary file path
             temp_file_path = os.path.join(
                 self.EXCEL_DIR, 
-                f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
+                f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{file.filename}"
             )
 
             # Save uploaded file temporarily
             try:
                 with open(temp_file_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                    await asyncio.to_thread(shutil.copyfileobj, file.file, buffer)
                 print(f"💾 Temporary file saved: {temp_file_path}")
             except Exception as e:
                 raise HTTPException(
@@ -192,9 +692,10 @@ class UploadService:
                     detail=f"Error menyimpan file sementara: {str(e)}"
                 )
 
-            # Validate file structure
+            # Validate file structure (header saja, cepat)
             print(f"🔍 Validating file structure...")
-            is_valid, error_message = self.validate_file_structure(temp_file_path)
+            validate = self.validate_delta_structure if mode == 'delta' else self.validate_file_structure
+            is_valid, error_message = await asyncio.to_thread(validate, temp_file_path)
             
             if not is_valid:
                 # Clean up immediately if validation fails
@@ -204,30 +705,7 @@ class UploadService:
                     detail=f"File tidak sesuai template: {error_message}"
                 )
 
-            # Process file
-            print(f"⚙️ Processing file...")
-            success, message = self.process_uploaded_file(temp_file_path)
-            
-            # Always cleanup temp file after processing (success or fail)
-            self._cleanup_temp_file(temp_file_path)
-            
-            if not success:
-                raise HTTPException(status_code=500, detail=message)
-
-            return JSONResponse(
-                status_code=200,
-                content={
-                    "success": True,
-                    "message": "Dataset berhasil diupload dan diproses",
-                    "processed_file": "data_emisi_gabungan.xlsx"
-                },
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                    "Content-Type": "application/json"
-                }
-            )
+            return temp_file_path
 
         except HTTPException:
             # Re-raise HTTPException as is
@@ -241,4 +719,24 @@ class UploadService:
             raise HTTPException(
                 status_code=500, 
                 detail=f"Error uploading file: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+    def process_and_cleanup(self, temp_file_path: str, progress=None, mode: str = 'full'):
+        """Proses file sementara yang sudah divalidasi lalu hapus; lempar RuntimeError jika gagal"""
+        print(f"⚙️ Processing file...")
+        process = self.process_delta_file if mode == 'delta' else self.process_uploaded_file
+        try:
+            success, message = process(temp_file_path, progress=progress)
+        finally:
+            # Always cleanup temp file after processing (success or fail)
+            self._cleanup_temp_file(temp_file_path)
+
+        if not success:
+            raise RuntimeError(message)
+
+        return {
+            "success": True,
+            "message": "Dataset berhasil diupload dan diproses",
+            "processed_file": "data_emisi_gabungan.xlsx",
+            "mode": mode,
+        }
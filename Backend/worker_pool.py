@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class PoolBusyError(Exception):
+    """Antrian worker penuh; request harus dicoba lagi setelah retry_after detik"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server sedang sibuk, coba lagi dalam {retry_after} detik")
+        self.retry_after = retry_after
+
+
+def _timed_call(func, args, kwargs):
+    """Dijalankan di worker: catat waktu mulai/selesai agar waktu tunggu antrian bisa diukur"""
+    started = time.time()
+    result = func(*args, **kwargs)
+    return started, time.time(), result
+
+
+class WorkerPool:
+    """Pool worker terbatas untuk pekerjaan CPU-heavy (clustering) dengan admission control.
+
+    Paling banyak MAX_WORKERS pekerjaan berjalan dan MAX_QUEUE menunggu; selebihnya langsung
+    ditolak dengan PoolBusyError agar event loop tidak pernah terblokir.
+    """
+
+    def __init__(self, max_workers=2, max_queue=8, mode='thread'):
+        self.MAX_WORKERS = max_workers
+        self.MAX_QUEUE = max_queue
+        self.MODE = mode
+
+        if mode == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='clustering')
+        else:
+            raise ValueError(f"Unknown worker pool mode: {mode}")
+
+        self._lock = threading.Lock()
+        self._pending = 0  # pekerjaan yang sedang antri + berjalan
+
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _retry_after(self):
+        """Perkiraan kasar kapan slot antrian kosong (detik, minimal 1)"""
+        avg_run = self.total_run / self.completed if self.completed else 5.0
+        waves = (self._pending - self.MAX_WORKERS) / self.MAX_WORKERS + 1
+        return max(1, int(round(avg_run * waves)))
+
+    async def run(self, func, *args, **kwargs):
+        """Jalankan func di worker; lempar PoolBusyError jika antrian penuh"""
+        with self._lock:
+            if self._pending >= self.MAX_WORKERS + self.MAX_QUEUE:
+                self.rejected += 1
+                raise PoolBusyError(self._retry_after())
+            self._pending += 1
+
+        submitted = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            started, finished, result = await loop.run_in_executor(
+                self._executor, functools.partial(_timed_call, func, args, kwargs)
+            )
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+                self.failed += 1
+            raise
+
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+            wait = max(0.0, started - submitted)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += finished - started
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.MODE,
+                'max_workers': self.MAX_WORKERS,
+                'max_queue': self.MAX_QUEUE,
+                'running': min(self._pending, self.MAX_WORKERS),
+                'queue_depth': max(0, self._pending - self.MAX_WORKERS),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_seconds': self.total_wait / self.completed if self.completed else 0.0,
+                'max_wait_seconds': self.max_wait,
+                'avg_run_seconds': self.total_run / self.completed if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -10,6 +10,7 @@ const API_URL = "http://localhost:8000";
 
 function Home() {
   const [geoData, setGeoData] = useState(null);
+  const [geoDetail, setGeoDetail] = useState(null);
   const [loading, setLoading] = useState(true);
   const [clusterData, setClusterData] = useState({});
   const [clusterStats, setClusterStats] = useState([]);
@@ -31,6 +32,7 @@ function Home() {
   const [outlierMethod, setOutlierMethod] = useState(null);
   const [zscoreThreshold, setZscoreThreshold] = useState(null);
   const [clusteringResult, setClusteringResult] = useState(null);
+  const [yearRanges, setYearRanges] = useState({});
 
   const sectorOptions = [
     { value: "all", label: "Semua Sektor" },
@@ -42,18 +44,54 @@ function Home() {
   ];
 
   useEffect(() => {
-    fetch("/geojson/peta_indonesia_update3.geojson")
-      .then((res) => res.json())
+    const loadGeoJSON = (detail) =>
+      fetch(`${API_URL}/api/geojson?detail=${detail}`).then((res) => {
+        if (!res.ok) throw new Error(`GeoJSON ${detail}: ${res.status}`);
+        return res.json();
+      });
+
+    // Tampilkan peta ringan dulu, lalu ganti dengan geometri lengkap
+    loadGeoJSON("low")
       .then((data) => {
         setGeoData(data);
+        setGeoDetail("low");
         setLoading(false);
+        return loadGeoJSON("full");
+      })
+      .then((data) => {
+        setGeoData(data);
+        setGeoDetail("full");
       })
       .catch((err) => {
-        console.error("Error loading GeoJSON:", err);
-        setLoading(false);
+        console.error("Error loading GeoJSON from API:", err);
+        fetch("/geojson/peta_indonesia_update3.geojson")
+          .then((res) => res.json())
+          .then((data) => {
+            setGeoData(data);
+            setGeoDetail("full");
+          })
+          .catch((err) => console.error("Error loading GeoJSON:", err))
+          .finally(() => setLoading(false));
       });
   }, []);
 
+  useEffect(() => {
+    // Rentang tahun mengikuti dataset aktif (bisa bertambah lewat upload delta)
+    fetch(`${API_URL}/api/dataset-version`)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data) => {
+        if (data && data.sector_year_ranges) setYearRanges(data.sector_year_ranges);
+      })
+      .catch((err) => console.error("Error loading dataset version:", err));
+  }, []);
+
+  // Rentang tahun sektor terpilih ('all' = tahun yang ada di semua sektor)
+  const yearRange = yearRanges[sector.toLowerCase()] || { start: 2000, end: 2024 };
+  const yearOptions = Array.from(
+    { length: yearRange.end - yearRange.start + 1 },
+    (_, i) => yearRange.start + i
+  );
+
   const handleClustering = async () => {
     if (!startYear || !endYear || !sector) {
       setErrorMessage("Mohon lengkapi semua field");
@@ -320,13 +358,11 @@ function Home() {
                   onChange={(e) => setStartYear(e.target.value)}
                   className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
                 >
-                  {Array.from({ length: 25 }, (_, i) => 2000 + i).map(
-                    (year) => (
-                      <option key={year} value={year}>
-                        {year}
-                      </option>
-                    )
-                  )}
+                  {yearOptions.map((year) => (
+                    <option key={year} value={year}>
+                      {year}
+                    </option>
+                  ))}
                 </select>
               </div>
 
@@ -339,13 +375,11 @@ function Home() {
                   onChange={(e) => setEndYear(e.target.value)}
                   className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
                 >
-                  {Array.from({ length: 25 }, (_, i) => 2000 + i).map(
-                    (year) => (
-                      <option key={year} value={year}>
-                        {year}
-                      </option>
-                    )
-                  )}
+                  {yearOptions.map((year) => (
+                    <option key={year} value={year}>
+                      {year}
+                    </option>
+                  ))}
                 </select>
               </div>
 
@@ -593,7 +627,7 @@ function Home() {
 
                 {geoData && (
                   <GeoJSON
-                    key={JSON.stringify(clusterData)}
+                    key={`${geoDetail}-${JSON.stringify(clusterData)}`}
                     data={geoData}
                     style={(feature) => {
                       const shapeName = feature.properties.shapeName;
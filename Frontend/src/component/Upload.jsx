@@ -178,6 +178,29 @@ export default function DatasetManagement() {
     setValidationError("");
   };
 
+  const waitForUploadJob = async (jobId) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const response = await fetch(`${API_BASE}/upload-dataset/jobs/${jobId}`);
+      if (!response.ok) throw new Error(`Gagal memantau proses upload: ${response.status}`);
+
+      const job = await response.json();
+      if (job.status === 'completed') return job.result;
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        const errorMsg = job.error || 'Proses dataset gagal';
+        setUploadError(errorMsg);
+        throw new Error(errorMsg);
+      }
+
+      const { stage, sheet_index, total_sheets } = job.progress || {};
+      if (stage === 'sheet' && total_sheets) {
+        setUploadProgress(Math.round(10 + 80 * (sheet_index - 1) / total_sheets));
+      } else if (stage === 'write_files' || stage === 'publish') {
+        setUploadProgress(95);
+      }
+    }
+  };
+
   const uploadToServer = async () => {
     if (!selectedFile) return alert('Tidak ada file yang dipilih');
 
@@ -220,7 +243,12 @@ export default function DatasetManagement() {
         throw new Error(errorMsg);
       }
 
-      const result = await response.json().catch(() => ({ success: true, message: "Dataset berhasil diupload" }));
+      let result = await response.json().catch(() => ({ success: true, message: "Dataset berhasil diupload" }));
+
+      // Dataset diproses di latar belakang: pantau progress job sampai selesai
+      if (result.job_id) {
+        result = await waitForUploadJob(result.job_id);
+      }
       
       setUploadProgress(100);
       setUploadSuccess(true);